@@ -0,0 +1,74 @@
+import json
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Tuple
+from unittest import mock
+
+from trip_planner.route_service import RouteService
+
+
+FIXTURE_PATH = Path(__file__).resolve().parent / 'fixtures' / 'routes.json'
+
+
+def load_fixtures(path: Path = FIXTURE_PATH) -> Dict:
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def lane(fixtures: Dict, name: str) -> Dict:
+    for entry in fixtures['lanes']:
+        if entry['name'] == name:
+            return entry
+    raise KeyError(name)
+
+
+def lane_waypoints(entry: Dict) -> List[Tuple[float, float]]:
+    waypoints = []
+    for leg in entry['legs']:
+        waypoints.extend((p[0], p[1]) for p in leg['waypoints'])
+    return waypoints
+
+
+def densify(waypoints: List[Tuple[float, float]], size: int) -> List[Tuple[float, float]]:
+
+    if size <= len(waypoints):
+        step = len(waypoints) / size
+        return [waypoints[int(i * step)] for i in range(size - 1)] + [waypoints[-1]]
+
+    per_segment = size // (len(waypoints) - 1) + 1
+    dense = []
+    for (lat0, lon0), (lat1, lon1) in zip(waypoints, waypoints[1:]):
+        for i in range(per_segment):
+            ratio = i / per_segment
+            dense.append((lat0 + (lat1 - lat0) * ratio, lon0 + (lon1 - lon0) * ratio))
+    dense.append(waypoints[-1])
+    return densify(dense, size)
+
+
+@contextmanager
+def replay_routes(fixtures: Dict):
+
+    geocodes = {name: tuple(coords) for name, coords in fixtures['geocodes'].items()}
+    legs = {}
+    for entry in fixtures['lanes']:
+        for leg in entry['legs']:
+            legs[(tuple(leg['start']), tuple(leg['end']))] = leg
+
+    def geocode_location(self, location):
+        return geocodes.get(location)
+
+    def get_road_route(self, points):
+        recorded = [legs[(tuple(start), tuple(end))] for start, end in zip(points, points[1:])]
+        waypoints = [(p[0], p[1]) for p in recorded[0]['waypoints']]
+        for leg in recorded[1:]:
+            waypoints.extend((p[0], p[1]) for p in leg['waypoints'][1:])
+        return {
+            'distance': sum(leg['distance'] for leg in recorded),
+            'duration': sum(leg['duration'] for leg in recorded),
+            'waypoints': waypoints,
+            'legs': [{'distance': leg['distance'], 'duration': leg['duration']} for leg in recorded],
+        }
+
+    with mock.patch.object(RouteService, 'geocode_location', geocode_location), \
+            mock.patch.object(RouteService, '_get_road_route', get_road_route):
+        yield
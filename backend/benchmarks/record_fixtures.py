@@ -0,0 +1,63 @@
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'eld_backend.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from trip_planner.route_service import RouteService  # noqa: E402
+from benchmarks.fixtures import FIXTURE_PATH, load_fixtures  # noqa: E402
+
+
+def record(lanes, output: Path):
+    route_service = RouteService()
+    geocodes = {}
+    recorded = []
+
+    for name, stops in lanes:
+        for stop in stops:
+            if stop not in geocodes:
+                coords = route_service.geocode_location(stop)
+                if coords is None:
+                    raise SystemExit(f"Could not geocode {stop!r}")
+                geocodes[stop] = list(coords)
+
+        legs = []
+        for start, end in zip(stops, stops[1:]):
+            route = route_service._get_road_route([tuple(geocodes[start]), tuple(geocodes[end])])
+            legs.append({
+                'start': geocodes[start],
+                'end': geocodes[end],
+                'distance': round(route['distance'], 3),
+                'duration': round(route['duration'], 1),
+                'waypoints': [[round(lat, 5), round(lon, 5)] for lat, lon in route['waypoints']],
+            })
+        recorded.append({'name': name, 'stops': stops, 'legs': legs})
+        distances = ', '.join('%.0f mi' % leg['distance'] for leg in legs)
+        print(f"{name}: {distances}")
+
+    with open(output, 'w') as fh:
+        json.dump({'provider': 'live', 'geocodes': geocodes, 'lanes': recorded},
+                  fh, separators=(',', ':'))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Re-record the benchmark route fixtures from the live geocoding/routing providers.'
+    )
+    parser.add_argument('--output', type=Path, default=FIXTURE_PATH)
+    args = parser.parse_args()
+
+    lanes = [(entry['name'], entry['stops']) for entry in load_fixtures()['lanes']]
+    record(lanes, args.output)
+
+
+if __name__ == '__main__':
+    main()
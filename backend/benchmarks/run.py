@@ -0,0 +1,528 @@
+import argparse
+import contextlib
+import fnmatch
+import io
+import json
+import os
+import platform
+import random
+import signal
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'eld_backend.settings')
+# Keep benchmark runs out of the real shared cache.
+os.environ.setdefault('TRIP_PLANNER_CACHE_DIR', tempfile.mkdtemp(prefix='trip-planner-bench-'))
+
+import django  # noqa: E402
+
+django.setup()
+
+from trip_planner.cycle_ledger import RollingCycle  # noqa: E402
+from trip_planner.departure_sweep import DepartureSweep  # noqa: E402
+from trip_planner.gazetteer import Gazetteer  # noqa: E402
+from trip_planner.hos_audit import Auditor  # noqa: E402
+from trip_planner.hos_calculator import HOSCalculator  # noqa: E402
+from trip_planner.route_service import RouteService  # noqa: E402
+from trip_planner.eld_log_generator import ELDLogGenerator  # noqa: E402
+from trip_planner.stop_optimizer import StopOrderOptimizer  # noqa: E402
+from trip_planner.schedule_optimizer import ScheduleOptimizer  # noqa: E402
+from trip_planner.truck_stops import STOP_KINDS, TruckStopIndex  # noqa: E402
+from benchmarks.fixtures import (  # noqa: E402
+    densify, lane, lane_waypoints, load_fixtures, replay_routes,
+)
+
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'baseline.json'
+
+TRIP_LENGTHS = [100, 500, 1000, 2500, 5000, 10000]
+GEOMETRY_SIZES = [100, 1000, 10000]
+MULTI_STOP_COUNTS = [5, 15]
+E2E_LANES = ['short', 'medium', 'long']
+LEDGER_YEARS = 3
+SERIALIZATION_MILES = 3000
+SERIALIZATION_WAYPOINTS = 20000
+
+
+class BenchmarkTimeout(Exception):
+    pass
+
+
+class Benchmark:
+
+    def __init__(self, name: str, func: Callable[[], object], rounds: int = 20, warmup: int = 1,
+                 info: Optional[Dict] = None):
+        self.name = name
+        self.func = func
+        self.rounds = rounds
+        self.warmup = warmup
+        self.info = info or {}
+
+
+def _split_trip(miles: float) -> Tuple[float, float]:
+    return miles * 0.2, miles * 0.8
+
+
+def _schedule(miles: float, cycle_used: float = 0.0) -> List[Dict]:
+    to_pickup, to_dropoff = _split_trip(miles)
+    return HOSCalculator(cycle_used).calculate_trip_schedule(to_pickup, to_dropoff)
+
+
+def hos_benchmarks() -> List[Benchmark]:
+    cases = []
+    for miles in TRIP_LENGTHS:
+        cases.append(Benchmark(
+            f'hos.calculate_trip_schedule[{miles}mi]',
+            lambda miles=miles: _schedule(miles),
+            rounds=200,
+        ))
+
+    for count in MULTI_STOP_COUNTS:
+        stops = [{'distance': 2000.0 / count, 'dwell_time': 0.5, 'activity': 'dropoff'} for _ in range(count)]
+        cases.append(Benchmark(
+            f'hos.calculate_multi_stop_schedule[{count}stops]',
+            lambda stops=stops: HOSCalculator(0).calculate_multi_stop_schedule(stops),
+            rounds=200,
+        ))
+
+    for miles in TRIP_LENGTHS:
+        def add_fuel_stops(miles=miles, state={}):
+            if 'schedule' not in state:
+                state['schedule'] = _schedule(miles)
+            return HOSCalculator(0).add_fuel_stops(state['schedule'])
+
+        cases.append(Benchmark(f'hos.add_fuel_stops[{miles}mi]', add_fuel_stops, rounds=200))
+
+    for miles in TRIP_LENGTHS:
+        stops = [
+            {'distance': miles * 0.1, 'dwell_time': 1.0, 'activity': 'pickup'},
+            {'distance': miles * 0.9, 'dwell_time': 1.0, 'activity': 'dropoff'},
+        ]
+        cases.append(Benchmark(
+            f'hos.optimized_schedule[{miles}mi]',
+            lambda stops=stops: ScheduleOptimizer(HOSCalculator(0)).optimize(stops),
+            rounds=20,
+        ))
+    return cases
+
+
+def ledger_benchmarks() -> List[Benchmark]:
+    # Three years of duty history: a 10 h shift and a 14 h off-duty block every day.
+    start = datetime(2021, 1, 1, 6, tzinfo=timezone.utc)
+    records = []
+    for day in range(LEDGER_YEARS * 365):
+        shift = start + timedelta(days=day)
+        records.append((shift, shift + timedelta(hours=10), 'driving'))
+        records.append((shift + timedelta(hours=10), shift + timedelta(hours=24), 'off_duty'))
+
+    def replay():
+        cycle = RollingCycle()
+        for record in records:
+            cycle.record(*record)
+        return cycle
+
+    cycle = replay()
+    now = records[-1][1]
+    next_shift = (now, now + timedelta(hours=10), 'driving')
+
+    def append_record():
+        # What record_duty does per request: load the stored buckets, apply one record.
+        loaded = RollingCycle(cycle.day, cycle.buckets, cycle.last_duty_end)
+        loaded.record(*next_shift)
+        return loaded
+
+    # The audit pipeline's per-worker cost: parse and check raw rows as read from a file.
+    rows = [('driver-1', start.isoformat(), end.isoformat(), status) for start, end, status in records]
+
+    def audit():
+        return Auditor().audit(rows)
+
+    return [
+        Benchmark(f'ledger.replay[{LEDGER_YEARS}y history]', replay, rounds=5),
+        Benchmark('ledger.append_record', append_record, rounds=200),
+        Benchmark('ledger.hours_used', lambda: cycle.hours_used(now), rounds=200),
+        Benchmark(f'audit.records[{len(rows)} records]', audit, rounds=10),
+    ]
+
+
+def route_benchmarks(fixtures: Dict) -> List[Benchmark]:
+    route_service = RouteService()
+    base = lane_waypoints(lane(fixtures, 'long'))
+    cases = []
+    for size in GEOMETRY_SIZES:
+        waypoints = densify(base, size)
+        rest_miles = [600.0 * i for i in range(1, 5)]
+        cases.append(Benchmark(
+            f'route.calculate_rest_stop_locations[{size}pts]',
+            lambda waypoints=waypoints, rest_miles=rest_miles:
+                route_service.calculate_rest_stop_locations(waypoints, rest_miles),
+            rounds=max(5, 20000 // size),
+        ))
+
+    rng = random.Random(42)
+    index = TruckStopIndex(
+        {'name': f'stop-{i}', 'lat': rng.uniform(25, 49), 'lon': rng.uniform(-124, -67),
+         'kind': rng.choice(['truck_stop', 'fuel', 'rest_area'])}
+        for i in range(20000)
+    )
+    queries = densify(base, 1000)
+
+    def snap_route():
+        return [index.nearest(lat, lon, 10.0, STOP_KINDS['rest_stop']) for lat, lon in queries]
+
+    cases.append(Benchmark('truck_stops.nearest[1000 lookups, 20k facilities]', snap_route, rounds=20))
+
+    gazetteer = Gazetteer(
+        {'name': f'Place {i}, {rng.choice(["TX", "CA", "IL", "WA"])}', 'lat': rng.uniform(25, 49),
+         'lon': rng.uniform(-124, -67), 'population': rng.randint(100, 10 ** 6)}
+        for i in range(50000)
+    )
+    names = [gazetteer.names[rng.randrange(len(gazetteer))] for _ in range(1000)]
+    cases.append(Benchmark(
+        'gazetteer.lookup[1000 lookups, 50k places]',
+        lambda: [gazetteer.lookup(name) for name in names],
+        rounds=20,
+    ))
+
+    # Each keystroke of "Place 1234, TX" is one suggest query.
+    keystrokes = [name[:length] for name in names[:100] for length in range(1, len(name) + 1)]
+    cases.append(Benchmark(
+        f'gazetteer.suggest[{len(keystrokes)} keystrokes, 50k places]',
+        lambda: [gazetteer.suggest(prefix, 8) for prefix in keystrokes],
+        rounds=5,
+    ))
+    return cases
+
+
+def optimizer_benchmarks(fixtures: Dict) -> List[Benchmark]:
+    route_service = RouteService()
+    base = lane_waypoints(lane(fixtures, 'medium'))
+    cases = []
+    for count in MULTI_STOP_COUNTS:
+        points = densify(base, count + 1)
+        stops = [{'type': 'pickup', 'dwell_time': 1.0}] + \
+            [{'type': 'dropoff', 'dwell_time': 0.5} for _ in range(count - 1)]
+        # Interleave the drops so the given order is far from the optimum.
+        points = points[:2] + points[2::2] + points[3::2]
+
+        def optimize(points=points, stops=stops):
+            matrix = route_service._get_geodesic_matrix(points)
+            return StopOrderOptimizer(HOSCalculator(0)).optimize(stops, matrix)
+
+        cases.append(Benchmark(f'optimizer.stop_order[{count}stops]', optimize, rounds=20))
+
+    # Departure hour every 15 minutes over two days x six speeds, with a dock window.
+    legs = lane(fixtures, 'long')['legs']
+    sweep_stops = [
+        {'distance': leg['distance'], 'dwell_time': 1.0, 'activity': activity, 'window': window}
+        for leg, activity, window in zip(legs, ('pickup', 'dropoff'), (None, (6.0, 14.0)))
+    ]
+    hours = [i * 0.25 for i in range(192)]
+    speeds = [45.0, 50.0, 55.0, 60.0, 65.0, 70.0]
+    cases.append(Benchmark(
+        f'optimizer.departure_sweep[{len(hours) * len(speeds)} candidates]',
+        lambda: DepartureSweep(HOSCalculator(20)).sweep(sweep_stops, hours, speeds),
+        rounds=10,
+    ))
+    return cases
+
+
+def eld_benchmarks() -> List[Benchmark]:
+    from PIL import Image, ImageDraw
+
+    # Uncached, so every round renders.
+    generator = ELDLogGenerator(use_cache=False)
+    schedule = HOSCalculator(0).add_fuel_stops(_schedule(1000))
+    day = [seg for seg in schedule if seg['day'] == 0]
+    long_schedule = HOSCalculator(0).add_fuel_stops(_schedule(3000))
+    days = long_schedule[-1]['day'] + 1
+
+    def render():
+        generator._get_fonts()
+        img = Image.new('RGB', (generator.WIDTH, generator.HEIGHT), generator.COLOR_BG)
+        draw = ImageDraw.Draw(img)
+        generator._draw_background(draw)
+        generator._draw_header(draw, 1, 'Benchmark Driver', '2024-01-01')
+        generator._draw_grid(draw)
+        generator._draw_status_graph(draw, day)
+        generator._draw_summary(draw, day)
+        return img
+
+    rendered = render()
+
+    def encode():
+        buf = io.BytesIO()
+        rendered.save(buf, format='PNG')
+        return buf.getvalue()
+
+    return [
+        Benchmark('eld.render', render, rounds=20),
+        Benchmark('eld.encode', encode, rounds=20),
+        Benchmark(
+            'eld.generate_daily_log',
+            lambda: generator.generate_daily_log(1, day, 'Benchmark Driver', '2024-01-01'),
+            rounds=20,
+        ),
+        # Every day of a multi-day trip: one sheet per day versus the one-image overview.
+        Benchmark(
+            f'eld.generate_multiple_logs[{days} days]',
+            lambda: generator.generate_multiple_logs(long_schedule, 'Benchmark Driver', as_bytes=True),
+            rounds=5,
+        ),
+        Benchmark(
+            f'eld.generate_trip_overview[{days} days]',
+            lambda: generator.generate_trip_overview(long_schedule, 'Benchmark Driver', '2024-01-01', as_bytes=True),
+            rounds=10,
+        ),
+    ]
+
+
+def serialization_benchmarks(fixtures: Dict) -> List[Benchmark]:
+    from rest_framework.renderers import JSONRenderer
+    from trip_planner.renderers import MessagePackRenderer, ORJSONRenderer
+
+    # A plan_trip-shaped response for a 3,000-mile trip with full-resolution route geometry.
+    waypoints = [
+        (round(lat, 5), round(lon, 5))  # OSRM geojson precision
+        for lat, lon in densify(lane_waypoints(lane(fixtures, 'multi_day')), SERIALIZATION_WAYPOINTS)
+    ]
+    schedule = HOSCalculator(0).add_fuel_stops(_schedule(SERIALIZATION_MILES))
+    logs = ELDLogGenerator(use_cache=False).generate_multiple_logs(schedule, 'Benchmark Driver', as_bytes=True)
+    payload = {
+        'route': {
+            'total_distance': float(SERIALIZATION_MILES),
+            'coordinates': {'current': waypoints[0], 'dropoff': waypoints[-1]},
+            'waypoints': waypoints,
+        },
+        'schedule': schedule,
+        'summary': {'total_distance_miles': float(SERIALIZATION_MILES), 'hos_compliant': True},
+        'eld_logs': logs,
+    }
+    # The stock renderer only understands the old data-URI strings.
+    legacy_payload = dict(payload, eld_logs=[log.data_uri() for log in logs])
+
+    renderers = [
+        ('drf_json', JSONRenderer(), legacy_payload),
+        ('orjson', ORJSONRenderer(), payload),
+        ('msgpack', MessagePackRenderer(), payload),
+    ]
+    cases = []
+    for name, renderer, data in renderers:
+        size = len(renderer.render(data))
+        cases.append(Benchmark(
+            f'serialize.plan_trip[{SERIALIZATION_MILES}mi, {name}]',
+            lambda renderer=renderer, data=data: renderer.render(data),
+            rounds=20,
+            info={'payload_bytes': size},
+        ))
+    return cases
+
+
+def cache_benchmarks(fixtures: Dict) -> List[Benchmark]:
+    import pickle
+
+    from trip_planner.cache_backends import SQLiteCache, dumps, loads
+
+    waypoints = [
+        (round(lat, 5), round(lon, 5))
+        for lat, lon in densify(lane_waypoints(lane(fixtures, 'multi_day')), SERIALIZATION_WAYPOINTS)
+    ]
+    route = {'source': 'osrm', 'distance': 3000.0, 'duration': 180000.0, 'waypoints': waypoints,
+             'legs': [{'distance': 3000.0, 'duration': 180000.0}]}
+    cache = SQLiteCache(os.path.join(tempfile.mkdtemp(prefix='trip-planner-cache-'), 'bench.sqlite3'), {})
+    cache.set('route', route)
+    blob = dumps(route)
+    pickled = pickle.dumps(route, pickle.HIGHEST_PROTOCOL)
+    points = f'{SERIALIZATION_WAYPOINTS // 1000}k pts'
+    return [
+        Benchmark(f'cache.pickle[route {points}]', lambda: pickle.loads(pickle.dumps(route)),
+                  rounds=20, info={'payload_bytes': len(pickled)}),
+        Benchmark(f'cache.dumps[route {points}]', lambda: dumps(route),
+                  rounds=20, info={'payload_bytes': len(blob)}),
+        Benchmark(f'cache.loads[route {points}]', lambda: loads(blob), rounds=20),
+        Benchmark(f'cache.sqlite_set[route {points}]', lambda: cache.set('route', route), rounds=20),
+        Benchmark(f'cache.sqlite_get[route {points}]', lambda: cache.get('route'), rounds=20),
+    ]
+
+
+def e2e_benchmarks(fixtures: Dict) -> List[Benchmark]:
+    from django.test import Client
+
+    client = Client()
+    cases = []
+    for name in E2E_LANES:
+        stops = lane(fixtures, name)['stops']
+        payload = {
+            'current_location': stops[0],
+            'pickup_location': stops[1],
+            'dropoff_location': stops[2],
+            'current_cycle_used': 0,
+            'driver_name': 'Benchmark Driver',
+        }
+
+        def plan_trip(payload=payload):
+            with replay_routes(fixtures), contextlib.redirect_stdout(io.StringIO()):
+                response = client.post('/api/plan-trip/', payload, content_type='application/json')
+            if response.status_code != 200:
+                raise RuntimeError(f"plan_trip returned {response.status_code}: {response.content[:200]!r}")
+            return response
+
+        cases.append(Benchmark(f'e2e.plan_trip[{name}]', plan_trip, rounds=5))
+    return cases
+
+
+def collect(fixtures: Dict) -> List[Benchmark]:
+    return (hos_benchmarks() + ledger_benchmarks() + route_benchmarks(fixtures) + optimizer_benchmarks(fixtures)
+            + eld_benchmarks() + serialization_benchmarks(fixtures) + cache_benchmarks(fixtures)
+            + e2e_benchmarks(fixtures))
+
+
+@contextlib.contextmanager
+def time_budget(seconds: float):
+
+    if not hasattr(signal, 'SIGALRM') or seconds <= 0:
+        yield
+        return
+
+    def on_alarm(signum, frame):
+        raise BenchmarkTimeout()
+
+    previous = signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def measure(bench: Benchmark, rounds: Optional[int], timeout: float) -> Dict:
+    rounds = rounds or bench.rounds
+    timings = []
+    try:
+        with time_budget(timeout):
+            for _ in range(bench.warmup):
+                bench.func()
+            for _ in range(rounds):
+                start = time.perf_counter()
+                bench.func()
+                timings.append((time.perf_counter() - start) * 1000)
+    except BenchmarkTimeout:
+        return {'status': 'timeout', 'timeout_s': timeout, 'rounds': len(timings)}
+    except Exception as e:
+        return {'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+
+    timings.sort()
+    return {
+        **bench.info,
+        'status': 'ok',
+        'rounds': rounds,
+        'min_ms': round(timings[0], 4),
+        'median_ms': round(statistics.median(timings), 4),
+        'mean_ms': round(statistics.fmean(timings), 4),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 4),
+        'stdev_ms': round(statistics.pstdev(timings), 4),
+    }
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[Dict]:
+    rows = []
+    for name, current in results['benchmarks'].items():
+        previous = baseline.get('benchmarks', {}).get(name)
+        if not previous or previous.get('status') != 'ok':
+            rows.append({'name': name, 'verdict': 'new'})
+            continue
+        if current.get('status') != 'ok':
+            rows.append({'name': name, 'verdict': 'regression', 'reason': current.get('status')})
+            continue
+        ratio = current['median_ms'] / previous['median_ms'] if previous['median_ms'] else 1.0
+        if ratio > threshold:
+            verdict = 'regression'
+        elif ratio < 1 / threshold:
+            verdict = 'improvement'
+        else:
+            verdict = 'unchanged'
+        rows.append({'name': name, 'verdict': verdict, 'ratio': round(ratio, 3)})
+    return rows
+
+
+def _format_row(name: str, result: Dict) -> str:
+    if result['status'] != 'ok':
+        return f"{name:<52} {result['status'].upper()}"
+    row = (f"{name:<52} median {result['median_ms']:>10.3f} ms  "
+           f"p95 {result['p95_ms']:>10.3f} ms  ({result['rounds']} rounds)")
+    if 'payload_bytes' in result:
+        row += f"  {result['payload_bytes'] / 1024:.1f} KiB"
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark suite for the trip planner pipeline.')
+    parser.add_argument('-k', '--only', action='append', default=[],
+                        help='glob pattern selecting benchmarks to run (repeatable)')
+    parser.add_argument('--rounds', type=int, default=None, help='override the per-benchmark round count')
+    parser.add_argument('--timeout', type=float, default=30.0, help='time budget per benchmark in seconds')
+    parser.add_argument('--output', type=Path, help='write machine-readable results to this JSON file')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH,
+                        help=f'compare against a stored results file (default: {BASELINE_PATH.name})')
+    parser.add_argument('--no-compare', action='store_true', help='do not compare against a baseline')
+    parser.add_argument('--save-baseline', action='store_true', help=f'store results as {BASELINE_PATH.name}')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='median slowdown ratio that counts as a regression')
+    args = parser.parse_args()
+
+    # Read before --save-baseline overwrites it, so a re-recorded baseline is compared with the old one.
+    baseline = None
+    if not args.no_compare:
+        if args.baseline.exists():
+            with open(args.baseline) as fh:
+                baseline = json.load(fh)
+        elif args.baseline != BASELINE_PATH:
+            parser.error(f'baseline not found: {args.baseline}')
+
+    fixtures = load_fixtures()
+    benchmarks = collect(fixtures)
+    if args.only:
+        benchmarks = [b for b in benchmarks if any(fnmatch.fnmatch(b.name, p) for p in args.only)]
+
+    results = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'fixture_provider': fixtures.get('provider'),
+        },
+        'benchmarks': {},
+    }
+    for bench in benchmarks:
+        result = measure(bench, args.rounds, args.timeout)
+        results['benchmarks'][bench.name] = result
+        print(_format_row(bench.name, result), flush=True)
+
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+    if args.save_baseline:
+        with open(BASELINE_PATH, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+    if baseline is not None:
+        rows = compare(results, baseline, args.threshold)
+        print()
+        for row in rows:
+            ratio = f"x{row['ratio']:.3f}" if 'ratio' in row else row.get('reason', '')
+            print(f"{row['name']:<52} {row['verdict']:<12} {ratio}")
+        if any(row['verdict'] == 'regression' for row in rows):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 from pathlib import Path
 import os
 import dj_database_url
+from corsheaders.defaults import default_headers
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -23,6 +24,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'trip_planner.middleware.StartupTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -32,6 +34,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'trip_planner.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'eld_backend.urls'
@@ -68,6 +71,84 @@ else:
         }
     }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Geocodes, routes, distance matrices and rendered log sheets. One SQLite (WAL) file
+    # shared by every gunicorn worker and the prewarm_routes command.
+    'trip_planner': {
+        'BACKEND': 'trip_planner.cache_backends.SQLiteCache',
+        'LOCATION': os.path.join(
+            os.environ.get('TRIP_PLANNER_CACHE_DIR', str(BASE_DIR / 'cache')), 'trip_planner.sqlite3'
+        ),
+        'TIMEOUT': 7 * 24 * 3600,
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+            'MAX_BYTES': int(os.environ.get('TRIP_PLANNER_CACHE_MAX_MB', '512')) * 1024 * 1024,
+        },
+    },
+}
+
+TRIP_PLANNER_CACHE_ALIAS = 'trip_planner'
+
+# Provider request rates for the whole deployment (Nominatim's usage policy allows 1 request/s);
+# 0 is unlimited. Each of the TRIP_PLANNER_PROVIDER_WORKERS processes (gunicorn's
+# WEB_CONCURRENCY by default) gets an equal share. A request whose turn at the provider is more
+# than TRIP_PLANNER_PROVIDER_MAX_WAIT seconds away fails fast: routes fall back, geocoding gets 503.
+TRIP_PLANNER_NOMINATIM_RPS = float(os.environ.get('TRIP_PLANNER_NOMINATIM_RPS', '1'))
+TRIP_PLANNER_OSRM_RPS = float(os.environ.get('TRIP_PLANNER_OSRM_RPS', '0'))
+TRIP_PLANNER_ORS_RPS = float(os.environ.get('TRIP_PLANNER_ORS_RPS', '0'))
+TRIP_PLANNER_PROVIDER_WORKERS = int(
+    os.environ.get('TRIP_PLANNER_PROVIDER_WORKERS', os.environ.get('WEB_CONCURRENCY', '1'))
+)
+TRIP_PLANNER_PROVIDER_MAX_WAIT = float(os.environ.get('TRIP_PLANNER_PROVIDER_MAX_WAIT', '2'))
+
+# Provider endpoints; point these at local stubs for load tests (see backend/loadtest).
+TRIP_PLANNER_NOMINATIM_URL = os.environ.get('TRIP_PLANNER_NOMINATIM_URL', 'https://nominatim.openstreetmap.org')
+TRIP_PLANNER_OSRM_URL = os.environ.get('TRIP_PLANNER_OSRM_URL', 'http://router.project-osrm.org')
+TRIP_PLANNER_ORS_URL = os.environ.get('TRIP_PLANNER_ORS_URL', 'https://api.openrouteservice.org')
+
+# Optional truck stop / fuel station dataset (CSV or GeoJSON) used to snap rest and
+# fuel stops to real facilities within TRIP_PLANNER_STOP_CORRIDOR_MILES of the route.
+TRIP_PLANNER_TRUCK_STOPS_PATH = os.environ.get('TRIP_PLANNER_TRUCK_STOPS_PATH', '')
+TRIP_PLANNER_STOP_CORRIDOR_MILES = float(os.environ.get('TRIP_PLANNER_STOP_CORRIDOR_MILES', '10'))
+
+# Offline gazetteer CSV files (name,latitude,longitude,population,aliases) separated by
+# os.pathsep. Matching "City, ST" and facility lookups skip Nominatim; empty disables.
+TRIP_PLANNER_GAZETTEER_PATH = os.environ.get(
+    'TRIP_PLANNER_GAZETTEER_PATH', os.path.join(BASE_DIR, 'trip_planner', 'data', 'us_cities.csv')
+)
+
+# How many recent stored trips seed the location-suggest history on first use
+TRIP_PLANNER_SUGGEST_SEED_TRIPS = int(os.environ.get('TRIP_PLANNER_SUGGEST_SEED_TRIPS', '5000'))
+# Most places the location history keeps per worker; the least used are dropped first (0 = no cap)
+TRIP_PLANNER_LOCATION_HISTORY_SIZE = int(os.environ.get('TRIP_PLANNER_LOCATION_HISTORY_SIZE', '10000'))
+
+# Build the shared route/ELD services, fonts and log template when the web server loads
+# wsgi.py instead of on the first request.
+TRIP_PLANNER_WARM_START = os.environ.get('TRIP_PLANNER_WARM_START', 'True') == 'True'
+TRIP_PLANNER_HTTP_POOL_SIZE = int(os.environ.get('TRIP_PLANNER_HTTP_POOL_SIZE', '10'))
+
+# Persist every planned trip (rows in the database, log images under MEDIA_ROOT), served to
+# staff users by the /api/trips/ endpoints. Off by default.
+TRIP_PLANNER_STORE_TRIPS = os.environ.get('TRIP_PLANNER_STORE_TRIPS', 'False') == 'True'
+
+# Admission control, per worker process: how many requests may route (provider calls) and
+# render log images at once (0 = unlimited), how many more may wait for a slot, and for how
+# long. Requests beyond that get 503 with Retry-After.
+TRIP_PLANNER_ROUTING_CONCURRENCY = int(os.environ.get('TRIP_PLANNER_ROUTING_CONCURRENCY', '8'))
+TRIP_PLANNER_RENDER_CONCURRENCY = int(os.environ.get('TRIP_PLANNER_RENDER_CONCURRENCY', str(os.cpu_count() or 2)))
+TRIP_PLANNER_ADMISSION_QUEUE = int(os.environ.get('TRIP_PLANNER_ADMISSION_QUEUE', '16'))
+TRIP_PLANNER_ADMISSION_TIMEOUT = float(os.environ.get('TRIP_PLANNER_ADMISSION_TIMEOUT', '2.0'))
+
+# Daily log ZIP exports: threads rendering logs that have no stored image, and the widest date range.
+TRIP_PLANNER_EXPORT_WORKERS = int(os.environ.get('TRIP_PLANNER_EXPORT_WORKERS', '4'))
+TRIP_PLANNER_EXPORT_MAX_DAYS = int(os.environ.get('TRIP_PLANNER_EXPORT_MAX_DAYS', '366'))
+
+# Decimal places kept for floats in JSON responses (6 is ~0.1 m for coordinates); -1 keeps full precision.
+TRIP_PLANNER_JSON_FLOAT_DIGITS = int(os.environ.get('TRIP_PLANNER_JSON_FLOAT_DIGITS', '6'))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -104,14 +185,43 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Honor the 'X-Forwarded-Proto' header for request.is_secure()
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
+# trip_planner messages (startup timing, profiles, errors with tracebacks) go to stderr,
+# which gunicorn collects.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'trip_planner': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'x-profile')
+CORS_EXPOSE_HEADERS = ['X-Profile-Id']
 
 REST_FRAMEWORK = {
+    # orjson for application/json (the default), MessagePack for application/msgpack.
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'trip_planner.renderers.ORJSONRenderer',
+        'trip_planner.renderers.MessagePackRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
         'rest_framework.parsers.JSONParser',
     ],
 }
+
+# Request profiling for trip_planner views. Off unless a sample rate is set or the
+# X-Profile request header is enabled; when TRIP_PLANNER_PROFILE_TOKEN is set the
+# header value must match it.
+TRIP_PLANNER_PROFILE_SAMPLE_RATE = float(os.environ.get('TRIP_PLANNER_PROFILE_SAMPLE_RATE', '0'))
+TRIP_PLANNER_PROFILE_HEADER_ENABLED = os.environ.get('TRIP_PLANNER_PROFILE_HEADER_ENABLED', 'False') == 'True'
+TRIP_PLANNER_PROFILE_TOKEN = os.environ.get('TRIP_PLANNER_PROFILE_TOKEN', '')
+TRIP_PLANNER_PROFILER = os.environ.get('TRIP_PLANNER_PROFILER', 'sampling')  # 'sampling' or 'cprofile'
+TRIP_PLANNER_PROFILE_INTERVAL = float(os.environ.get('TRIP_PLANNER_PROFILE_INTERVAL', '0.005'))
+TRIP_PLANNER_PROFILE_DIR = os.environ.get('TRIP_PLANNER_PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+# Newest profile files kept in TRIP_PLANNER_PROFILE_DIR; older ones are deleted (0 keeps all).
+TRIP_PLANNER_PROFILE_KEEP = int(os.environ.get('TRIP_PLANNER_PROFILE_KEEP', '200'))
@@ -7,3 +7,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'eld_backend.settings')
 
 application = get_wsgi_application()
+
+# Only the web server warms up; migrate and the management commands never load this module.
+from trip_planner.services import warm_up  # noqa: E402
+
+warm_up()
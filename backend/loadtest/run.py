@@ -0,0 +1,444 @@
+import argparse
+import importlib.util
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from loadtest.stubs import StubConfig, load_cities, road_miles, serve  # noqa: E402
+
+
+# Trip classes by road miles from pickup to dropoff, and their default share of traffic.
+TRIP_CLASSES = {
+    'short': (50, 300),
+    'regional': (300, 700),
+    'medium': (700, 1500),
+    'long': (1500, 3500),
+}
+DEFAULT_MIX = 'short=45,regional=30,medium=15,long=10'
+MAX_DEADHEAD_MILES = 250
+STREETS = ['Main St', 'Industrial Pkwy', 'Commerce Dr', 'Freight Ave', 'Depot Rd', 'Terminal Blvd']
+STAGES = ['parse', 'queue', 'routing', 'schedule', 'render', 'store']
+
+# gunicorn arguments on top of the Procfile's `eld_backend.wsgi --preload` per server setup.
+SERVER_PROFILES = {
+    'sync': lambda args: ['--worker-class', 'sync'],
+    'gthread': lambda args: ['--worker-class', 'gthread', '--threads', str(args.threads)],
+    'gevent': lambda args: ['--worker-class', 'gevent', '--worker-connections', str(args.threads * 25)],
+}
+PROFILE_MODULES = {'gevent': 'gevent'}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in TRIP_CLASSES:
+            raise argparse.ArgumentTypeError(f"Unknown trip class {name!r}; use {', '.join(TRIP_CLASSES)}")
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Bad weight for {name}: {weight!r}")
+    if not mix or sum(mix.values()) <= 0:
+        raise argparse.ArgumentTypeError('The mix needs at least one positive weight')
+    return mix
+
+
+def parse_levels(value: str) -> List[int]:
+    try:
+        levels = [int(level) for level in value.split(',') if level.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Bad concurrency list: {value!r}")
+    if not levels or min(levels) < 1:
+        raise argparse.ArgumentTypeError('Concurrency levels must be positive integers')
+    return levels
+
+
+class TripMix:
+    # Draws plan_trip payloads between bundled cities: a short deadhead to the pickup, then
+    # a loaded leg of the drawn class. Cold trips use street addresses, which miss the
+    # gazetteer and (mostly) the route cache, so they reach the provider stubs.
+
+    def __init__(self, mix: Dict[str, float], cold_ratio: float, eld_logs: str, seed: Optional[int] = None):
+        self.random = random.Random(seed)
+        self.cold_ratio = cold_ratio
+        self.eld_logs = eld_logs
+        self.cities = load_cities()
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+        self.lanes: Dict[str, List[Tuple[int, int]]] = {name: [] for name in TRIP_CLASSES}
+        self.nearby: Dict[int, List[int]] = {}
+        points = [(city['lat'], city['lon']) for city in self.cities]
+        for i, a in enumerate(points):
+            self.nearby[i] = [j for j, b in enumerate(points) if road_miles(a, b) <= MAX_DEADHEAD_MILES]
+            for j, b in enumerate(points):
+                miles = road_miles(a, b)
+                for name, (low, high) in TRIP_CLASSES.items():
+                    if low <= miles < high:
+                        self.lanes[name].append((i, j))
+        for name in self.names:
+            if not self.lanes[name]:
+                raise ValueError(f"No city pairs fall in the {name} class")
+        self.lock = threading.Lock()
+        self.sequence = 0
+
+    def _place(self, index: int, cold: bool) -> str:
+        name = self.cities[index]['name']
+        if not cold:
+            return name
+        return f"{self.random.randint(1, 99999)} {self.random.choice(STREETS)}, {name}"
+
+    def next(self) -> Tuple[str, Dict]:
+        with self.lock:
+            self.sequence += 1
+            trip_class = self.random.choices(self.names, self.weights)[0]
+            pickup, dropoff = self.random.choice(self.lanes[trip_class])
+            current = self.random.choice(self.nearby[pickup])
+            cold = self.random.random() < self.cold_ratio
+            payload = {
+                'current_location': self._place(current, cold),
+                'pickup_location': self._place(pickup, cold),
+                'dropoff_location': self._place(dropoff, cold),
+                'current_cycle_used': round(self.random.uniform(0, 40), 1),
+                'driver_name': f"Load Test {self.sequence % 50:02d}",
+                'eld_logs': self.eld_logs,
+            }
+        return trip_class, payload
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    stages = {}
+    for entry in header.split(','):
+        name, _, params = entry.strip().partition(';')
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'dur':
+                try:
+                    stages[name] = float(value)
+                except ValueError:
+                    pass
+    return stages
+
+
+def drive(url: str, mix: TripMix, concurrency: int, duration: float, warmup: float,
+          timeout: float) -> Tuple[List[Dict], float]:
+
+    # Closed loop: each client sends its next trip as soon as the last one returns, so
+    # `concurrency` requests are always in flight. Only requests that finish inside the
+    # measured window (after the warm-up) are kept.
+    started = time.monotonic()
+    window_start = started + warmup
+    deadline = window_start + duration
+    samples: List[Dict] = []
+    lock = threading.Lock()
+
+    def client():
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            trip_class, payload = mix.next()
+            sent = time.monotonic()
+            try:
+                response = session.post(url, json=payload, timeout=timeout)
+                status, timing = response.status_code, response.headers.get('Server-Timing', '')
+            except requests.RequestException as e:
+                status, timing = type(e).__name__, ''
+            done = time.monotonic()
+            if window_start <= done <= deadline:
+                with lock:
+                    samples.append({
+                        'class': trip_class,
+                        'status': status,
+                        'latency_ms': (done - sent) * 1000,
+                        'stages': parse_server_timing(timing),
+                    })
+        session.close()
+
+    clients = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    return samples, duration
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+def summarize(samples: List[Dict], seconds: float) -> Dict:
+
+    ok = [s for s in samples if s['status'] == 200]
+    latencies = [s['latency_ms'] for s in ok]
+    statuses: Dict[str, int] = {}
+    for s in samples:
+        statuses[str(s['status'])] = statuses.get(str(s['status']), 0) + 1
+    stages = {}
+    for stage in STAGES:
+        values = [s['stages'].get(stage, 0.0) for s in ok]
+        stages[stage] = round(statistics.fmean(values), 1) if values else 0.0
+    # Whatever the view did not time: request parsing, response rendering, the network
+    # and any wait for a free gunicorn worker.
+    other = [s['latency_ms'] - sum(s['stages'].values()) for s in ok]
+    stages['other'] = round(statistics.fmean(other), 1) if other else 0.0
+    classes = {}
+    for trip_class in TRIP_CLASSES:
+        values = [s['latency_ms'] for s in ok if s['class'] == trip_class]
+        if values:
+            classes[trip_class] = {
+                'count': len(values),
+                'p50_ms': round(percentile(values, 50), 1),
+                'p99_ms': round(percentile(values, 99), 1),
+            }
+    return {
+        'requests': len(samples),
+        'ok': len(ok),
+        'throughput_rps': round(len(ok) / seconds, 2) if seconds else 0.0,
+        'statuses': statuses,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 1),
+            'p90': round(percentile(latencies, 90), 1),
+            'p99': round(percentile(latencies, 99), 1),
+            'max': round(max(latencies), 1) if latencies else 0.0,
+        },
+        'stages_mean_ms': stages,
+        'classes': classes,
+    }
+
+
+def stub_counts(url: str) -> Dict[str, int]:
+    try:
+        return requests.get(f"{url}/__stats", timeout=5).json()
+    except (requests.RequestException, ValueError):
+        return {}
+
+
+def start_stub(config: StubConfig) -> Tuple[multiprocessing.Process, str]:
+    ready = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve, args=(config, 0, ready), daemon=True)
+    process.start()
+    return process, f"http://127.0.0.1:{ready.get(timeout=30)}"
+
+
+class AppServer:
+    # One gunicorn instance for a server profile, with its own database and cache directory
+    # and the providers pointed at the stubs.
+
+    def __init__(self, profile: str, args, nominatim_url: str, osrm_url: str):
+        self.profile = profile
+        self.args = args
+        self.port = _free_port()
+        self.workdir = tempfile.mkdtemp(prefix=f'trip-planner-load-{profile}-')
+        self.log_path = os.path.join(self.workdir, 'gunicorn.log')
+        self.env = dict(os.environ)
+        self.env.update({
+            'DJANGO_SETTINGS_MODULE': 'eld_backend.settings',
+            'DATABASE_URL': args.database_url or f"sqlite:///{os.path.join(self.workdir, 'db.sqlite3')}",
+            'TRIP_PLANNER_CACHE_DIR': os.path.join(self.workdir, 'cache'),
+            'TRIP_PLANNER_NOMINATIM_URL': nominatim_url,
+            'TRIP_PLANNER_OSRM_URL': osrm_url,
+            'TRIP_PLANNER_NOMINATIM_RPS': str(args.nominatim_rps),
+            'TRIP_PLANNER_PROVIDER_WORKERS': str(args.workers),
+            'TRIP_PLANNER_STORE_TRIPS': 'True' if args.store_trips else 'False',
+            'DEBUG': 'False',
+            'PYTHONUNBUFFERED': '1',
+        })
+        self.env.pop('ORS_API_KEY', None)
+        self.process = None
+        self.url = f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+
+        migrate = subprocess.run(
+            [sys.executable, 'manage.py', 'migrate', '--noinput', '-v', '0'],
+            cwd=BACKEND_DIR, env=self.env,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+        )
+        if migrate.returncode:
+            raise RuntimeError(f"migrate failed for {self.profile}:\n{migrate.stdout}")
+        command = [
+            sys.executable, '-m', 'gunicorn', 'eld_backend.wsgi', '--preload',
+            '--bind', f"127.0.0.1:{self.port}",
+            '--workers', str(self.args.workers),
+            '--timeout', str(int(self.args.timeout) + 30),
+        ] + SERVER_PROFILES[self.profile](self.args)
+        # Server logs and tracebacks go to the log file, not the report.
+        log = open(self.log_path, 'wb')
+        self.process = subprocess.Popen(command, cwd=BACKEND_DIR, env=self.env, stdout=log, stderr=subprocess.STDOUT)
+        log.close()
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"gunicorn ({self.profile}) exited; see {self.log_path}")
+            try:
+                if requests.get(f"{self.url}/api/health/", timeout=2).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.25)
+        raise RuntimeError(f"gunicorn ({self.profile}) did not come up; see {self.log_path}")
+
+    def stop(self, keep: bool = False):
+        if self.process is not None and self.process.poll() is None:
+            self.process.send_signal(signal.SIGTERM)
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        if not keep:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def print_result(profile: str, concurrency: int, result: Dict):
+    latency = result['latency_ms']
+    stages = result['stages_mean_ms']
+    shed = result['statuses'].get('503', 0)
+    errors = result['requests'] - result['ok'] - shed
+    print(
+        f"{profile:<8} {concurrency:>5} {result['throughput_rps']:>8.2f} {result['ok']:>6} {shed:>5} {errors:>5}"
+        f" {latency['p50']:>8.0f} {latency['p90']:>8.0f} {latency['p99']:>8.0f} {latency['max']:>8.0f}  "
+        + ' '.join(f"{stages[stage]:>8.0f}" for stage in STAGES + ['other'])
+    )
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(
+        description='Drive plan_trip through gunicorn against offline provider stubs.'
+    )
+    parser.add_argument('--servers', default='sync,gthread',
+                        help=f"Comma-separated server profiles: {', '.join(SERVER_PROFILES)}")
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1)),
+                        help='gunicorn worker processes (default: WEB_CONCURRENCY or CPU count)')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('GUNICORN_THREADS', 16)),
+                        help='Threads per gthread worker (default: GUNICORN_THREADS or 16, as in the Procfile)')
+    parser.add_argument('--concurrency', type=parse_levels, default=parse_levels('1,2,4,8,16'),
+                        help='Comma-separated numbers of clients with a request in flight')
+    parser.add_argument('--duration', type=float, default=20.0, help='Measured seconds per level')
+    parser.add_argument('--warmup', type=float, default=3.0, help='Unmeasured seconds before each level')
+    parser.add_argument('--timeout', type=float, default=60.0, help='Client timeout per request')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"Trip class weights (default {DEFAULT_MIX})")
+    parser.add_argument('--cold-ratio', type=float, default=0.2,
+                        help='Share of trips with street addresses that reach the provider stubs')
+    parser.add_argument('--eld-logs', choices=['daily', 'links'], default='daily')
+    parser.add_argument('--store-trips', action='store_true', help='Persist trips as in production')
+    parser.add_argument('--database-url', help='Database for the app (default: a fresh SQLite file per server)')
+    parser.add_argument('--nominatim-rps', type=float, default=0.0, help='App-side Nominatim rate limit, shared by all workers')
+    parser.add_argument('--geocode-latency-ms', type=float, default=150.0)
+    parser.add_argument('--route-latency-ms', type=float, default=250.0)
+    parser.add_argument('--jitter-ms', type=float, default=50.0, help='Mean extra provider delay')
+    parser.add_argument('--geocode-error-rate', type=float, default=0.0)
+    parser.add_argument('--route-error-rate', type=float, default=0.0)
+    parser.add_argument('--points-per-mile', type=float, default=5.0, help='Stub route geometry density')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='Also write the results to this file')
+    parser.add_argument('--keep', action='store_true', help='Keep each server\'s database, cache and log')
+    args = parser.parse_args(argv)
+
+    if importlib.util.find_spec('gunicorn') is None:
+        parser.error('gunicorn is not installed (pip install -r requirements.txt)')
+    profiles = []
+    for profile in (name.strip() for name in args.servers.split(',') if name.strip()):
+        if profile not in SERVER_PROFILES:
+            parser.error(f"Unknown server profile {profile!r}")
+        module = PROFILE_MODULES.get(profile)
+        if module and importlib.util.find_spec(module) is None:
+            print(f"Skipping {profile}: {module} is not installed")
+            continue
+        profiles.append(profile)
+
+    geocoder, geocoder_url = start_stub(StubConfig(
+        args.geocode_latency_ms, args.jitter_ms, args.geocode_error_rate, args.points_per_mile, args.seed,
+    ))
+    router, router_url = start_stub(StubConfig(
+        args.route_latency_ms, args.jitter_ms, args.route_error_rate, args.points_per_mile, args.seed,
+    ))
+    print(
+        f"Stubs: geocoder {geocoder_url} ({args.geocode_latency_ms:.0f} ms, {args.geocode_error_rate:.0%} errors), "
+        f"router {router_url} ({args.route_latency_ms:.0f} ms, {args.route_error_rate:.0%} errors); "
+        f"{args.workers} workers, mix {', '.join(f'{k}={v:g}' for k, v in args.mix.items())}, "
+        f"{args.cold_ratio:.0%} cold"
+    )
+    print(
+        f"{'server':<8} {'conc':>5} {'req/s':>8} {'ok':>6} {'503':>5} {'err':>5}"
+        f" {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}  "
+        + ' '.join(f"{stage:>8}" for stage in STAGES + ['other'])
+    )
+
+    results = []
+    try:
+        for profile in profiles:
+            server = AppServer(profile, args, geocoder_url, router_url)
+            try:
+                server.start()
+                # Fresh trips per server, so each profile sees the same request sequence.
+                mix = TripMix(args.mix, args.cold_ratio, args.eld_logs, args.seed)
+                for concurrency in args.concurrency:
+                    before = (stub_counts(geocoder_url), stub_counts(router_url))
+                    samples, seconds = drive(
+                        f"{server.url}/api/plan-trip/", mix, concurrency, args.duration, args.warmup, args.timeout,
+                    )
+                    result = summarize(samples, seconds)
+                    after = (stub_counts(geocoder_url), stub_counts(router_url))
+                    result['provider_calls'] = {
+                        key: counts.get(key, 0) - previous.get(key, 0)
+                        for previous, counts in zip(before, after) for key in counts
+                    }
+                    result.update({'server': profile, 'concurrency': concurrency})
+                    results.append(result)
+                    print_result(profile, concurrency, result)
+            finally:
+                server.stop(keep=args.keep)
+                if args.keep:
+                    print(f"{profile}: database, cache and log kept in {server.workdir}")
+    except KeyboardInterrupt:
+        print('Interrupted')
+    finally:
+        for stub in (geocoder, router):
+            stub.terminate()
+            stub.join()
+
+    print('Stage columns are mean ms from Server-Timing; queue is admission wait, other is time outside the view.')
+    for profile in profiles:
+        rows = [r for r in results if r['server'] == profile]
+        if rows:
+            best = max(rows, key=lambda r: r['throughput_rps'])
+            print(f"{profile}: peak {best['throughput_rps']:.2f} trips/s at concurrency {best['concurrency']}")
+
+    if args.json:
+        config = {key: value for key, value in vars(args).items() if key != 'json'}
+        with open(args.json, 'w') as fh:
+            json.dump({'config': config, 'results': results}, fh, indent=2)
+        print(f"Wrote {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+import argparse
+import csv
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+CITIES_PATH = Path(__file__).resolve().parent.parent / 'trip_planner' / 'data' / 'us_cities.csv'
+
+EARTH_RADIUS_MILES = 3958.7613
+METERS_PER_MILE = 1609.344
+# Road miles per great-circle mile and the cruising speed behind stub durations.
+ROAD_FACTOR = 1.2
+AVERAGE_MPH = 55.0
+# Street addresses land within this many degrees of their city.
+ADDRESS_SPREAD = 0.05
+
+
+def load_cities(path: Path = CITIES_PATH) -> List[Dict]:
+    with open(path, newline='', encoding='utf-8') as fh:
+        return [
+            {
+                'name': row['name'],
+                'lat': float(row['latitude']),
+                'lon': float(row['longitude']),
+                'population': int(row['population'] or 0),
+            }
+            for row in csv.DictReader(fh)
+        ]
+
+
+def haversine_miles(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    lat0, lon0, lat1, lon1 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat1 - lat0) / 2) ** 2 + math.cos(lat0) * math.cos(lat1) * math.sin((lon1 - lon0) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(math.sqrt(h))
+
+
+def road_miles(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    return haversine_miles(a, b) * ROAD_FACTOR
+
+
+class StubConfig:
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 points_per_mile: float = 5.0, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.points_per_mile = points_per_mile
+        self.seed = seed
+
+
+class ProviderStub(ThreadingHTTPServer):
+    # Answers Nominatim /search and OSRM /route and /table requests from the bundled city
+    # list and straight-line geometry, after an artificial delay; a share of requests fail
+    # with 503. GET /__stats returns request counts per endpoint and status.
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address: Tuple[str, int], config: StubConfig):
+        super().__init__(address, StubHandler)
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.places = {city['name'].lower(): (city['lat'], city['lon']) for city in load_cities()}
+        self.counts: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def count(self, key: str):
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def simulate_call(self) -> bool:
+        with self.lock:
+            jitter = self.random.expovariate(1 / self.config.jitter_ms) if self.config.jitter_ms > 0 else 0.0
+            fail = self.random.random() < self.config.error_rate
+        time.sleep((self.config.latency_ms + jitter) / 1000)
+        return fail
+
+    def geocode(self, query: str) -> Optional[Tuple[float, float]]:
+
+        # "City, ST" as listed; anything in front of it ("1200 Main St, ") is a street address
+        # placed near the city, at the same spot every time.
+        parts = [part.strip() for part in query.split(',') if part.strip()]
+        for start in range(len(parts)):
+            coords = self.places.get(', '.join(parts[start:]).lower())
+            if coords is None:
+                continue
+            if start == 0:
+                return coords
+            spread = zlib.crc32(query.lower().encode('utf-8'))
+            dlat = ((spread & 0xFFFF) / 0xFFFF - 0.5) * 2 * ADDRESS_SPREAD
+            dlon = ((spread >> 16) / 0xFFFF - 0.5) * 2 * ADDRESS_SPREAD
+            return (round(coords[0] + dlat, 6), round(coords[1] + dlon, 6))
+        return None
+
+
+def _parse_points(path: str, prefix: str) -> List[Tuple[float, float]]:
+    points = []
+    for pair in unquote(path[len(prefix):]).split(';'):
+        lon, lat = pair.split(',')
+        points.append((float(lat), float(lon)))
+    if len(points) < 2:
+        raise ValueError('at least two coordinates are required')
+    return points
+
+
+@lru_cache(maxsize=4096)
+def _route_body(path: str, points_per_mile: float) -> bytes:
+
+    # Cached per URL, so serving a repeated route costs the stub next to nothing.
+    points = _parse_points(path, '/route/v1/driving/')
+    coordinates = [[points[0][1], points[0][0]]]
+    legs = []
+    for start, end in zip(points, points[1:]):
+        miles = road_miles(start, end)
+        steps = max(int(miles * points_per_mile), 1)
+        for i in range(1, steps + 1):
+            ratio = i / steps
+            coordinates.append([
+                round(start[1] + (end[1] - start[1]) * ratio, 6),
+                round(start[0] + (end[0] - start[0]) * ratio, 6),
+            ])
+        legs.append({
+            'distance': round(miles * METERS_PER_MILE, 1),
+            'duration': round(miles / AVERAGE_MPH * 3600, 1),
+            'summary': '',
+            'steps': [],
+            'weight': round(miles / AVERAGE_MPH * 3600, 1),
+        })
+    route = {
+        'geometry': {'type': 'LineString', 'coordinates': coordinates},
+        'legs': legs,
+        'distance': round(sum(leg['distance'] for leg in legs), 1),
+        'duration': round(sum(leg['duration'] for leg in legs), 1),
+        'weight_name': 'routability',
+    }
+    waypoints = [{'location': [lon, lat], 'name': '', 'distance': 0} for lat, lon in points]
+    return json.dumps({'code': 'Ok', 'routes': [route], 'waypoints': waypoints}).encode('utf-8')
+
+
+def _table_body(path: str) -> bytes:
+    points = _parse_points(path, '/table/v1/driving/')
+    distances = [[round(road_miles(a, b) * METERS_PER_MILE, 1) for b in points] for a in points]
+    durations = [[round(d / METERS_PER_MILE / AVERAGE_MPH * 3600, 1) for d in row] for row in distances]
+    return json.dumps({'code': 'Ok', 'distances': distances, 'durations': durations}).encode('utf-8')
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+
+        url = urlsplit(self.path)
+        if url.path == '/__stats':
+            self._send(200, json.dumps(self.server.counts).encode('utf-8'))
+            return
+
+        if url.path.startswith('/search'):
+            kind = 'nominatim'
+        elif url.path.startswith('/route/v1/driving/'):
+            kind = 'osrm_route'
+        elif url.path.startswith('/table/v1/driving/'):
+            kind = 'osrm_table'
+        else:
+            self.server.count('unknown 404')
+            self._send(404, b'{"error": "not found"}')
+            return
+
+        if self.server.simulate_call():
+            self.server.count(f"{kind} 503")
+            self._send(503, b'{"error": "stub failure"}')
+            return
+        try:
+            if kind == 'nominatim':
+                query = parse_qs(url.query).get('q', [''])[0]
+                coords = self.server.geocode(query)
+                places = []
+                if coords:
+                    places.append({
+                        'place_id': zlib.crc32(query.encode('utf-8')),
+                        'lat': str(coords[0]),
+                        'lon': str(coords[1]),
+                        'display_name': query,
+                    })
+                body = json.dumps(places).encode('utf-8')
+            elif kind == 'osrm_route':
+                body = _route_body(url.path, self.server.config.points_per_mile)
+            else:
+                body = _table_body(url.path)
+        except ValueError as e:
+            self.server.count(f"{kind} 400")
+            self._send(400, json.dumps({'code': 'InvalidQuery', 'message': str(e)}).encode('utf-8'))
+            return
+        self.server.count(f"{kind} 200")
+        self._send(200, body)
+
+
+def serve(config: StubConfig, port: int = 0, ready=None):
+
+    # Entry point for a stub process; `ready` (a multiprocessing queue) receives the port.
+    server = ProviderStub(('127.0.0.1', port), config)
+    if ready is not None:
+        ready.put(server.server_address[1])
+    server.serve_forever()
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Offline Nominatim/OSRM stand-in for load tests.')
+    parser.add_argument('--port', type=int, default=8701)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='Mean of the extra, exponentially distributed delay')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with 503')
+    parser.add_argument('--points-per-mile', type=float, default=5.0, help='Route geometry density')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+
+    config = StubConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.points_per_mile, args.seed)
+    print(f"Provider stub on http://127.0.0.1:{args.port}")
+    try:
+        serve(config, args.port)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,17 @@
 from django.contrib import admin
 
+from .models import DailyLog, Trip
 
+
+@admin.register(Trip)
+class TripAdmin(admin.ModelAdmin):
+    list_display = ('id', 'driver_name', 'origin', 'destination', 'start_date', 'total_distance', 'total_days')
+    list_filter = ('start_date', 'schedule_mode')
+    search_fields = ('driver_name', 'lane')
+    exclude = ('route',)
+
+
+@admin.register(DailyLog)
+class DailyLogAdmin(admin.ModelAdmin):
+    list_display = ('trip', 'day', 'date', 'size')
+    raw_id_fields = ('trip',)
@@ -0,0 +1,114 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+
+# Weight of the newest hold time in the running average behind Retry-After.
+HOLD_TIME_WEIGHT = 0.2
+MAX_RETRY_AFTER = 60
+
+
+class Overloaded(Exception):
+
+    def __init__(self, stage: str, retry_after: int, reason: str):
+        super().__init__(f"The {stage} stage is at capacity ({reason}); retry in {retry_after}s")
+        self.stage = stage
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class StageLimiter:
+    # At most `limit` requests run the stage at once. Up to `queue_size` more wait for a
+    # slot, each for at most `timeout` seconds; anyone beyond that is turned away at once
+    # instead of piling onto a saturated worker. A limit of 0 disables the limiter.
+
+    def __init__(self, stage: str, limit: int, queue_size: int, timeout: float):
+        self.stage = stage
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.admitted = 0
+        self.queued = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+        self.wait_seconds = 0.0
+        self.hold_seconds = 0.0
+
+    def _retry_after(self) -> int:
+        # Roughly how long until the requests ahead have drained, at the recent hold time.
+        backlog = (self.active + self.waiting) / max(self.limit, 1)
+        return min(max(math.ceil(self.hold_seconds * backlog), 1), MAX_RETRY_AFTER)
+
+    def check(self):
+        # Sheds early, before a request does work upstream of a stage that would refuse it.
+        with self._cond:
+            if self.limit and self.active >= self.limit and self.waiting >= self.queue_size:
+                self.shed_queue_full += 1
+                raise Overloaded(self.stage, self._retry_after(), 'queue full')
+
+    def acquire(self):
+
+        with self._cond:
+            if not self.limit or self.active < self.limit:
+                self.active += 1
+                self.admitted += 1
+                return
+            if self.waiting >= self.queue_size:
+                self.shed_queue_full += 1
+                raise Overloaded(self.stage, self._retry_after(), 'queue full')
+
+            self.waiting += 1
+            self.queued += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+            started = time.monotonic()
+            deadline = started + self.timeout
+            try:
+                while self.active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.shed_timeout += 1
+                        raise Overloaded(self.stage, self._retry_after(), 'wait timed out')
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+                self.wait_seconds += time.monotonic() - started
+            self.active += 1
+            self.admitted += 1
+
+    def release(self, held: float):
+        with self._cond:
+            self.active -= 1
+            self.hold_seconds += HOLD_TIME_WEIGHT * (held - self.hold_seconds)
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                'limit': self.limit,
+                'queue_size': self.queue_size,
+                'timeout_s': self.timeout,
+                'active': self.active,
+                'queue_depth': self.waiting,
+                'max_queue_depth': self.max_waiting,
+                'admitted': self.admitted,
+                'queued': self.queued,
+                'shed_queue_full': self.shed_queue_full,
+                'shed_timeout': self.shed_timeout,
+                'avg_wait_ms': round(self.wait_seconds / self.queued * 1000, 2) if self.queued else 0.0,
+                'avg_hold_ms': round(self.hold_seconds * 1000, 2),
+            }
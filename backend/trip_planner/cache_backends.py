@@ -0,0 +1,257 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from array import array
+from itertools import accumulate, repeat
+from operator import mul, sub, truediv
+from typing import Any, Dict, List, Optional
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+# Coordinates are stored as integer micro-degrees, delta-encoded along the line.
+GEOMETRY_SCALE = 1e6
+MIN_GEOMETRY_POINTS = 64
+COMPRESS_MIN_BYTES = 1024
+# Reads refresh an entry's LRU timestamp at most this often, to keep reads mostly read-only.
+TOUCH_INTERVAL = 60.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_accessed_idx ON cache_entries (accessed);
+CREATE TABLE IF NOT EXISTS cache_stats (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    entries INTEGER NOT NULL,
+    bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_stats VALUES (0, 0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_entries_insert AFTER INSERT ON cache_entries BEGIN
+    UPDATE cache_stats SET entries = entries + 1, bytes = bytes + NEW.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_update AFTER UPDATE OF size ON cache_entries BEGIN
+    UPDATE cache_stats SET bytes = bytes + NEW.size - OLD.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_delete AFTER DELETE ON cache_entries BEGIN
+    UPDATE cache_stats SET entries = entries - 1, bytes = bytes - OLD.size WHERE id = 0;
+END;
+"""
+
+
+def _is_geometry(value: Any) -> bool:
+    return (
+        isinstance(value, (list, tuple)) and len(value) >= MIN_GEOMETRY_POINTS
+        and isinstance(value[0], (list, tuple)) and len(value[0]) == 2
+        and isinstance(value[0][0], float)
+    )
+
+
+def pack_geometry(points: List) -> Optional[tuple]:
+
+    # map() over operator functions keeps the per-point work in C.
+    lat_values, lon_values = zip(*points)
+    lats = list(map(round, map(mul, lat_values, repeat(GEOMETRY_SCALE))))
+    lons = list(map(round, map(mul, lon_values, repeat(GEOMETRY_SCALE))))
+    # Only lossless when the provider sent at most 6 decimals; otherwise keep the list.
+    if (tuple(map(truediv, lats, repeat(GEOMETRY_SCALE))) != lat_values
+            or tuple(map(truediv, lons, repeat(GEOMETRY_SCALE))) != lon_values):
+        return None
+    deltas = array('i', [lats[0]])
+    deltas.extend(map(sub, lats[1:], lats))
+    deltas.append(lons[0])
+    deltas.extend(map(sub, lons[1:], lons))
+    return (isinstance(points, tuple), isinstance(points[0], tuple), deltas.tobytes())
+
+
+def unpack_geometry(packed: tuple) -> List:
+
+    outer_tuple, inner_tuple, data = packed
+    deltas = array('i')
+    deltas.frombytes(data)
+    count = len(deltas) // 2
+    lats = map(truediv, accumulate(deltas[:count]), repeat(GEOMETRY_SCALE))
+    lons = map(truediv, accumulate(deltas[count:]), repeat(GEOMETRY_SCALE))
+    points = list(zip(lats, lons)) if inner_tuple else list(map(list, zip(lats, lons)))
+    return tuple(points) if outer_tuple else points
+
+
+def dumps(value: Any) -> bytes:
+
+    geometry: Dict[str, tuple] = {}
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if _is_geometry(item):
+                packed = pack_geometry(item)
+                if packed is not None:
+                    geometry[key] = packed
+        if geometry:
+            value = {key: item for key, item in value.items() if key not in geometry}
+
+    data = pickle.dumps((value, geometry), pickle.HIGHEST_PROTOCOL)
+    # Already-compressed payloads (PNG log sheets) are stored as they are.
+    if len(data) >= COMPRESS_MIN_BYTES and not isinstance(value, bytes):
+        compressed = zlib.compress(data, 1)
+        if len(compressed) < len(data):
+            return b'z' + compressed
+    return b'p' + data
+
+
+def loads(blob: bytes) -> Any:
+
+    data = zlib.decompress(blob[1:]) if blob[:1] == b'z' else blob[1:]
+    value, geometry = pickle.loads(data)
+    if geometry:
+        value = dict(value)
+        for key, packed in geometry.items():
+            value[key] = unpack_geometry(packed)
+    return value
+
+
+class SQLiteCache(BaseCache):
+    # One SQLite file in WAL mode shared by every worker process on the host. Each write
+    # is a single upsert (atomic); readers never block writers. Entries are evicted least
+    # recently used first once MAX_ENTRIES or MAX_BYTES is exceeded.
+
+    def __init__(self, location: str, params: Dict):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = location
+        self.max_bytes = int(options.get('MAX_BYTES', 256 * 1024 * 1024))
+        self.busy_timeout = float(options.get('BUSY_TIMEOUT', 5.0))
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+
+        conn = getattr(self._local, 'conn', None)
+        # Connections are per thread and are never carried across a fork.
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _expiry(self, timeout) -> Optional[float]:
+        return self.get_backend_timeout(timeout)
+
+    def get(self, key, default=None, version=None):
+
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._connection()
+        row = conn.execute(
+            'SELECT value, expires, accessed FROM cache_entries WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return default
+        value, expires, accessed = row
+        now = time.time()
+        if expires is not None and expires <= now:
+            conn.execute('DELETE FROM cache_entries WHERE key = ? AND expires <= ?', (key, now))
+            return default
+        if now - accessed > TOUCH_INTERVAL:
+            conn.execute('UPDATE cache_entries SET accessed = ? WHERE key = ?', (now, key))
+        return loads(value)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+
+        key = self.make_and_validate_key(key, version=version)
+        blob = dumps(value)
+        conn = self._connection()
+        conn.execute(
+            'INSERT INTO cache_entries (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size, '
+            'expires = excluded.expires, accessed = excluded.accessed',
+            (key, blob, len(blob), self._expiry(timeout), time.time()),
+        )
+        self._cull(conn)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+
+        key = self.make_and_validate_key(key, version=version)
+        blob = dumps(value)
+        now = time.time()
+        conn = self._connection()
+        # Overwrites only an expired entry; the check and the write are one statement.
+        cursor = conn.execute(
+            'INSERT INTO cache_entries (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size, '
+            'expires = excluded.expires, accessed = excluded.accessed '
+            'WHERE cache_entries.expires IS NOT NULL AND cache_entries.expires <= ?',
+            (key, blob, len(blob), self._expiry(timeout), now, now),
+        )
+        if cursor.rowcount:
+            self._cull(conn)
+        return cursor.rowcount == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute(
+            'UPDATE cache_entries SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self._expiry(timeout), key, time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key, version=None):
+
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+        return cursor.rowcount == 1
+
+    def has_key(self, key, version=None):
+
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            'SELECT 1 FROM cache_entries WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache_entries')
+
+    def stats(self) -> Dict:
+        entries, size = self._connection().execute(
+            'SELECT entries, bytes FROM cache_stats WHERE id = 0'
+        ).fetchone()
+        return {'entries': entries, 'bytes': size, 'max_entries': self._max_entries, 'max_bytes': self.max_bytes}
+
+    def _cull(self, conn: sqlite3.Connection):
+
+        entries, size = conn.execute('SELECT entries, bytes FROM cache_stats WHERE id = 0').fetchone()
+        if entries <= self._max_entries and size <= self.max_bytes:
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'DELETE FROM cache_entries WHERE expires IS NOT NULL AND expires <= ?', (time.time(),)
+            )
+            entries, size = conn.execute('SELECT entries, bytes FROM cache_stats WHERE id = 0').fetchone()
+            while entries and (entries > self._max_entries or size > self.max_bytes):
+                batch = max(entries // self._cull_frequency, 1) if self._cull_frequency else entries
+                conn.execute(
+                    'DELETE FROM cache_entries WHERE key IN '
+                    '(SELECT key FROM cache_entries ORDER BY accessed LIMIT ?)', (batch,)
+                )
+                entries, size = conn.execute('SELECT entries, bytes FROM cache_stats WHERE id = 0').fetchone()
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def close(self, **kwargs):
+        # Connections stay open across requests; Django calls this when each one ends.
+        pass
@@ -0,0 +1,164 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .hos_calculator import HOSCalculator
+from .models import CycleLedger, DutyRecord
+
+
+DUTY_STATUSES = ('off_duty', 'sleeper', 'driving', 'on_duty')
+ON_DUTY_STATUSES = ('driving', 'on_duty')
+
+
+class RollingCycle:
+
+
+    def __init__(
+        self,
+        day: Optional[date] = None,
+        buckets: Optional[List[float]] = None,
+        last_duty_end: Optional[datetime] = None,
+        days: int = HOSCalculator.CYCLE_DAYS
+    ):
+        self.days = days
+        self.day = day
+        self.buckets = list(buckets) if buckets else [0.0] * days
+        self.total = sum(self.buckets)
+        self.last_duty_end = last_duty_end
+
+    def _slot(self, day: date) -> int:
+        return day.toordinal() % self.days
+
+    def advance(self, day: date):
+
+        if self.day is None:
+            self.day = day
+            return
+        gap = (day - self.day).days
+        if gap <= 0:
+            return
+        if gap >= self.days:
+            self.reset()
+        else:
+            # Only the buckets that fall out of the window are touched.
+            for offset in range(1, gap + 1):
+                slot = self._slot(self.day + timedelta(days=offset))
+                self.total -= self.buckets[slot]
+                self.buckets[slot] = 0.0
+        self.day = day
+
+    def add(self, day: date, hours: float):
+
+        self.advance(day)
+        if (self.day - day).days >= self.days:
+            return
+        self.buckets[self._slot(day)] += hours
+        self.total += hours
+
+    def reset(self):
+        self.buckets = [0.0] * self.days
+        self.total = 0.0
+
+    def record(self, start: datetime, end: datetime, status: str):
+
+        if status not in ON_DUTY_STATUSES or end <= start:
+            return
+        # The buckets only move forward; on-duty time from before the last recorded duty
+        # could land before a restart that already cleared them.
+        if self.last_duty_end and start < self.last_duty_end:
+            raise ValueError(
+                f"On-duty record starting {start.isoformat()} is older than the last recorded "
+                f"on-duty time ({self.last_duty_end.isoformat()})"
+            )
+        if self.last_duty_end and start - self.last_duty_end >= timedelta(hours=HOSCalculator.RESTART_HOURS):
+            self.reset()
+
+        cursor = start
+        while cursor < end:
+            midnight = datetime.combine(cursor.date() + timedelta(days=1), datetime.min.time(), cursor.tzinfo)
+            piece_end = min(end, midnight)
+            self.add(cursor.date(), (piece_end - cursor).total_seconds() / 3600)
+            cursor = piece_end
+        self.last_duty_end = end
+
+    def hours_used(self, now: datetime) -> float:
+
+        if self.day is None:
+            return 0.0
+        if self.last_duty_end and now - self.last_duty_end >= timedelta(hours=HOSCalculator.RESTART_HOURS):
+            return 0.0
+        gap = (now.date() - self.day).days
+        if gap >= self.days:
+            return 0.0
+        expired = sum(
+            self.buckets[self._slot(self.day + timedelta(days=offset))]
+            for offset in range(1, gap + 1)
+        )
+        return max(self.total - expired, 0.0)
+
+    def window(self, today: date) -> List[Dict]:
+
+        days = []
+        for offset in range(self.days - 1, -1, -1):
+            day = today - timedelta(days=offset)
+            in_window = self.day is not None and 0 <= (self.day - day).days < self.days
+            hours = self.buckets[self._slot(day)] if in_window else 0.0
+            days.append({'date': day.isoformat(), 'hours': round(hours, 2)})
+        return days
+
+
+def _load(ledger: CycleLedger) -> RollingCycle:
+    return RollingCycle(ledger.day, ledger.buckets, ledger.last_duty_end)
+
+
+def _local(value: datetime) -> datetime:
+    return timezone.localtime(value) if timezone.is_aware(value) else value
+
+
+def _lock_ledger(driver_name: str) -> CycleLedger:
+
+    ledger = CycleLedger.objects.select_for_update().filter(driver_name=driver_name).first()
+    if ledger is not None:
+        return ledger
+    # First records for this driver: a concurrent request may insert the row first, in which
+    # case only this savepoint is rolled back and its row is locked instead.
+    try:
+        with transaction.atomic():
+            return CycleLedger.objects.create(driver_name=driver_name)
+    except IntegrityError:
+        return CycleLedger.objects.select_for_update().get(driver_name=driver_name)
+
+
+@transaction.atomic
+def record_duty(driver_name: str, records: Iterable[Dict]) -> RollingCycle:
+
+    records = sorted(records, key=lambda record: record['start'])
+    ledger = _lock_ledger(driver_name)
+    cycle = _load(ledger)
+
+    DutyRecord.objects.bulk_create([
+        DutyRecord(driver_name=driver_name, start=r['start'], end=r['end'], status=r['status'])
+        for r in records
+    ])
+    for r in records:
+        cycle.record(_local(r['start']), _local(r['end']), r['status'])
+
+    ledger.day = cycle.day
+    ledger.buckets = cycle.buckets
+    ledger.last_duty_end = cycle.last_duty_end
+    ledger.save()
+    return cycle
+
+
+def get_cycle(driver_name: str) -> Optional[RollingCycle]:
+    ledger = CycleLedger.objects.filter(driver_name=driver_name).first()
+    return _load(ledger) if ledger else None
+
+
+def ledger_hours_used(driver_name: str, now: Optional[datetime] = None) -> Optional[float]:
+    cycle = get_cycle(driver_name)
+    if cycle is None:
+        return None
+    return cycle.hours_used(_local(now or timezone.now()))
@@ -0,0 +1,94 @@
+import time
+from typing import Dict, List, Sequence
+
+from .hos_calculator import DutyTimeline, HOSCalculator, split_by_day, wait_for_window  # noqa: F401
+
+
+class DepartureSweep:
+    # The greedy schedule on DutyTimeline's continuous clock, started at the departure hour,
+    # so dock windows and waiting are modelled. Candidates are scored from the segment
+    # tuples; only the winner's schedule is cut into day dicts.
+
+    def __init__(self, hos_calculator: HOSCalculator, fuel_interval: float = 1000.0, fuel_time: float = 0.5):
+        self.hos = hos_calculator
+        self.fuel_interval = fuel_interval
+        self.fuel_time = fuel_time
+
+    def simulate(
+        self,
+        stops: List[Dict],
+        average_speed: float,
+        start_hour: float = 0.0,
+        record: bool = False
+    ) -> Dict:
+
+        timeline = DutyTimeline(
+            self.hos, stops, average_speed, fuel_interval=self.fuel_interval, fuel_time=self.fuel_time
+        )
+        segments = timeline.segments(timeline.run(start_hour))
+        finish = segments[-1][2] + segments[-1][3] if segments else start_hour
+        driving = waiting = 0.0
+        rests = 0
+        for activity, status, _, hours, _, _ in segments:
+            if status == 'driving':
+                driving += hours
+            elif activity == 'dock_wait':
+                waiting += hours
+            elif activity == 'required_rest':
+                rests += 1
+
+        result = {
+            'departure_hour': start_hour,
+            'average_speed': average_speed,
+            'finish': finish,
+            'trip_hours': finish - start_hour,
+            'driving_hours': driving,
+            'wait_hours': waiting,
+            'rest_stops': rests,
+        }
+        if record:
+            result['schedule'] = split_by_day(segments)
+        return result
+
+    def sweep(self, stops: List[Dict], departure_hours: Sequence[float], speeds: Sequence[float]) -> Dict:
+
+        started = time.perf_counter()
+        results = []
+        windowed = any(stop.get('window') for stop in stops)
+        for speed in speeds:
+            if windowed:
+                results.extend(self.simulate(stops, speed, hour) for hour in departure_hours)
+                continue
+            # Without dock windows the rules are time-invariant: one run per speed, shifted.
+            base = self.simulate(stops, speed, 0.0)
+            for hour in departure_hours:
+                results.append(dict(base, departure_hour=hour, finish=base['finish'] + hour))
+
+        front = pareto_front(results)
+        best = min(front, key=lambda r: (r['finish'], r['trip_hours'], r['average_speed']))
+        recommended = self.simulate(stops, best['average_speed'], best['departure_hour'], record=True)
+        return {
+            'options': front,
+            'recommended': recommended,
+            'candidates': len(results),
+            'solve_ms': (time.perf_counter() - started) * 1000,
+        }
+
+
+def pareto_front(results: List[Dict]) -> List[Dict]:
+
+    # Minimize finish time, hours on the road and speed. In lexicographic order a later
+    # candidate can never dominate an earlier one, so each is checked against the
+    # (small) front kept so far.
+    def objectives(result):
+        return (round(result['finish'], 3), round(result['trip_hours'], 3), result['average_speed'])
+
+    front = []
+    front_keys = []
+    for result in sorted(results, key=objectives):
+        key = objectives(result)
+        if any(all(a <= b for a, b in zip(kept, key)) for kept in front_keys):
+            continue
+        front.append(result)
+        front_keys.append(key)
+    return front
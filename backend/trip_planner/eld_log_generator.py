@@ -1,9 +1,24 @@
 
-from PIL import Image, ImageDraw, ImageFont
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple, TYPE_CHECKING, Union
 import io
 import base64
+import hashlib
+import json
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+if TYPE_CHECKING:
+    from PIL import ImageDraw
+
+
+class PNGImage(bytes):
+    
+
+    def data_uri(self) -> str:
+        return f"data:image/png;base64,{base64.b64encode(self).decode()}"
 
 
 class ELDLogGenerator:
@@ -53,15 +68,35 @@ class ELDLogGenerator:
     STATUS_MAP['off_duty']['color'] = COLOR_OFFDUTY
     STATUS_MAP['sleeper']['color']  = COLOR_SLEEPER
 
-    def __init__(self):
+    # Bump when the sheet layout changes so cached renders are not reused.
+    LOG_CACHE_VERSION = 1
+
+    # Trip overview: one compact four-lane row per day under a shared header and legend.
+    OVERVIEW_HEADER_HEIGHT = 150
+    OVERVIEW_LANE_HEIGHT   = 13
+    OVERVIEW_ROW_GAP       = 14
+    OVERVIEW_FOOTER_HEIGHT = 44
+
+    def __init__(self, use_cache: bool = True):
+        self.cache_alias  = getattr(settings, 'TRIP_PLANNER_CACHE_ALIAS', None) if use_cache else None
         self.font_title   = None
         self.font_orb     = None   
         self.font_regular = None
         self.font_small   = None
         self.font_tiny    = None
+        self._template    = None
+        self._overview_row = None
+        self._lock        = threading.Lock()
+
+    
+    def warm_up(self):
+        self._get_template()
 
     
     def _get_fonts(self):
+        if self.font_title is not None:
+            return
+        from PIL import ImageFont
         
         deja_bold   = "/usr/share/fonts/truetype/dejavu/DejaVuSansMono-Bold.ttf"
         deja_reg    = "/usr/share/fonts/truetype/dejavu/DejaVuSansMono.ttf"
@@ -84,7 +119,7 @@ class ELDLogGenerator:
         h = h.lstrip('#')
         return tuple(int(h[i:i+2], 16) for i in (0, 2, 4))
 
-    def _draw_rect_glow(self, draw: ImageDraw.Draw,
+    def _draw_rect_glow(self, draw: 'ImageDraw.ImageDraw',
                         x0, y0, x1, y1,
                         fill: str, glow: str,
                         radius: int = 3):
@@ -102,25 +137,73 @@ class ELDLogGenerator:
         schedule_segments: List[Dict],
         driver_name: str = "Driver",
         date: str = None,
-    ) -> str:
-        self._get_fonts()
-
-        img  = Image.new('RGB', (self.WIDTH, self.HEIGHT), self.COLOR_BG)
+        as_bytes: bool = False,
+    ) -> Union[str, PNGImage]:
+        from PIL import ImageDraw
+
+        # Identical sheets (same lane planned again the same day) come from the shared cache.
+        key = None
+        if self.cache_alias:
+            key = self._log_cache_key(day_number, schedule_segments, driver_name, date)
+            cached = self._cache_get(key)
+            if cached is not None:
+                return cached if as_bytes else cached.data_uri()
+
+        img  = self._get_template().copy()
         draw = ImageDraw.Draw(img)
 
-        self._draw_background(draw)
         self._draw_header(draw, day_number, driver_name, date)
-        self._draw_grid(draw)
         self._draw_status_graph(draw, schedule_segments)
         self._draw_summary(draw, schedule_segments)
 
+        png = self._encode(img, key)
+        return png if as_bytes else png.data_uri()
+
+    def _cache_get(self, key: str):
+        try:
+            cached = caches[self.cache_alias].get(key)
+            return PNGImage(cached) if cached is not None else None
+        except Exception as e:
+            print(f"Log cache read failed: {e}")
+            return None
+
+    def _encode(self, img, key: str = None) -> PNGImage:
         buf = io.BytesIO()
         img.save(buf, format='PNG')
-        buf.seek(0)
-        return f"data:image/png;base64,{base64.b64encode(buf.read()).decode()}"
+        png = PNGImage(buf.getvalue())
+        if key:
+            try:
+                caches[self.cache_alias].set(key, bytes(png))
+            except Exception as e:
+                print(f"Log cache write failed: {e}")
+        return png
+
+    def _log_cache_key(self, day_number: int, schedule_segments: List[Dict], driver_name: str, date: str,
+                       kind: str = 'eld_log') -> str:
+        payload = json.dumps(
+            [self.LOG_CACHE_VERSION, day_number, driver_name, date, schedule_segments],
+            sort_keys=True, default=str,
+        )
+        return f'{kind}:' + hashlib.sha1(payload.encode()).hexdigest()
 
     
-    def _draw_background(self, draw: ImageDraw.Draw):
+    def _get_template(self):
+        # Background and grid are identical on every sheet; render them once and copy.
+        if self._template is None:
+            with self._lock:
+                if self._template is None:
+                    from PIL import Image, ImageDraw
+
+                    self._get_fonts()
+                    img  = Image.new('RGB', (self.WIDTH, self.HEIGHT), self.COLOR_BG)
+                    draw = ImageDraw.Draw(img)
+                    self._draw_background(draw)
+                    self._draw_grid(draw)
+                    self._template = img
+        return self._template
+
+    
+    def _draw_background(self, draw: 'ImageDraw.ImageDraw'):
         
         
         for y in range(0, self.HEIGHT, 4):
@@ -158,7 +241,7 @@ class ELDLogGenerator:
             draw.rectangle([cx, cy + sz - 2, cx + sz, cy + sz], fill=c)
 
     
-    def _draw_header(self, draw: ImageDraw.Draw,
+    def _draw_header(self, draw: 'ImageDraw.ImageDraw',
                      day_number: int, driver_name: str, date: str):
         if not date:
             date = datetime.now().strftime('%Y-%m-%d')
@@ -198,7 +281,7 @@ class ELDLogGenerator:
             ly += 22
 
     
-    def _draw_grid(self, draw: ImageDraw.Draw):
+    def _draw_grid(self, draw: 'ImageDraw.ImageDraw'):
         px_per_hr = self.GRID_WIDTH / self.HOURS_IN_DAY
         row_h     = self.GRID_HEIGHT // 4
         labels    = ['OFF\nDUTY', 'SLEEPER\nBERTH', 'DRIVING', 'ON DUTY\nNOT DRV']
@@ -261,7 +344,7 @@ class ELDLogGenerator:
         )
 
     
-    def _draw_status_graph(self, draw: ImageDraw.Draw,
+    def _draw_status_graph(self, draw: 'ImageDraw.ImageDraw',
                            schedule_segments: List[Dict]):
         px_per_hr = self.GRID_WIDTH / self.HOURS_IN_DAY
         row_h     = self.GRID_HEIGHT // 4
@@ -269,18 +352,7 @@ class ELDLogGenerator:
         for seg in schedule_segments:
             start    = seg.get('start_time', 0)
             end      = seg.get('end_time',   0)
-            activity = seg.get('activity',   '')
-            status   = seg.get('status',    'off_duty')
-
-            
-            if status == 'driving':
-                st = 'driving'
-            elif activity in ['pickup', 'dropoff', 'fuel_stop']:
-                st = 'on_duty'
-            elif activity == 'required_rest':
-                st = 'sleeper'
-            else:
-                st = 'off_duty'
+            st       = self._graph_status(seg)
 
             info = self.STATUS_MAP[st]
             x0   = self.GRID_START_X + int(start * px_per_hr)
@@ -296,12 +368,19 @@ class ELDLogGenerator:
                                  x1, y0 + row_h - pad,
                                  info['color'], info['glow'])
 
-    
-    def _draw_summary(self, draw: ImageDraw.Draw,
-                      schedule_segments: List[Dict]):
-        sy = self.GRID_START_Y + self.GRID_HEIGHT + 52
+    @staticmethod
+    def _graph_status(seg: Dict) -> str:
+        activity = seg.get('activity', '')
+        if seg.get('status', 'off_duty') == 'driving':
+            return 'driving'
+        if activity in ['pickup', 'dropoff', 'fuel_stop']:
+            return 'on_duty'
+        if activity in ['required_rest', 'split_sleeper']:
+            return 'sleeper'
+        return 'off_duty'
 
-        
+    @staticmethod
+    def _totals(schedule_segments: List[Dict]) -> Tuple[float, float, float]:
         total_driving = total_on_duty = total_off_duty = 0
         for seg in schedule_segments:
             dur      = seg.get('duration', 0)
@@ -313,8 +392,17 @@ class ELDLogGenerator:
                 total_on_duty  += dur
             elif activity in ['pickup', 'dropoff', 'fuel_stop', 'required_break']:
                 total_on_duty  += dur
-            elif activity == 'required_rest':
+            elif activity in ['required_rest', 'split_sleeper', 'split_rest', 'cycle_restart']:
                 total_off_duty += dur
+        return total_driving, total_on_duty, total_off_duty
+
+    
+    def _draw_summary(self, draw: 'ImageDraw.ImageDraw',
+                      schedule_segments: List[Dict]):
+        sy = self.GRID_START_Y + self.GRID_HEIGHT + 52
+
+        
+        total_driving, total_on_duty, total_off_duty = self._totals(schedule_segments)
 
         items = [
             ('DRIVING',   f"{total_driving:.1f} HRS",  self.GLOW_DRIVING),
@@ -360,16 +448,172 @@ class ELDLogGenerator:
         self,
         all_schedule_segments: List[Dict],
         driver_name: str = "Driver",
-    ) -> List[str]:
-        days: Dict[int, list] = {}
-        for seg in all_schedule_segments:
-            d = seg.get('day', 0)
-            days.setdefault(d, []).append(seg)
+        as_bytes: bool = False,
+    ) -> List[Union[str, PNGImage]]:
+        days = self._group_by_day(all_schedule_segments)
 
         logs = []
         for day_num in sorted(days.keys()):
             date = (datetime.now() + timedelta(days=day_num)).strftime('%Y-%m-%d')
             logs.append(self.generate_daily_log(
-                day_num + 1, days[day_num], driver_name, date
+                day_num + 1, days[day_num], driver_name, date, as_bytes
             ))
         return logs
+
+    @staticmethod
+    def _group_by_day(all_schedule_segments: List[Dict]) -> Dict[int, list]:
+        days: Dict[int, list] = {}
+        for seg in all_schedule_segments:
+            d = seg.get('day', 0)
+            days.setdefault(d, []).append(seg)
+        return days
+
+    
+    def generate_trip_overview(
+        self,
+        all_schedule_segments: List[Dict],
+        driver_name: str = "Driver",
+        start_date: Optional[str] = None,
+        as_bytes: bool = False,
+    ) -> Union[str, PNGImage]:
+        from PIL import Image, ImageDraw
+
+        # Every day of the trip as a compact row in one image: one encode and one transfer
+        # instead of one full sheet per day.
+        if not start_date:
+            start_date = datetime.now().strftime('%Y-%m-%d')
+        key = None
+        if self.cache_alias:
+            key = self._log_cache_key(0, all_schedule_segments, driver_name, start_date, kind='eld_overview')
+            cached = self._cache_get(key)
+            if cached is not None:
+                return cached if as_bytes else cached.data_uri()
+
+        days  = self._group_by_day(all_schedule_segments)
+        count = max(days.keys()) + 1 if days else 1
+        row   = self._get_overview_row()
+        pitch = row.height
+        top   = self.OVERVIEW_HEADER_HEIGHT
+        img   = Image.new('RGB', (self.WIDTH, top + count * pitch + self.OVERVIEW_FOOTER_HEIGHT), self.COLOR_BG)
+        for i in range(count):
+            img.paste(row, (0, top + i * pitch))
+        draw  = ImageDraw.Draw(img)
+
+        first = datetime.strptime(start_date, '%Y-%m-%d')
+        last  = (first + timedelta(days=count - 1)).strftime('%Y-%m-%d')
+        self._draw_overview_header(draw, driver_name, f"{start_date} > {last}", count)
+
+        # Bars are collected for the whole trip, then drawn one status colour at a time.
+        px_per_hr = self.GRID_WIDTH / self.HOURS_IN_DAY
+        lane_h    = self.OVERVIEW_LANE_HEIGHT
+        bars: Dict[str, list] = {status: [] for status in self.STATUS_MAP}
+        for day in range(count):
+            y = top + day * pitch
+            segments = days.get(day, [])
+            for st, start, end in self._merged_spans(segments):
+                x0 = self.GRID_START_X + int(start * px_per_hr)
+                x1 = self.GRID_START_X + int(end * px_per_hr)
+                if x1 - x0 < 2:
+                    continue
+                y0 = y + self.STATUS_MAP[st]['y_position'] * lane_h
+                bars[st].append((x0, y0 + 2, x1, y0 + lane_h - 2))
+
+            date = (first + timedelta(days=day)).strftime('%m-%d')
+            driving, on_duty, _ = self._totals(segments)
+            draw.text((24, y + 4), f"DAY {day + 1:02d}", fill=self.COLOR_ACCENT, font=self.font_orb)
+            draw.text((24, y + 24), date, fill=self.COLOR_MUTED, font=self.font_small)
+            draw.text((self.GRID_START_X + self.GRID_WIDTH + 10, y + 6), f"D  {driving:4.1f}",
+                      fill=self.GLOW_DRIVING, font=self.font_tiny)
+            draw.text((self.GRID_START_X + self.GRID_WIDTH + 10, y + 26), f"ON {on_duty:4.1f}",
+                      fill=self.GLOW_ONDUTY, font=self.font_tiny)
+
+        for st, rects in bars.items():
+            info = self.STATUS_MAP[st]
+            for rect in rects:
+                draw.rectangle(rect, fill=info['color'])
+            for x0, y0, x1, _ in rects:
+                draw.line([(x0, y0), (x1, y0)], fill=info['glow'], width=2)
+
+        driving, on_duty, off_duty = self._totals(all_schedule_segments)
+        fy = top + count * pitch + 10
+        draw.text(
+            (self.GRID_START_X, fy),
+            f"TRIP TOTAL  //  DRIVING {driving:.1f} HRS  |  ON DUTY {on_duty:.1f} HRS  |  OFF DUTY {off_duty:.1f} HRS",
+            fill=self.COLOR_TEXT, font=self.font_orb,
+        )
+        draw.rectangle([0, img.height - 2, self.WIDTH, img.height], fill=self.COLOR_ACCENT)
+
+        png = self._encode(img, key)
+        return png if as_bytes else png.data_uri()
+
+    def _merged_spans(self, segments: List[Dict]) -> List[Tuple[str, float, float]]:
+        # Back-to-back segments with the same graph status become one bar.
+        spans = []
+        for seg in segments:
+            st    = self._graph_status(seg)
+            start = seg.get('start_time', 0)
+            end   = seg.get('end_time', 0)
+            if spans and spans[-1][0] == st and abs(spans[-1][2] - start) < 1e-6:
+                spans[-1] = (st, spans[-1][1], end)
+            else:
+                spans.append((st, start, end))
+        return spans
+
+    def _get_overview_row(self):
+        # The empty four-lane grid of one day, drawn once and pasted for every day.
+        if self._overview_row is None:
+            with self._lock:
+                if self._overview_row is None:
+                    from PIL import Image, ImageDraw
+
+                    self._get_fonts()
+                    lane_h    = self.OVERVIEW_LANE_HEIGHT
+                    grid_h    = 4 * lane_h
+                    px_per_hr = self.GRID_WIDTH / self.HOURS_IN_DAY
+                    x_end     = self.GRID_START_X + self.GRID_WIDTH
+                    img  = Image.new('RGB', (self.WIDTH, grid_h + self.OVERVIEW_ROW_GAP), self.COLOR_BG)
+                    draw = ImageDraw.Draw(img)
+                    for y in range(0, img.height, 4):
+                        draw.line([(0, y), (self.WIDTH, y)], fill='#050e18', width=1)
+                    row_fills = ['#040e18', '#050f1c', '#04101e', '#04111f']
+                    for i in range(4):
+                        draw.rectangle([self.GRID_START_X, i * lane_h, x_end, (i + 1) * lane_h], fill=row_fills[i])
+                        draw.line([(self.GRID_START_X, i * lane_h), (x_end, i * lane_h)],
+                                  fill=self.COLOR_GRID_HOT, width=1)
+                    for i in range(self.HOURS_IN_DAY + 1):
+                        x   = self.GRID_START_X + int(i * px_per_hr)
+                        hot = (i % 6 == 0)
+                        draw.line([(x, 0), (x, grid_h)],
+                                  fill=self.COLOR_GRID_HOT if hot else self.COLOR_GRID,
+                                  width=2 if hot else 1)
+                    for i, lbl in enumerate(['OFF', 'SB', 'D', 'ON']):
+                        draw.text((self.GRID_START_X - 26, i * lane_h), lbl,
+                                  fill=self.COLOR_MUTED, font=self.font_tiny)
+                    draw.rectangle([self.GRID_START_X, 0, x_end, grid_h], outline=self.COLOR_ACCENT, width=1)
+                    self._overview_row = img
+        return self._overview_row
+
+    def _draw_overview_header(self, draw: 'ImageDraw.ImageDraw', driver_name: str, dates: str, days: int):
+        draw.rectangle([0, 0, self.WIDTH, 2], fill=self.COLOR_ACCENT)
+        draw.text((self.GRID_START_X, 24), f"ELD TRIP OVERVIEW  //  {days} DAY{'S' if days != 1 else ''}",
+                  fill=self.COLOR_ACCENT, font=self.font_title)
+        draw.text((self.GRID_START_X, 62), f"DRIVER: {driver_name.upper()}",
+                  fill=self.COLOR_TEXT, font=self.font_orb)
+        draw.text((self.GRID_START_X, 82), f"DATES : {dates}",
+                  fill=self.COLOR_MUTED, font=self.font_orb)
+
+        # Legend in two columns, so the header stays short.
+        lx, ly = self.WIDTH - 470, 28
+        for i, info in enumerate(self.STATUS_MAP.values()):
+            x = lx + (i % 2) * 220
+            y = ly + (i // 2) * 24
+            draw.rectangle([x, y + 2, x + 22, y + 14], fill=info['color'])
+            draw.rectangle([x, y + 2, x + 22, y + 4], fill=info['glow'])
+            draw.text((x + 28, y), info['label'], fill=self.COLOR_TEXT, font=self.font_small)
+
+        px_per_hr = self.GRID_WIDTH / self.HOURS_IN_DAY
+        y_lbl = self.OVERVIEW_HEADER_HEIGHT - 20
+        for i in range(0, self.HOURS_IN_DAY + 1, 2):
+            x = self.GRID_START_X + int(i * px_per_hr)
+            draw.text((x - 8, y_lbl), f"{i:02d}",
+                      fill=self.COLOR_ACCENT if i % 6 == 0 else self.COLOR_MUTED, font=self.font_small)
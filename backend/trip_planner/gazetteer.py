@@ -0,0 +1,148 @@
+import csv
+import heapq
+import os
+import re
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+
+STATE_ABBREVIATIONS = {
+    'alabama': 'al', 'alaska': 'ak', 'arizona': 'az', 'arkansas': 'ar', 'california': 'ca',
+    'colorado': 'co', 'connecticut': 'ct', 'delaware': 'de', 'district of columbia': 'dc',
+    'florida': 'fl', 'georgia': 'ga', 'hawaii': 'hi', 'idaho': 'id', 'illinois': 'il',
+    'indiana': 'in', 'iowa': 'ia', 'kansas': 'ks', 'kentucky': 'ky', 'louisiana': 'la',
+    'maine': 'me', 'maryland': 'md', 'massachusetts': 'ma', 'michigan': 'mi', 'minnesota': 'mn',
+    'mississippi': 'ms', 'missouri': 'mo', 'montana': 'mt', 'nebraska': 'ne', 'nevada': 'nv',
+    'new hampshire': 'nh', 'new jersey': 'nj', 'new mexico': 'nm', 'new york': 'ny',
+    'north carolina': 'nc', 'north dakota': 'nd', 'ohio': 'oh', 'oklahoma': 'ok', 'oregon': 'or',
+    'pennsylvania': 'pa', 'rhode island': 'ri', 'south carolina': 'sc', 'south dakota': 'sd',
+    'tennessee': 'tn', 'texas': 'tx', 'utah': 'ut', 'vermont': 'vt', 'virginia': 'va',
+    'washington': 'wa', 'west virginia': 'wv', 'wisconsin': 'wi', 'wyoming': 'wy',
+}
+TOKEN_ABBREVIATIONS = {'saint': 'st', 'fort': 'ft', 'mount': 'mt'}
+COUNTRY_SUFFIXES = (('united', 'states', 'of', 'america'), ('united', 'states'), ('usa',), ('us',))
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+# Sorts after every character a normalized key can contain, closing a prefix range.
+KEY_SENTINEL = '\x7f'
+# Prefix ranges wider than this keep their top matches memoized after the first query.
+WIDE_PREFIX_ROWS = 256
+MAX_SUGGESTIONS = 20
+
+
+def normalize_location(text: str) -> str:
+
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode().lower()
+    tokens = _NON_ALNUM.sub(' ', text).split()
+    for suffix in COUNTRY_SUFFIXES:
+        if len(tokens) > len(suffix) and tuple(tokens[-len(suffix):]) == suffix:
+            tokens = tokens[:-len(suffix)]
+            break
+    # A trailing full state name ("Chicago, Illinois") becomes its postal code.
+    for width in (3, 2, 1):
+        if len(tokens) > width:
+            state = STATE_ABBREVIATIONS.get(' '.join(tokens[-width:]))
+            if state:
+                tokens = tokens[:-width] + [state]
+                break
+    return ' '.join(TOKEN_ABBREVIATIONS.get(token, token) for token in tokens)
+
+
+class Gazetteer:
+
+
+    def __init__(self, entries: Iterable[Dict]):
+        self.names: List[str] = []
+        self.lats = array('d')
+        self.lons = array('d')
+        self.populations = array('q')
+
+        rows = []
+        for entry in entries:
+            index = len(self.names)
+            self.names.append(entry['name'])
+            self.lats.append(entry['lat'])
+            self.lons.append(entry['lon'])
+            self.populations.append(entry.get('population', 0))
+            keys = {normalize_location(name) for name in [entry['name']] + list(entry.get('aliases', ()))}
+            rows.extend((key, -entry.get('population', 0), index) for key in keys if key)
+
+        # Sorted parallel arrays: keys for bisect, entries pointing back at the place.
+        rows.sort()
+        self.keys: List[str] = [key for key, _, _ in rows]
+        self.entries = array('I', (index for _, _, index in rows))
+        self._top_matches: Dict[str, List[int]] = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def lookup(self, location: str) -> Optional[Tuple[float, float]]:
+
+        key = normalize_location(location)
+        position = bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            index = self.entries[position]
+            return (self.lats[index], self.lons[index])
+        return None
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Dict]:
+
+        key = normalize_location(prefix)
+        if not key:
+            return []
+        top = self._top_matches.get(key)
+        if top is None or limit > MAX_SUGGESTIONS:
+            low = bisect_left(self.keys, key)
+            high = bisect_right(self.keys, key + KEY_SENTINEL, low)
+            matches = set(self.entries[low:high])
+            top = heapq.nlargest(max(limit, MAX_SUGGESTIONS), matches, key=self.populations.__getitem__)
+            if high - low > WIDE_PREFIX_ROWS:
+                self._top_matches[key] = top[:MAX_SUGGESTIONS]
+        return [
+            {'name': self.names[index], 'coordinates': (self.lats[index], self.lons[index]),
+             'population': self.populations[index]}
+            for index in top[:limit]
+        ]
+
+    @classmethod
+    def load(cls, paths: Iterable[str]) -> 'Gazetteer':
+        return cls(entry for path in paths for entry in _read_csv(path))
+
+
+def _read_csv(path: str) -> Iterable[Dict]:
+    with open(path, newline='', encoding='utf-8') as fh:
+        for row in csv.DictReader(fh):
+            yield {
+                'name': row['name'],
+                'lat': float(row['latitude']),
+                'lon': float(row['longitude']),
+                'population': int(row.get('population') or 0),
+                'aliases': [alias for alias in (row.get('aliases') or '').split('|') if alias],
+            }
+
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer() -> Optional[Gazetteer]:
+
+    global _gazetteer
+    if _gazetteer is not None:
+        return _gazetteer or None
+
+    with _gazetteer_lock:
+        if _gazetteer is None:
+            setting = getattr(settings, 'TRIP_PLANNER_GAZETTEER_PATH', '')
+            paths = [path for path in setting.split(os.pathsep) if path and os.path.exists(path)]
+            if paths:
+                _gazetteer = Gazetteer.load(paths)
+                print(f"Loaded {len(_gazetteer)} gazetteer places from {', '.join(paths)}")
+            else:
+                _gazetteer = False
+    return _gazetteer or None
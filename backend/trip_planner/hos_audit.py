@@ -0,0 +1,348 @@
+import csv
+import gzip
+import io
+import multiprocessing
+import queue
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import orjson
+
+from .hos_calculator import HOSCalculator
+
+
+DUTY_STATUSES = ('off_duty', 'sleeper', 'driving', 'on_duty')
+BREAK_AFTER_DRIVING_HOURS = 8
+# Rows travel to the workers in batches; each worker's inbox holds at most this many, so a
+# slow worker stalls the reader instead of letting rows pile up in memory.
+BATCH_SIZE = 2000
+INBOX_BATCHES = 4
+EPSILON = 1e-6
+
+Row = Tuple[str, str, str, str]
+
+
+def _hours(delta: timedelta) -> float:
+    return delta.total_seconds() / 3600
+
+
+def _open(path: str):
+    if path.endswith('.gz'):
+        return io.TextIOWrapper(gzip.open(path, 'rb'), encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def read_rows(path: str) -> Iterator[Row]:
+
+    # (driver, start, end, status) as raw strings; parsing happens in the workers.
+    name = path[:-3] if path.endswith('.gz') else path
+    with _open(path) as fh:
+        if name.endswith(('.ndjson', '.jsonl')):
+            for line in fh:
+                if not line.strip():
+                    continue
+                try:
+                    record = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    yield ('', line.strip(), '', '')
+                    continue
+                yield (
+                    str(record.get('driver_name') or record.get('driver') or ''),
+                    str(record.get('start') or ''),
+                    str(record.get('end') or ''),
+                    str(record.get('status') or ''),
+                )
+            return
+
+        reader = csv.reader(fh)
+        header = [column.strip().lower() for column in next(reader, [])]
+        driver_column = 'driver_name' if 'driver_name' in header else 'driver'
+        try:
+            columns = [header.index(name) for name in (driver_column, 'start', 'end', 'status')]
+        except ValueError:
+            raise ValueError(f"{path} needs driver (or driver_name), start, end and status columns")
+        width = max(columns) + 1
+        d, s, e, st = columns
+        for row in reader:
+            if len(row) < width:
+                if row:
+                    yield ('', ','.join(row), '', '')
+                continue
+            yield (row[d], row[s], row[e], row[st])
+
+
+def read_paths(paths: Iterable[str]) -> Iterator[Row]:
+    for path in paths:
+        yield from read_rows(path)
+
+
+class DriverAuditor:
+    # Per-driver state is a handful of numbers plus the 8-day RollingCycle, so memory
+    # grows with the number of drivers, never with the number of records. Records must
+    # arrive in start order per driver; gaps between records count as off duty.
+
+    def __init__(self, driver: str):
+        # Imported here so spawned workers can load this module before Django is set up.
+        from .cycle_ledger import RollingCycle
+
+        self.driver = driver
+        self.cycle = RollingCycle()
+        self.last_start: Optional[datetime] = None
+        self.last_end: Optional[datetime] = None
+        self.duty_end: Optional[datetime] = None
+        self.shift_start: Optional[datetime] = None
+        self.shift_driving = 0.0
+        self.since_break = 0.0
+        self.flagged = set()
+
+    def _violation(self, rule: str, at: datetime, hours: float, limit: float) -> Dict:
+        self.flagged.add(rule)
+        return {
+            'driver': self.driver,
+            'rule': rule,
+            'at': at.isoformat(),
+            'hours': round(hours, 2),
+            'limit': limit,
+        }
+
+    def add(self, start: datetime, end: datetime, status: str) -> List[Dict]:
+
+        violations = []
+        if self.last_start is not None and start < self.last_start:
+            return [{'driver': self.driver, 'rule': 'out_of_order', 'at': start.isoformat()}]
+        if self.last_end is not None and start < self.last_end:
+            violations.append({'driver': self.driver, 'rule': 'overlap', 'at': start.isoformat()})
+        self.last_start = start
+        if self.last_end is None or end > self.last_end:
+            self.last_end = end
+        if status not in ('driving', 'on_duty'):
+            return violations
+
+        off = _hours(start - self.duty_end) if self.duty_end else float('inf')
+        if off >= HOSCalculator.REQUIRED_OFF_DUTY_HOURS - EPSILON:
+            self.shift_start = start
+            self.shift_driving = self.since_break = 0.0
+            self.flagged.clear()
+        elif off >= HOSCalculator.REQUIRED_BREAK_HOURS - EPSILON:
+            self.since_break = 0.0
+
+        hours = _hours(end - start)
+        if status == 'driving':
+            driving = self.shift_driving + hours
+            if driving > HOSCalculator.MAX_DRIVING_HOURS + EPSILON and 'driving_11h' not in self.flagged:
+                at = start + timedelta(hours=HOSCalculator.MAX_DRIVING_HOURS - self.shift_driving)
+                violations.append(self._violation('driving_11h', at, driving, HOSCalculator.MAX_DRIVING_HOURS))
+
+            window_end = self.shift_start + timedelta(hours=HOSCalculator.MAX_ON_DUTY_HOURS)
+            if end > window_end and 'window_14h' not in self.flagged:
+                violations.append(self._violation(
+                    'window_14h', max(start, window_end), _hours(end - self.shift_start),
+                    HOSCalculator.MAX_ON_DUTY_HOURS,
+                ))
+
+            since_break = self.since_break + hours
+            if since_break > BREAK_AFTER_DRIVING_HOURS + EPSILON and 'break_30m' not in self.flagged:
+                at = start + timedelta(hours=BREAK_AFTER_DRIVING_HOURS - self.since_break)
+                violations.append(self._violation('break_30m', at, since_break, BREAK_AFTER_DRIVING_HOURS))
+
+            used = self.cycle.hours_used(start)
+            if used + hours > HOSCalculator.MAX_CYCLE_HOURS + EPSILON and 'cycle_70h' not in self.flagged:
+                at = start + timedelta(hours=max(HOSCalculator.MAX_CYCLE_HOURS - used, 0.0))
+                violations.append(self._violation('cycle_70h', at, used + hours, HOSCalculator.MAX_CYCLE_HOURS))
+
+            self.shift_driving = driving
+            self.since_break = since_break
+        elif hours >= HOSCalculator.REQUIRED_BREAK_HOURS - EPSILON:
+            # 30 consecutive minutes not driving, on duty or off, satisfy the break.
+            self.since_break = 0.0
+
+        # An overlap is already flagged; only its new on-duty time goes into the cycle.
+        cycle_start = max(start, self.cycle.last_duty_end or start)
+        if end > cycle_start:
+            self.cycle.record(cycle_start, end, status)
+        if self.duty_end is None or end > self.duty_end:
+            self.duty_end = end
+        return violations
+
+
+class Auditor:
+    # Audits the drivers of one partition. Timestamps are converted to the home time zone
+    # so the 8-day cycle rolls over at local midnight; naive ones are taken as local.
+
+    def __init__(self, time_zone: str = 'UTC'):
+        self.tz = ZoneInfo(time_zone)
+        self.drivers: Dict[str, DriverAuditor] = {}
+        self.records = 0
+        self.rejected = 0
+
+    def _parse_time(self, value: str) -> datetime:
+        parsed = datetime.fromisoformat(value.strip())
+        if parsed.tzinfo is None:
+            return parsed.replace(tzinfo=self.tz)
+        return parsed.astimezone(self.tz)
+
+    def audit(self, rows: Iterable[Row]) -> List[Dict]:
+
+        violations = []
+        for driver, start, end, status in rows:
+            self.records += 1
+            try:
+                if not driver or status not in DUTY_STATUSES:
+                    raise ValueError(status)
+                start_at = self._parse_time(start)
+                end_at = self._parse_time(end)
+                if end_at <= start_at:
+                    raise ValueError('ends before it starts')
+            except ValueError:
+                self.rejected += 1
+                violations.append({'driver': driver, 'rule': 'invalid_record', 'record': [start, end, status]})
+                continue
+            auditor = self.drivers.get(driver)
+            if auditor is None:
+                auditor = self.drivers[driver] = DriverAuditor(driver)
+            violations.extend(auditor.add(start_at, end_at, status))
+        return violations
+
+
+def partition_of(driver: str, partitions: int) -> int:
+    # crc32 rather than hash(): string hashes differ between processes.
+    return zlib.crc32(driver.encode('utf-8')) % partitions
+
+
+def _audit_partition(inbox, outbox, time_zone: str):
+
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+    auditor = Auditor(time_zone)
+    while True:
+        batch = inbox.get()
+        if batch is None:
+            break
+        violations = auditor.audit(batch)
+        outbox.put(('batch', len(batch), violations))
+    outbox.put(('done', auditor.records, len(auditor.drivers), auditor.rejected))
+
+
+class AuditStats:
+
+    def __init__(self):
+        self.records = 0
+        self.drivers = 0
+        self.rejected = 0
+        self.violations: Counter = Counter()
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def tick(self):
+        self.elapsed = time.perf_counter() - self.started
+
+    @property
+    def records_per_second(self) -> float:
+        return self.records / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            'records': self.records,
+            'drivers': self.drivers,
+            'rejected': self.rejected,
+            'violations': dict(self.violations),
+            'elapsed_s': round(self.elapsed, 3),
+            'records_per_second': round(self.records_per_second, 1),
+        }
+
+
+def audit_stream(
+    rows: Iterable[Row],
+    workers: int = 1,
+    time_zone: str = 'UTC',
+    stats: Optional[AuditStats] = None,
+    batch_size: int = BATCH_SIZE
+) -> Iterator[Dict]:
+
+    # Yields violations as soon as a worker reports them; stats are updated as it goes.
+    stats = stats if stats is not None else AuditStats()
+    if workers <= 1:
+        auditor = Auditor(time_zone)
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield from _count(stats, auditor.audit(batch), len(batch))
+                batch = []
+        yield from _count(stats, auditor.audit(batch), len(batch))
+        stats.drivers = len(auditor.drivers)
+        stats.rejected = auditor.rejected
+        stats.tick()
+        return
+
+    context = multiprocessing.get_context()
+    inboxes = [context.Queue(maxsize=INBOX_BATCHES) for _ in range(workers)]
+    outbox = context.Queue()
+    processes = [
+        context.Process(target=_audit_partition, args=(inbox, outbox, time_zone), daemon=True)
+        for inbox in inboxes
+    ]
+    for process in processes:
+        process.start()
+
+    def drain(block: bool) -> Iterator[Tuple]:
+        while True:
+            try:
+                yield outbox.get(timeout=1.0) if block else outbox.get_nowait()
+            except queue.Empty:
+                if not block:
+                    return
+                if any(process.exitcode not in (None, 0) for process in processes):
+                    raise RuntimeError('An audit worker exited unexpectedly')
+
+    partitions: Dict[str, int] = {}
+    batches: List[List[Row]] = [[] for _ in range(workers)]
+    finished = 0
+    try:
+        for row in rows:
+            index = partitions.get(row[0])
+            if index is None:
+                index = partitions[row[0]] = partition_of(row[0], workers)
+            batch = batches[index]
+            batch.append(row)
+            if len(batch) >= batch_size:
+                inboxes[index].put(batch)
+                batches[index] = []
+                for message in drain(block=False):
+                    yield from _count(stats, message[2], message[1])
+
+        for index, batch in enumerate(batches):
+            if batch:
+                inboxes[index].put(batch)
+            inboxes[index].put(None)
+
+        for message in drain(block=True):
+            if message[0] == 'batch':
+                yield from _count(stats, message[2], message[1])
+                continue
+            stats.drivers += message[2]
+            stats.rejected += message[3]
+            finished += 1
+            if finished == workers:
+                break
+    finally:
+        for process in processes:
+            if finished < workers:
+                process.terminate()
+            process.join()
+        stats.tick()
+
+
+def _count(stats: AuditStats, violations: List[Dict], records: int) -> Iterator[Dict]:
+    stats.records += records
+    for violation in violations:
+        stats.violations[violation['rule']] += 1
+        yield violation
+    stats.tick()
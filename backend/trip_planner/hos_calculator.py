@@ -1,6 +1,9 @@
 
-from datetime import datetime, timedelta
-from typing import List, Dict, Tuple
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+EPSILON = 1e-6
 
 
 class HOSCalculator:
@@ -12,10 +15,16 @@ class HOSCalculator:
     MAX_CYCLE_HOURS = 70    
     CYCLE_DAYS = 8
     REQUIRED_BREAK_HOURS = 0.5  
+    MAX_DRIVING_BEFORE_BREAK = 8
     REQUIRED_OFF_DUTY_HOURS = 10  
+    RESTART_HOURS = 34  
+    MAX_SCHEDULE_DAYS = 60  
+    MAX_SCHEDULE_ITERATIONS = 10000  
     
     def __init__(self, current_cycle_used: float):
         
+        if not (math.isfinite(current_cycle_used) and 0 <= current_cycle_used <= self.MAX_CYCLE_HOURS):
+            raise ValueError(f"Cycle hours used must be between 0 and {self.MAX_CYCLE_HOURS}")
         self.current_cycle_used = current_cycle_used
         self.available_cycle_hours = self.MAX_CYCLE_HOURS - current_cycle_used
     
@@ -42,197 +51,29 @@ class HOSCalculator:
         dropoff_time: float = 1.0
     ) -> List[Dict]:
         
-        schedule = []
-        remaining_cycle_hours = self.available_cycle_hours
-        current_day = 0
-        current_time = 0  
-        time_of_day = 0  
-        daily_on_duty = 0
-        daily_driving = 0  
-        continuous_driving = 0  
-        
-        
-        remaining_distance = distance_to_pickup
-        
-        while remaining_distance > 0:
-            
-            available_drive_time = min(
-                self.MAX_DRIVING_HOURS - daily_driving,  
-                8 - continuous_driving,  
-                self.MAX_ON_DUTY_HOURS - daily_on_duty,  
-                remaining_cycle_hours  
-            )
-            
-            if available_drive_time <= 0.1:  
-                if daily_driving >= self.MAX_DRIVING_HOURS or daily_on_duty >= self.MAX_ON_DUTY_HOURS:
-                    
-                    schedule.append({
-                        'activity': 'required_rest',
-                        'duration': self.REQUIRED_OFF_DUTY_HOURS,
-                        'start_time': time_of_day,
-                        'end_time': time_of_day + self.REQUIRED_OFF_DUTY_HOURS,
-                        'day': current_day,
-                        'distance_covered': 0,
-                        'status': 'sleeper'
-                    })
-                    schedule.append({
-                        'activity': 'required_break',
-                        'duration': 24-time_of_day - self.REQUIRED_OFF_DUTY_HOURS,
-                        'start_time': time_of_day + self.REQUIRED_OFF_DUTY_HOURS,
-                        'end_time': 24,
-                        'day': current_day,
-                        'distance_covered': 0,
-                        'status': 'off_duty'
-                    })
-                    current_time += self.REQUIRED_OFF_DUTY_HOURS
-                    time_of_day = 0  
-                    current_day += 1
-                    daily_on_duty = 0
-                    daily_driving = 0
-                    continuous_driving = 0
-                elif continuous_driving >= 8:
-                    
-                    schedule.append({
-                        'activity': 'required_break',
-                        'duration': self.REQUIRED_BREAK_HOURS,
-                        'start_time': time_of_day,
-                        'end_time': time_of_day + self.REQUIRED_BREAK_HOURS,
-                        'day': current_day,
-                        'distance_covered': 0,
-                        'status': 'on_duty'
-                    })
-                    current_time += self.REQUIRED_BREAK_HOURS
-                    time_of_day += self.REQUIRED_BREAK_HOURS
-                    daily_on_duty += self.REQUIRED_BREAK_HOURS
-                    continuous_driving = 0  
-                continue
-            
-            
-            distance_this_segment = min(remaining_distance, available_drive_time * average_speed)
-            actual_drive_time = distance_this_segment / average_speed
-            
-            
-            schedule.append({
-                'activity': 'driving_to_pickup',
-                'duration': actual_drive_time,
-                'start_time': time_of_day,
-                'end_time': time_of_day + actual_drive_time,
-                'day': current_day,
-                'distance_covered': distance_this_segment,
-                'status': 'driving'
-            })
-            current_time += actual_drive_time
-            time_of_day += actual_drive_time
-            daily_on_duty += actual_drive_time
-            daily_driving += actual_drive_time
-            continuous_driving += actual_drive_time
-            remaining_distance -= distance_this_segment
-            remaining_cycle_hours -= actual_drive_time
-        
-        
-        schedule.append({
-            'activity': 'pickup',
-            'duration': pickup_time,
-            'start_time': time_of_day,
-            'end_time': time_of_day + pickup_time,
-            'day': current_day,
-            'distance_covered': 0,
-            'status': 'on_duty'
-        })
-        current_time += pickup_time
-        time_of_day += pickup_time
-        daily_on_duty += pickup_time
-        
-        
-        remaining_distance = distance_pickup_to_dropoff
-        
-        while remaining_distance > 0:
-            
-            available_drive_time = min(
-                self.MAX_DRIVING_HOURS - daily_driving,  
-                8 - continuous_driving,  
-                self.MAX_ON_DUTY_HOURS - daily_on_duty,  
-                remaining_cycle_hours  
-            )
-            
-            if available_drive_time <= 0.1:  
-                if daily_driving >= self.MAX_DRIVING_HOURS or daily_on_duty >= self.MAX_ON_DUTY_HOURS:
-                    
-                    schedule.append({
-                        'activity': 'required_rest',
-                        'duration': self.REQUIRED_OFF_DUTY_HOURS,
-                        'start_time': time_of_day,
-                        'end_time': time_of_day + self.REQUIRED_OFF_DUTY_HOURS,
-                        'day': current_day,
-                        'distance_covered': 0,
-                        'status': 'sleeper'
-                    })
-                    schedule.append({
-                        'activity': 'required_break',
-                        'duration': 24-time_of_day - self.REQUIRED_OFF_DUTY_HOURS,
-                        'start_time': time_of_day + self.REQUIRED_OFF_DUTY_HOURS,
-                        'end_time': 24,
-                        'day': current_day,
-                        'distance_covered': 0,
-                        'status': 'off_duty'
-                    })
-                    current_time += self.REQUIRED_OFF_DUTY_HOURS
-                    time_of_day = 0  
-                    current_day += 1
-                    daily_on_duty = 0
-                    daily_driving = 0
-                    continuous_driving = 0
-                elif continuous_driving >= 8:
-                    
-                    schedule.append({
-                        'activity': 'required_break',
-                        'duration': self.REQUIRED_BREAK_HOURS,
-                        'start_time': time_of_day,
-                        'end_time': time_of_day + self.REQUIRED_BREAK_HOURS,
-                        'day': current_day,
-                        'distance_covered': 0,
-                        'status': 'on_duty'
-                    })
-                    current_time += self.REQUIRED_BREAK_HOURS
-                    time_of_day += self.REQUIRED_BREAK_HOURS
-                    daily_on_duty += self.REQUIRED_BREAK_HOURS
-                    continuous_driving = 0  
-                continue
-            
-            
-            distance_this_segment = min(remaining_distance, available_drive_time * average_speed)
-            actual_drive_time = distance_this_segment / average_speed
-            
-            
-            schedule.append({
-                'activity': 'driving_to_dropoff',
-                'duration': actual_drive_time,
-                'start_time': time_of_day,
-                'end_time': time_of_day + actual_drive_time,
-                'day': current_day,
-                'distance_covered': distance_this_segment,
-                'status': 'driving'
-            })
-            current_time += actual_drive_time
-            time_of_day += actual_drive_time
-            daily_on_duty += actual_drive_time
-            daily_driving += actual_drive_time
-            continuous_driving += actual_drive_time
-            remaining_distance -= distance_this_segment
-            remaining_cycle_hours -= actual_drive_time
-        
-        
-        schedule.append({
-            'activity': 'dropoff',
-            'duration': dropoff_time,
-            'start_time': time_of_day,
-            'end_time': time_of_day + dropoff_time,
-            'day': current_day,
-            'distance_covered': 0,
-            'status': 'on_duty'
-        })
+        return self.calculate_multi_stop_schedule(
+            [
+                {'distance': distance_to_pickup, 'dwell_time': pickup_time, 'activity': 'pickup'},
+                {'distance': distance_pickup_to_dropoff, 'dwell_time': dropoff_time, 'activity': 'dropoff'},
+            ],
+            average_speed=average_speed,
+        )
+    
+    def calculate_multi_stop_schedule(
+        self,
+        stops: List[Dict],
+        average_speed: float = 55.0,
+        fuel_interval: Optional[float] = None,
+        fuel_time: float = 0.5
+    ) -> List[Dict]:
         
-        return schedule
+        # Greedy: drive until a limit stops the truck, then take the break, rest or restart
+        # that is due. Rests run on until midnight so each driving day starts fresh.
+        timeline = DutyTimeline(
+            self, stops, average_speed, fuel_interval=fuel_interval, fuel_time=fuel_time,
+            rest_until_midnight=True,
+        )
+        return timeline.schedule(timeline.run())
     
     def add_fuel_stops(
         self, 
@@ -273,9 +114,292 @@ class HOSCalculator:
                         'end_time': fuel_end,
                         'day': shifted_segment['day'],
                         'distance_covered': 0,
-                        'status': 'on_duty'
+                        'status': 'on_duty',
+                        'leg': shifted_segment.get('leg')
                     })
 
                     last_fuel_distance = total_distance
                     time_shift += fuel_time  
-        return updated_segments
\ No newline at end of file
+        return updated_segments
+
+def wait_for_window(t: float, window: Optional[Tuple[float, float]]) -> float:
+
+    # Hours from t until the dock window (hours of day; close < open wraps past midnight) is open.
+    if window is None:
+        return 0.0
+    open_hour, close_hour = window
+    hour = t - 24 * math.floor(t / 24)
+    if open_hour <= close_hour:
+        if open_hour <= hour <= close_hour:
+            return 0.0
+        return open_hour - hour if hour < open_hour else 24 - hour + open_hour
+    if hour >= open_hour or hour <= close_hour:
+        return 0.0
+    return open_hour - hour
+
+
+class DutyState:
+    # One point on a trip's continuous clock (hours from midnight of day 0): where the truck
+    # is and how far each HOS clock has run. States chain through `parent`, each holding the
+    # segments laid down since the one before. While the long half of a split sleeper-berth
+    # pair is `pending`, drive_after/window_after run from its end; the short half makes them
+    # the shift's clocks.
+
+    __slots__ = (
+        't', 'leg', 'leg_left', 'dwell_done', 'drive_shift', 'window', 'since_break',
+        'cycle_left', 'fuel_miles', 'pending', 'drive_after', 'window_after',
+        'parent', 'segments',
+    )
+
+    def child(self) -> 'DutyState':
+        # Spelled out: this runs for every break and rest of every candidate schedule.
+        state = DutyState()
+        state.t = self.t
+        state.leg = self.leg
+        state.leg_left = self.leg_left
+        state.dwell_done = self.dwell_done
+        state.drive_shift = self.drive_shift
+        state.window = self.window
+        state.since_break = self.since_break
+        state.cycle_left = self.cycle_left
+        state.fuel_miles = self.fuel_miles
+        state.pending = self.pending
+        state.drive_after = self.drive_after
+        state.window_after = self.window_after
+        state.parent = self
+        state.segments = []
+        return state
+
+
+class DutyTimeline:
+    # Lays a trip out under the 11-hour, 14-hour, 8-hour/30-minute and 70-hour limits.
+    # advance() drives and works the stops (waiting off duty for a stop's dock `window`, if it
+    # has one) until a limit stops the truck; apply() then takes one break, rest, split
+    # sleeper-berth half or restart. All on-duty time (dwell, fuel, on-duty breaks) counts
+    # toward the 14-hour window and the 70-hour cycle, not just driving.
+
+    def __init__(
+        self,
+        hos: HOSCalculator,
+        stops: List[Dict],
+        average_speed: float = 55.0,
+        fuel_interval: Optional[float] = None,
+        fuel_time: float = 0.5,
+        rest_until_midnight: bool = False
+    ):
+        if not (math.isfinite(average_speed) and average_speed > 0):
+            raise ValueError("Average speed must be a positive number")
+        for index, stop in enumerate(stops):
+            if not (math.isfinite(stop['distance']) and stop['distance'] >= 0):
+                raise ValueError(f"Stop {index + 1} distance must be a non-negative number")
+            if not (math.isfinite(stop['dwell_time']) and stop['dwell_time'] >= 0):
+                raise ValueError(f"Stop {index + 1} dwell_time must be a non-negative number")
+        self.hos = hos
+        self.stops = stops
+        self.drive_activities = [f"driving_to_{stop['activity']}" for stop in stops]
+        self.speed = average_speed
+        self.fuel_interval = fuel_interval
+        self.fuel_time = fuel_time
+        self.rest_until_midnight = rest_until_midnight
+
+    def initial_state(self, start: float = 0.0) -> DutyState:
+        state = DutyState()
+        state.t = start
+        state.leg = 0
+        state.leg_left = self.stops[0]['distance'] if self.stops else 0.0
+        state.dwell_done = False
+        state.drive_shift = 0.0
+        state.window = 0.0
+        state.since_break = 0.0
+        state.cycle_left = self.hos.available_cycle_hours
+        state.fuel_miles = 0.0
+        state.pending = None
+        state.drive_after = 0.0
+        state.window_after = 0.0
+        state.parent = None
+        state.segments = []
+        return state
+
+    def advance(self, state: DutyState) -> DutyState:
+
+        stops = self.stops
+        while state.leg < len(stops):
+            stop = stops[state.leg]
+            if state.leg_left <= EPSILON:
+                if not state.dwell_done:
+                    if stop.get('window') is not None:
+                        self.wait_for_dock(state, stop['window'])
+                    self.work(state, stop['activity'], stop['dwell_time'])
+                    state.dwell_done = True
+                state.leg += 1
+                if state.leg < len(stops):
+                    state.leg_left = stops[state.leg]['distance']
+                    state.dwell_done = False
+                continue
+
+            if self.fuel_interval and state.fuel_miles >= self.fuel_interval - EPSILON:
+                self.work(state, 'fuel_stop', self.fuel_time)
+                state.fuel_miles = 0.0
+                continue
+
+            # Driving left before the first of the 11-hour, 14-hour, 8-hour and 70-hour limits.
+            available = min(
+                HOSCalculator.MAX_DRIVING_HOURS - state.drive_shift,
+                HOSCalculator.MAX_ON_DUTY_HOURS - state.window,
+                HOSCalculator.MAX_DRIVING_BEFORE_BREAK - state.since_break,
+                state.cycle_left,
+            )
+            if available <= EPSILON:
+                return state
+
+            miles = min(state.leg_left, available * self.speed)
+            if self.fuel_interval:
+                miles = min(miles, self.fuel_interval - state.fuel_miles)
+            hours = miles / self.speed
+            state.segments.append((self.drive_activities[state.leg], 'driving', state.t, hours, miles, state.leg))
+            state.t += hours
+            state.drive_shift += hours
+            state.window += hours
+            state.since_break += hours
+            state.cycle_left -= hours
+            state.fuel_miles += miles
+            state.leg_left -= miles
+            if state.pending is not None:
+                state.drive_after += hours
+                state.window_after += hours
+        return state
+
+    def wait_for_dock(self, state: DutyState, window: Optional[Tuple[float, float]]):
+
+        # Off duty, but it runs on the 14-hour window unless it is long enough to be the
+        # 10-hour rest.
+        wait = wait_for_window(state.t, window)
+        if wait <= EPSILON:
+            return
+        state.segments.append(('dock_wait', 'off_duty', state.t, wait, 0.0, state.leg))
+        state.t += wait
+        if wait >= HOSCalculator.REQUIRED_OFF_DUTY_HOURS - EPSILON:
+            state.drive_shift = state.window = state.since_break = 0.0
+            state.pending = None
+            return
+        state.window += wait
+        if state.pending is not None:
+            state.window_after += wait
+        if wait >= HOSCalculator.REQUIRED_BREAK_HOURS - EPSILON:
+            state.since_break = 0.0
+
+    def work(self, state: DutyState, activity: str, hours: float):
+        # On duty, not driving: counts toward the window and the cycle, and 30 minutes or
+        # more of it satisfies the break.
+        state.segments.append((activity, 'on_duty', state.t, hours, 0.0, state.leg))
+        state.t += hours
+        state.window += hours
+        state.cycle_left -= hours
+        if state.pending is not None:
+            state.window_after += hours
+        if hours >= HOSCalculator.REQUIRED_BREAK_HOURS - EPSILON:
+            state.since_break = 0.0
+
+    def greedy_option(self, state: DutyState) -> Tuple[str, float]:
+        if state.cycle_left <= EPSILON:
+            return ('restart', HOSCalculator.RESTART_HOURS)
+        # A break that would use up what is left of the window gains nothing.
+        if (HOSCalculator.MAX_DRIVING_HOURS - state.drive_shift <= EPSILON
+                or HOSCalculator.MAX_ON_DUTY_HOURS - state.window <= HOSCalculator.REQUIRED_BREAK_HOURS + EPSILON):
+            return ('rest', HOSCalculator.REQUIRED_OFF_DUTY_HOURS)
+        return ('break', HOSCalculator.REQUIRED_BREAK_HOURS)
+
+    def apply(self, state: DutyState, option: Tuple[str, float]) -> DutyState:
+
+        kind, hours = option
+        child = state.child()
+        leg = state.leg
+        if kind == 'break':
+            child.segments.append(('required_break', 'on_duty', child.t, hours, 0.0, leg))
+            child.window += hours
+            child.cycle_left -= hours
+            if child.pending is not None:
+                child.window_after += hours
+            child.since_break = 0.0
+            child.t += hours
+            return child
+
+        # The long half of a split pair stays off the 14-hour window; the short half pairs
+        # with it and the shift restarts from the end of the long half.
+        if kind == 'split_long':
+            child.segments.append(('split_sleeper', 'sleeper', child.t, hours, 0.0, leg))
+            child.pending = hours
+            child.drive_after = child.window_after = child.since_break = 0.0
+            child.t += hours
+            return child
+        if kind == 'split_short':
+            child.segments.append(('split_rest', 'off_duty', child.t, hours, 0.0, leg))
+            child.drive_shift = child.drive_after
+            child.window = child.window_after
+            child.pending = None
+            child.since_break = 0.0
+            child.t += hours
+            return child
+
+        if kind == 'restart':
+            child.segments.append(('cycle_restart', 'off_duty', child.t, hours, 0.0, leg))
+            child.cycle_left = HOSCalculator.MAX_CYCLE_HOURS
+        else:
+            child.segments.append(('required_rest', 'sleeper', child.t, hours, 0.0, leg))
+            midnight = (math.floor(child.t / 24 + EPSILON) + 1) * 24
+            if self.rest_until_midnight and child.t + hours < midnight - EPSILON:
+                child.segments.append(('required_break', 'off_duty', child.t + hours, midnight - child.t - hours, 0.0, leg))
+                hours = midnight - child.t
+        child.drive_shift = child.window = child.since_break = 0.0
+        child.pending = None
+        child.t += hours
+        return child
+
+    def run(self, start: float = 0.0) -> DutyState:
+
+        state = self.advance(self.initial_state(start))
+        steps = 0
+        while state.leg < len(self.stops):
+            steps += 1
+            if (steps > HOSCalculator.MAX_SCHEDULE_ITERATIONS
+                    or state.t - start > HOSCalculator.MAX_SCHEDULE_DAYS * 24):
+                raise ValueError(f"Trip cannot be scheduled within {HOSCalculator.MAX_SCHEDULE_DAYS} days")
+            state = self.advance(self.apply(state, self.greedy_option(state)))
+        return state
+
+    def segments(self, state: DutyState) -> List[Tuple]:
+        chain = []
+        while state is not None:
+            chain.append(state.segments)
+            state = state.parent
+        return [segment for segments in reversed(chain) for segment in segments]
+
+    def schedule(self, state: DutyState) -> List[Dict]:
+        return split_by_day(self.segments(state))
+
+
+def split_by_day(segments: Iterable[Tuple]) -> List[Dict]:
+
+    # (activity, status, start, duration, miles, leg) on a continuous clock, cut at midnight.
+    schedule = []
+    for activity, status, start, duration, miles, leg in segments:
+        end = start + duration
+        while True:
+            day = int(start // 24)
+            piece_end = min(end, (day + 1) * 24)
+            piece = piece_end - start
+            if piece > EPSILON or not duration:
+                schedule.append({
+                    'activity': activity,
+                    'duration': piece,
+                    'start_time': start - day * 24,
+                    'end_time': piece_end - day * 24,
+                    'day': day,
+                    'distance_covered': miles * piece / duration if duration else 0,
+                    'status': status,
+                    'leg': leg,
+                })
+            if piece_end >= end - EPSILON:
+                break
+            start = piece_end
+    return schedule
@@ -0,0 +1,138 @@
+import heapq
+import itertools
+import logging
+import threading
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from .gazetteer import KEY_SENTINEL, get_gazetteer, normalize_location
+
+logger = logging.getLogger(__name__)
+
+
+class LocationHistory:
+
+
+    # Share of max_size dropped at once when the history is full, so the sorted key list is
+    # rebuilt once per batch instead of once per new place.
+    EVICT_FRACTION = 0.1
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self.keys: List[str] = []
+        self.places: Dict[str, Dict] = {}
+        self.lock = threading.Lock()
+        self.clock = itertools.count()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, name: str, coords: Tuple[float, float]):
+
+        key = normalize_location(name)
+        if not key:
+            return
+        with self.lock:
+            place = self.places.get(key)
+            if place is not None:
+                place['uses'] += 1
+                place['last_used'] = next(self.clock)
+                return
+            if self.max_size and len(self.places) >= self.max_size:
+                self._evict()
+            insort(self.keys, key)
+            self.places[key] = {'name': name, 'coordinates': tuple(coords), 'uses': 1, 'last_used': next(self.clock)}
+
+    def _evict(self):
+
+        # Least used first, least recently used among equals.
+        count = max(1, int(self.max_size * self.EVICT_FRACTION))
+        evicted = set(heapq.nsmallest(
+            count, self.places, key=lambda key: (self.places[key]['uses'], self.places[key]['last_used'])
+        ))
+        for key in evicted:
+            del self.places[key]
+        self.keys = [key for key in self.keys if key not in evicted]
+
+    def lookup(self, name: str) -> Optional[Tuple[float, float]]:
+        place = self.places.get(normalize_location(name))
+        if place is None:
+            return None
+        place['uses'] += 1
+        place['last_used'] = next(self.clock)
+        return place['coordinates']
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Dict]:
+
+        key = normalize_location(prefix)
+        if not key:
+            return []
+        with self.lock:
+            low = bisect_left(self.keys, key)
+            high = bisect_right(self.keys, key + KEY_SENTINEL, low)
+            matches = [self.places[match] for match in self.keys[low:high]]
+        return heapq.nlargest(limit, matches, key=lambda place: place['uses'])
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def _seed_from_trips(history: LocationHistory):
+
+    from .models import Trip
+
+    limit = getattr(settings, 'TRIP_PLANNER_SUGGEST_SEED_TRIPS', 5000)
+    trips = Trip.objects.order_by('-id').values_list('id', 'origin', 'route__coordinates__current', 'stops')
+    try:
+        trips = list(trips[:limit])
+    except DatabaseError:
+        logger.warning("Could not seed location history", exc_info=True)
+        return
+    for trip_id, origin, origin_coords, stops in trips:
+        # A malformed stored trip is skipped on its own; the rest still seed the history.
+        try:
+            if origin_coords:
+                history.add(origin, origin_coords)
+            for stop in stops or []:
+                if stop.get('coordinates'):
+                    history.add(stop['location'], stop['coordinates'])
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            logger.warning("Skipping trip %s while seeding location history: %r", trip_id, e)
+
+
+def get_location_history() -> LocationHistory:
+
+    global _history
+    if _history is None:
+        with _history_lock:
+            if _history is None:
+                history = LocationHistory(getattr(settings, 'TRIP_PLANNER_LOCATION_HISTORY_SIZE', 10000))
+                _seed_from_trips(history)
+                _history = history
+    return _history
+
+
+def suggest_locations(query: str, limit: int = 8) -> List[Dict]:
+
+    # Places this deployment has already geocoded rank first (by use), then the gazetteer
+    # (by population); each normalized name is returned once.
+    results = []
+    seen = set()
+    gazetteer = get_gazetteer()
+    sources = [('history', get_location_history().suggest(query, limit))]
+    if gazetteer is not None:
+        sources.append(('gazetteer', gazetteer.suggest(query, limit)))
+    for source, places in sources:
+        for place in places:
+            key = normalize_location(place['name'])
+            if key in seen:
+                continue
+            seen.add(key)
+            results.append({'name': place['name'], 'coordinates': place['coordinates'], 'source': source})
+            if len(results) >= limit:
+                return results
+    return results
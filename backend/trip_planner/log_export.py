@@ -0,0 +1,134 @@
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import date
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from django.utils.text import get_valid_filename
+
+from .models import DailyLog
+from .trip_store import log_segments, render_log
+
+
+CHUNK_SIZE = 500
+
+
+class ZipStream:
+    # Write-only sink for ZipFile. It has no seek/tell, so zipfile writes data descriptors
+    # and never rewinds; whatever is written is handed on by drain() and dropped.
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def export_queryset(start: date, end: date, drivers: Optional[Sequence[str]] = None):
+
+    logs = DailyLog.objects.filter(date__gte=start, date__lte=end)
+    if drivers:
+        logs = logs.filter(trip__driver_name__in=drivers)
+    # Only the columns the archive needs; the trip's route geometry stays in the database.
+    return logs.select_related('trip').only(
+        'id', 'trip_id', 'day', 'date', 'image', 'trip__driver_name',
+    ).order_by('trip__driver_name', 'date', 'trip_id', 'day')
+
+
+def _entry_name(log: DailyLog) -> str:
+    driver = get_valid_filename(log.trip.driver_name) or 'driver'
+    return f"{driver}/{log.date.isoformat()}_trip{log.trip_id}_day{log.day + 1:02d}.png"
+
+
+def _read_stored(log: DailyLog) -> Optional[bytes]:
+    if not log.image:
+        return None
+    try:
+        with log.image.open('rb') as fh:
+            return fh.read()
+    except (OSError, ValueError):
+        return None
+
+
+def _load(
+    log: DailyLog, segments: Optional[List[Dict]], generator, render_slot: Callable
+) -> Tuple[Optional[bytes], str]:
+
+    # Runs in the pool: file reads and rendering only; database access stays on the
+    # caller's thread.
+    if segments is None:
+        return _read_stored(log), 'stored'
+    with render_slot():
+        return render_log(log, generator, segments), 'rendered'
+
+
+def stream_log_archive(
+    logs,
+    workers: int = 4,
+    render: bool = False,
+    generator=None,
+    counts: Optional[Dict[str, int]] = None,
+    render_slot: Callable = nullcontext
+) -> Iterator[bytes]:
+
+    # Yields the ZIP in pieces as each log is added. At most 2 x workers logs are in
+    # flight, so memory stays flat however many logs the export covers (apart from
+    # zipfile's small per-entry record for the central directory). Every render runs
+    # inside render_slot(), so a server can hold exports to its rendering admission limit;
+    # a render turned away counts as a failed entry.
+    if generator is None:
+        from .eld_log_generator import ELDLogGenerator
+
+        # Bulk renders would only churn the shared log cache.
+        generator = ELDLogGenerator(use_cache=False)
+
+    sink = ZipStream()
+    archive = zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_STORED, allowZip64=True)
+    failures = []
+    counts = counts if counts is not None else {}
+    counts.update({'stored': 0, 'rendered': 0, 'failed': 0})
+
+    def add(log, future):
+        try:
+            png, source = future.result()
+            if png is None:
+                # The stored file is gone; render it here rather than fail the entry.
+                with render_slot():
+                    png, source = render_log(log, generator), 'rendered'
+        except Exception as e:
+            print(f"Log export failed for trip {log.trip_id} day {log.day + 1}: {e}")
+            failures.append(f"{_entry_name(log)}: {e}")
+            counts['failed'] += 1
+            return
+        counts[source] += 1
+        # PNGs are already deflated; storing them keeps the export CPU-bound on rendering only.
+        info = zipfile.ZipInfo(_entry_name(log), date_time=log.date.timetuple()[:6])
+        info.compress_type = zipfile.ZIP_STORED
+        archive.writestr(info, png)
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        pending = deque()
+        for log in logs.iterator(chunk_size=CHUNK_SIZE):
+            segments = None if log.image and not render else log_segments(log)
+            pending.append((log, pool.submit(_load, log, segments, generator, render_slot)))
+            if len(pending) >= 2 * max(workers, 1):
+                add(*pending.popleft())
+                yield sink.drain()
+        while pending:
+            add(*pending.popleft())
+            yield sink.drain()
+
+    summary = [f"{name}: {count}" for name, count in counts.items()]
+    archive.writestr('export.txt', '\n'.join(summary + failures) + '\n')
+    archive.close()
+    yield sink.drain()
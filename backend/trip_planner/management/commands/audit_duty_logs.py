@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+
+import orjson
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from trip_planner.hos_audit import BATCH_SIZE, AuditStats, audit_stream, read_paths
+
+
+class Command(BaseCommand):
+    help = (
+        "Audit duty-status logs (CSV or NDJSON, optionally .gz) against the 11-hour driving, "
+        "14-hour window, 30-minute break and 70-hour/8-day limits. Records need driver, start, "
+        "end and status, in start order per driver. Violations are written as NDJSON lines."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Audit processes')
+        parser.add_argument('--output', help='Violations file (default: stdout)')
+        parser.add_argument('--time-zone', default=settings.TIME_ZONE, help='Home terminal time zone')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--progress-every', type=float, default=5.0, help='Seconds between progress lines')
+
+    def handle(self, *args, **options):
+
+        for path in options['paths']:
+            if not os.path.exists(path):
+                raise CommandError(f"No such file: {path}")
+
+        stats = AuditStats()
+        violations = audit_stream(
+            read_paths(options['paths']),
+            workers=max(options['workers'], 1),
+            time_zone=options['time_zone'],
+            stats=stats,
+            batch_size=max(options['batch_size'], 1),
+        )
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        # Progress goes to stderr so stdout stays pure NDJSON.
+        last_report = time.monotonic()
+        try:
+            for violation in violations:
+                output.write(orjson.dumps(violation) + b'\n')
+                now = time.monotonic()
+                if now - last_report >= options['progress_every']:
+                    last_report = now
+                    self._report(stats)
+        except ValueError as e:
+            raise CommandError(str(e))
+        except KeyboardInterrupt:
+            raise CommandError(f"Interrupted after {stats.records} records")
+        finally:
+            violations.close()
+            output.flush()
+            if options['output']:
+                output.close()
+
+        self._report(stats)
+        summary = ', '.join(f"{rule} {count}" for rule, count in sorted(stats.violations.items())) or 'none'
+        self.stderr.write(
+            f"{stats.records} records, {stats.drivers} drivers, {stats.rejected} rejected in "
+            f"{stats.elapsed:.1f}s ({stats.records_per_second:,.0f} records/s); violations: {summary}"
+        )
+
+    def _report(self, stats: AuditStats):
+        stats.tick()
+        self.stderr.write(
+            f"audited {stats.records} records, {sum(stats.violations.values())} violations, "
+            f"{stats.records_per_second:,.0f} records/s"
+        )
@@ -0,0 +1,59 @@
+import os
+import time
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from trip_planner.log_export import export_queryset, stream_log_archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Write every stored daily log sheet between two dates (optionally for some drivers) "
+        "into a ZIP archive, rendering sheets whose image is missing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('output')
+        parser.add_argument('--from', dest='date_from', required=True, help='First date (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', required=True, help='Last date (YYYY-MM-DD)')
+        parser.add_argument('--driver', action='append', default=[], help='Driver name; repeat for several')
+        parser.add_argument(
+            '--workers', type=int, default=getattr(settings, 'TRIP_PLANNER_EXPORT_WORKERS', 4),
+            help='Threads reading and rendering sheets',
+        )
+        parser.add_argument('--render', action='store_true', help='Re-render every sheet from its schedule')
+
+    def handle(self, *args, **options):
+
+        try:
+            start = date.fromisoformat(options['date_from'])
+            end = date.fromisoformat(options['date_to'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if end < start:
+            raise CommandError("--to is before --from")
+
+        logs = export_queryset(start, end, options['driver'])
+        started = time.monotonic()
+        written = 0
+        counts = {}
+        # Written to a temporary name so an interrupted export never looks complete.
+        partial = options['output'] + '.part'
+        try:
+            with open(partial, 'wb') as fh:
+                for chunk in stream_log_archive(
+                        logs, workers=options['workers'], render=options['render'], counts=counts):
+                    fh.write(chunk)
+                    written += len(chunk)
+        except KeyboardInterrupt:
+            os.remove(partial)
+            raise CommandError("Interrupted; no archive written")
+        os.replace(partial, options['output'])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {options['output']} ({written / 1e6:.1f} MB) in {elapsed:.1f}s: {counts['stored']} stored, "
+            f"{counts['rendered']} rendered, {counts['failed']} failed"
+        ))
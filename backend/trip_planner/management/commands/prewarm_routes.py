@@ -0,0 +1,162 @@
+import csv
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, List, Set, Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+
+from trip_planner.gazetteer import normalize_location
+from trip_planner.services import get_route_service
+
+
+class Command(BaseCommand):
+    help = (
+        "Geocode and route the addresses and origin/destination lanes in a CSV so that "
+        "plan-trip finds them in the cache. Columns: address (or location), and/or "
+        "origin,destination."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path')
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent provider calls')
+        parser.add_argument(
+            '--checkpoint',
+            help='File recording finished items, for resuming (default: <csv_path>.progress)',
+        )
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+        parser.add_argument('--progress-every', type=float, default=2.0, help='Seconds between progress lines')
+
+    def handle(self, *args, **options):
+
+        locations, lanes = self._read_csv(options['csv_path'])
+        checkpoint_path = options['checkpoint'] or options['csv_path'] + '.progress'
+        done = set()
+        if os.path.exists(checkpoint_path) and not options['restart']:
+            with open(checkpoint_path, encoding='utf-8') as fh:
+                done = {line.rstrip('\n') for line in fh}
+        elif os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        self.workers = max(options['workers'], 1)
+        self.progress_every = options['progress_every']
+        route_service = get_route_service()
+        # A batch job waits its turn at the provider, and for identical lookups in flight,
+        # instead of giving up like a request.
+        for limiter in route_service.rate_limits.values():
+            limiter.max_wait = None
+        for flight in route_service.flights.values():
+            flight.timeout = None
+
+        def geocode(location):
+            return route_service.geocode_location(location) is not None
+
+        def route(lane):
+            # A geodesic fallback is not cached, so it counts as a failure and is retried
+            # on the next run.
+            return route_service.get_route_for_stops(list(lane))['source'] != 'geodesic'
+
+        self.stdout.write(
+            f"{len(locations)} locations and {len(lanes)} lanes from {options['csv_path']}; "
+            f"{len(done)} items already done ({checkpoint_path})"
+        )
+        with open(checkpoint_path, 'a', encoding='utf-8') as checkpoint, \
+                ThreadPoolExecutor(max_workers=self.workers) as pool:
+            try:
+                failed = self._run('geocode', locations, geocode, done, pool, checkpoint)
+                failed += self._run('route', lanes, route, done, pool, checkpoint)
+            except KeyboardInterrupt:
+                pool.shutdown(wait=True, cancel_futures=True)
+                raise CommandError(f"Interrupted; run again to resume from {checkpoint_path}")
+
+        if failed:
+            self.stdout.write(self.style.WARNING(f"{failed} items failed; run again to retry them"))
+        else:
+            self.stdout.write(self.style.SUCCESS("All locations and lanes are cached"))
+
+    def _read_csv(self, path: str) -> Tuple[List[str], List[Tuple[str, str]]]:
+
+        if not os.path.exists(path):
+            raise CommandError(f"No such file: {path}")
+        locations = {}
+        lanes = {}
+        with open(path, newline='', encoding='utf-8') as fh:
+            reader = csv.DictReader(fh)
+            fields = {name.strip().lower(): name for name in reader.fieldnames or []}
+            address_field = fields.get('address') or fields.get('location')
+            has_lanes = 'origin' in fields and 'destination' in fields
+            if not address_field and not has_lanes:
+                raise CommandError("The CSV needs an address (or location) column, or origin and destination")
+            for row in reader:
+                row_locations = []
+                if address_field and (row.get(address_field) or '').strip():
+                    row_locations.append(row[address_field].strip())
+                if has_lanes:
+                    origin = (row.get(fields['origin']) or '').strip()
+                    destination = (row.get(fields['destination']) or '').strip()
+                    if origin and destination:
+                        row_locations += [origin, destination]
+                        lanes.setdefault(
+                            (normalize_location(origin), normalize_location(destination)),
+                            (origin, destination),
+                        )
+                for location in row_locations:
+                    locations.setdefault(normalize_location(location), location)
+        return list(locations.values()), list(lanes.values())
+
+    def _run(self, stage: str, items: List, task: Callable, done: Set[str], pool, checkpoint) -> int:
+
+        def item_key(item):
+            names = [item] if isinstance(item, str) else list(item)
+            return '\t'.join([stage] + [normalize_location(name) for name in names])
+
+        todo = [(item_key(item), item) for item in items]
+        queue = iter([(key, item) for key, item in todo if key not in done])
+        skipped = len(todo) - sum(1 for key, _ in todo if key not in done)
+        total = len(todo) - skipped
+        completed = failed = 0
+        started = last_report = time.monotonic()
+        pending = {}
+
+        while True:
+            # At most two tasks per worker are queued, so progress and the checkpoint
+            # track what has actually been sent.
+            while len(pending) < self.workers * 2:
+                key, item = next(queue, (None, None))
+                if key is None:
+                    break
+                pending[pool.submit(task, item)] = (key, item)
+            if not pending:
+                break
+
+            finished, _ = wait(pending, timeout=self.progress_every, return_when=FIRST_COMPLETED)
+            for future in finished:
+                key, item = pending.pop(future)
+                try:
+                    ok = future.result()
+                except Exception as e:
+                    print(f"{stage} failed for {item}: {e}")
+                    ok = False
+                completed += 1
+                if ok:
+                    checkpoint.write(key + '\n')
+                    checkpoint.flush()
+                else:
+                    failed += 1
+
+            now = time.monotonic()
+            if now - last_report >= self.progress_every:
+                last_report = now
+                self._report(stage, completed, total, skipped, failed, now - started)
+
+        self._report(stage, completed, total, skipped, failed, time.monotonic() - started)
+        return failed
+
+    def _report(self, stage, completed, total, skipped, failed, elapsed):
+        rate = completed / elapsed if elapsed > 0 else 0.0
+        eta = (total - completed) / rate if rate else 0.0
+        self.stdout.write(
+            f"{stage}: {completed}/{total} ({skipped} skipped, {failed} failed) "
+            f"{rate:.1f}/s, eta {eta:.0f}s"
+        )
+        self.stdout.flush()
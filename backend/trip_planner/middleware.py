@@ -0,0 +1,99 @@
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .profiling import make_profiler, prune_profiles
+from .services import record_first_request
+
+logger = logging.getLogger(__name__)
+
+# One first request per process, whichever handler instance or thread serves it.
+_first_request_lock = threading.Lock()
+_first_request_pending = True
+
+
+class ProfilingMiddleware:
+
+    HEADER = 'HTTP_X_PROFILE'
+    RESPONSE_HEADER = 'X-Profile-Id'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = float(getattr(settings, 'TRIP_PLANNER_PROFILE_SAMPLE_RATE', 0.0))
+        self.header_enabled = getattr(settings, 'TRIP_PLANNER_PROFILE_HEADER_ENABLED', False)
+        self.token = getattr(settings, 'TRIP_PLANNER_PROFILE_TOKEN', '')
+        self.mode = getattr(settings, 'TRIP_PLANNER_PROFILER', 'sampling')
+        self.interval = float(getattr(settings, 'TRIP_PLANNER_PROFILE_INTERVAL', 0.005))
+        self.output_dir = getattr(settings, 'TRIP_PLANNER_PROFILE_DIR', 'profiles')
+        self.keep = int(getattr(settings, 'TRIP_PLANNER_PROFILE_KEEP', 200))
+
+        # Removed from the middleware chain entirely when profiling is off.
+        if not self.header_enabled and self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def _should_profile(self, request) -> bool:
+        if self.header_enabled:
+            value = request.META.get(self.HEADER)
+            if value and (not self.token or value == self.token):
+                return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not getattr(view_func, '__module__', '').startswith('trip_planner.'):
+            return None
+        if not self._should_profile(request):
+            return None
+
+        profile_id = uuid.uuid4().hex
+        profiler = make_profiler(self.mode, self.interval)
+        started = time.perf_counter()
+        with profiler:
+            response = view_func(request, *view_args, **view_kwargs)
+            if hasattr(response, 'render') and callable(response.render):
+                response = response.render()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        try:
+            profiler.write(os.path.join(self.output_dir, profile_id))
+            prune_profiles(self.output_dir, self.keep)
+        except OSError:
+            logger.exception("Could not write profile %s", profile_id)
+            return response
+
+        logger.info("Profiled %s %s in %.1f ms -> %s", request.method, request.path, elapsed_ms, profile_id)
+        response[self.RESPONSE_HEADER] = profile_id
+        return response
+
+
+class StartupTimingMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        global _first_request_pending
+        if not _first_request_pending:
+            return self.get_response(request)
+        with _first_request_lock:
+            first = _first_request_pending
+            _first_request_pending = False
+        if not first:
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        response = self.get_response(request)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        record_first_request(elapsed_ms)
+        logger.info("First request %s %s took %.2f ms", request.method, request.path, elapsed_ms)
+        return response
@@ -0,0 +1,86 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+import trip_planner.models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Trip',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('driver_name', models.CharField(max_length=100)),
+                ('origin', models.CharField(max_length=255)),
+                ('destination', models.CharField(max_length=255)),
+                ('lane', models.CharField(max_length=255)),
+                ('start_date', models.DateField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('current_cycle_used', models.FloatField(default=0)),
+                ('schedule_mode', models.CharField(default='greedy', max_length=16)),
+                ('total_distance', models.FloatField()),
+                ('total_driving_hours', models.FloatField()),
+                ('total_trip_hours', models.FloatField()),
+                ('total_days', models.PositiveIntegerField()),
+                ('stops', models.JSONField(default=list)),
+                ('route', models.JSONField(default=dict)),
+                ('summary', models.JSONField(default=dict)),
+            ],
+            options={
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['driver_name', 'id'], name='trip_driver_idx'), models.Index(fields=['start_date', 'id'], name='trip_date_idx'), models.Index(fields=['lane', 'id'], name='trip_lane_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ScheduleSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.PositiveIntegerField()),
+                ('day', models.PositiveIntegerField()),
+                ('activity', models.CharField(max_length=40)),
+                ('status', models.CharField(max_length=16)),
+                ('start_time', models.FloatField()),
+                ('end_time', models.FloatField()),
+                ('duration', models.FloatField()),
+                ('distance_covered', models.FloatField(default=0)),
+                ('leg', models.PositiveIntegerField(null=True)),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segments', to='trip_planner.trip')),
+            ],
+            options={
+                'ordering': ['trip', 'sequence'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.PositiveIntegerField()),
+                ('date', models.DateField()),
+                ('image', models.FileField(max_length=255, upload_to=trip_planner.models._log_upload_to)),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='logs', to='trip_planner.trip')),
+            ],
+            options={
+                'ordering': ['trip', 'day'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='schedulesegment',
+            constraint=models.UniqueConstraint(fields=('trip', 'sequence'), name='segment_trip_sequence_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='dailylog',
+            index=models.Index(fields=['date'], name='dailylog_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailylog',
+            constraint=models.UniqueConstraint(fields=('trip', 'day'), name='dailylog_trip_day_uniq'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip_planner', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CycleLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('driver_name', models.CharField(max_length=100, unique=True)),
+                ('day', models.DateField(null=True)),
+                ('buckets', models.JSONField(default=list)),
+                ('last_duty_end', models.DateTimeField(null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DutyRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('driver_name', models.CharField(max_length=100)),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('status', models.CharField(max_length=16)),
+            ],
+            options={
+                'ordering': ['driver_name', 'start'],
+                'indexes': [models.Index(fields=['driver_name', 'start'], name='duty_driver_start_idx')],
+            },
+        ),
+    ]
@@ -1,3 +1,97 @@
 from django.db import models
 
 
+class Trip(models.Model):
+    driver_name = models.CharField(max_length=100)
+    origin = models.CharField(max_length=255)
+    destination = models.CharField(max_length=255)
+    lane = models.CharField(max_length=255)
+    start_date = models.DateField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    current_cycle_used = models.FloatField(default=0)
+    schedule_mode = models.CharField(max_length=16, default='greedy')
+    total_distance = models.FloatField()
+    total_driving_hours = models.FloatField()
+    total_trip_hours = models.FloatField()
+    total_days = models.PositiveIntegerField()
+
+    stops = models.JSONField(default=list)
+    route = models.JSONField(default=dict)
+    summary = models.JSONField(default=dict)
+
+    class Meta:
+        ordering = ['-id']
+        # History queries filter on one of these and page by id (keyset), so each
+        # index ends in id.
+        indexes = [
+            models.Index(fields=['driver_name', 'id'], name='trip_driver_idx'),
+            models.Index(fields=['start_date', 'id'], name='trip_date_idx'),
+            models.Index(fields=['lane', 'id'], name='trip_lane_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.driver_name}: {self.origin} -> {self.destination} ({self.start_date})"
+
+
+class ScheduleSegment(models.Model):
+    trip = models.ForeignKey(Trip, related_name='segments', on_delete=models.CASCADE)
+    sequence = models.PositiveIntegerField()
+    day = models.PositiveIntegerField()
+    activity = models.CharField(max_length=40)
+    status = models.CharField(max_length=16)
+    start_time = models.FloatField()
+    end_time = models.FloatField()
+    duration = models.FloatField()
+    distance_covered = models.FloatField(default=0)
+    leg = models.PositiveIntegerField(null=True)
+
+    class Meta:
+        ordering = ['trip', 'sequence']
+        constraints = [
+            models.UniqueConstraint(fields=['trip', 'sequence'], name='segment_trip_sequence_uniq'),
+        ]
+
+
+def _log_upload_to(instance, filename):
+    return f"eld_logs/{instance.date:%Y/%m}/{filename}"
+
+
+class DailyLog(models.Model):
+    trip = models.ForeignKey(Trip, related_name='logs', on_delete=models.CASCADE)
+    day = models.PositiveIntegerField()
+    date = models.DateField()
+    image = models.FileField(upload_to=_log_upload_to, max_length=255)
+    size = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['trip', 'day']
+        constraints = [
+            models.UniqueConstraint(fields=['trip', 'day'], name='dailylog_trip_day_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['date'], name='dailylog_date_idx'),
+        ]
+
+
+class DutyRecord(models.Model):
+    driver_name = models.CharField(max_length=100)
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    status = models.CharField(max_length=16)
+
+    class Meta:
+        ordering = ['driver_name', 'start']
+        indexes = [
+            models.Index(fields=['driver_name', 'start'], name='duty_driver_start_idx'),
+        ]
+
+
+class CycleLedger(models.Model):
+    # Rolling 70h/8-day aggregate per driver: one on-duty bucket per day, indexed by
+    # date ordinal modulo 8, kept current as duty records arrive.
+    driver_name = models.CharField(max_length=100, unique=True)
+    day = models.DateField(null=True)
+    buckets = models.JSONField(default=list)
+    last_duty_end = models.DateTimeField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
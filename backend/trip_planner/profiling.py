@@ -0,0 +1,120 @@
+import cProfile
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import List, Optional
+
+PROFILE_SUFFIXES = ('.collapsed', '.prof')
+
+
+class SamplingProfiler:
+
+    def __init__(self, interval: float = 0.005, thread_id: Optional[int] = None):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        if self.thread_id is None:
+            self.thread_id = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name='trip-planner-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.reverse()
+            self.samples[';'.join(stack)] += 1
+
+    def write(self, path_prefix: str) -> str:
+        path = f"{path_prefix}.collapsed"
+        with open(path, 'w') as fh:
+            for stack, count in self.samples.most_common():
+                fh.write(f"{stack} {count}\n")
+        return path
+
+
+class DeterministicProfiler:
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def __enter__(self):
+        self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profile.disable()
+        return False
+
+    def write(self, path_prefix: str) -> str:
+        path = f"{path_prefix}.prof"
+        self.profile.dump_stats(path)
+        return path
+
+
+class ServerTiming:
+    # Per-stage durations for the Server-Timing response header. Each lap is the time since
+    # the previous one; laps with the same name add up.
+
+    def __init__(self):
+        self.stages = {}
+        self._last = time.perf_counter()
+
+    def lap(self, name: str):
+        now = time.perf_counter()
+        self.stages[name] = self.stages.get(name, 0.0) + (now - self._last) * 1000
+        self._last = now
+
+    def header(self) -> str:
+        return ', '.join(f"{name};dur={ms:.1f}" for name, ms in self.stages.items())
+
+
+def prune_profiles(directory: str, keep: int) -> List[str]:
+
+    # Keeps the newest `keep` profile files; 0 keeps everything. Several workers may prune
+    # the same directory, so a file already gone is not an error.
+    if keep <= 0:
+        return []
+    profiles = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith(PROFILE_SUFFIXES):
+                try:
+                    profiles.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    continue
+    profiles.sort(reverse=True)
+    removed = []
+    for _, path in profiles[keep:]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        removed.append(path)
+    return removed
+
+
+def make_profiler(mode: str, interval: float = 0.005):
+    if mode == 'cprofile':
+        return DeterministicProfiler()
+    if mode == 'sampling':
+        return SamplingProfiler(interval=interval)
+    raise ValueError(f"Unknown profiler mode: {mode}")
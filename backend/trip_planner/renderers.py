@@ -0,0 +1,73 @@
+import base64
+import datetime
+import decimal
+from typing import Any
+
+import msgpack
+import orjson
+from django.conf import settings
+from rest_framework.renderers import BaseRenderer
+
+from .eld_log_generator import PNGImage
+
+
+def round_floats(value: Any, digits: int) -> Any:
+    if isinstance(value, float):
+        return round(value, digits)
+    if isinstance(value, dict):
+        return {key: round_floats(item, digits) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        first = value[0] if value else None
+        if isinstance(first, tuple) and len(first) == 2 and isinstance(first[0], float):
+            # Route geometry already comes at provider precision (OSRM/ORS emit at most
+            # 6 decimals) and walking it would cost more than serializing the payload.
+            return value
+        return [round_floats(item, digits) for item in value]
+    return value
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, PNGImage):
+        return obj.data_uri()
+    if isinstance(obj, bytes):
+        return base64.b64encode(obj).decode()
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+
+def _msgpack_default(obj: Any) -> Any:
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+
+class ORJSONRenderer(BaseRenderer):
+
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        digits = getattr(settings, 'TRIP_PLANNER_JSON_FLOAT_DIGITS', 6)
+        if digits >= 0:
+            data = round_floats(data, digits)
+        return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class MessagePackRenderer(BaseRenderer):
+
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # PNGImage is a bytes subclass, so log images are packed as raw bin values.
+        return msgpack.packb(data, use_bin_type=True, default=_msgpack_default)
@@ -1,36 +1,192 @@
 
 import requests
 import os
+import math
+import hashlib
+import threading
+import time
+from bisect import bisect_left
 from typing import List, Dict, Tuple, Optional
-from geopy.geocoders import Nominatim
-from geopy.distance import geodesic
+from django.conf import settings
+from django.core.cache import caches
+from requests.adapters import HTTPAdapter
+from .admission import Overloaded
+from .gazetteer import get_gazetteer, normalize_location
+from .locations import get_location_history
+from .single_flight import SingleFlight
+from .truck_stops import STOP_KINDS, get_truck_stop_index
+
+
+EARTH_RADIUS_MILES = 3958.7613
+# Seconds allowed for one OSRM/ORS HTTP request, and how many of those a lookup may make
+# (a route tries OSRM, then ORS).
+PROVIDER_TIMEOUT = 10
+PROVIDER_CALLS = {'geocode': 1, 'route': 2, 'matrix': 1}
+
+
+def cumulative_distances(waypoints: List[Tuple[float, float]]) -> List[float]:
+    # Haversine miles from the first waypoint to each one along the polyline.
+    cumulative = [0.0] * len(waypoints)
+    if not waypoints:
+        return cumulative
+    total = 0.0
+    lat1, lon1 = math.radians(waypoints[0][0]), math.radians(waypoints[0][1])
+    cos1 = math.cos(lat1)
+    for i in range(1, len(waypoints)):
+        lat2, lon2 = math.radians(waypoints[i][0]), math.radians(waypoints[i][1])
+        cos2 = math.cos(lat2)
+        a = math.sin((lat2 - lat1) / 2) ** 2 + cos1 * cos2 * math.sin((lon2 - lon1) / 2) ** 2
+        total += 2 * EARTH_RADIUS_MILES * math.asin(math.sqrt(min(a, 1.0)))
+        cumulative[i] = total
+        lat1, lon1, cos1 = lat2, lon2, cos2
+    return cumulative
+
+
+class RateLimiter:
+    
+    
+    def __init__(self, name: str, per_second: float, workers: int = 1, max_wait: Optional[float] = None):
+        # The provider's limit is shared by every worker process, so each gets its share.
+        self.name = name
+        self.interval = max(workers, 1) / per_second if per_second > 0 else 0.0
+        self.max_wait = max_wait
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+    
+    def wait(self):
+        
+        if not self.interval:
+            return
+        # Callers reserve evenly spaced slots, then sleep outside the lock. A caller whose
+        # slot is further out than max_wait gives up without taking it.
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            if self.max_wait is not None and slot - now > self.max_wait:
+                raise Overloaded(self.name, math.ceil(slot - now), "provider rate limit")
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
 
 
 class RouteService:
     
     
     def __init__(self):
-        self.geocoder = Nominatim(user_agent="eld_trip_planner")
+        self._geocoder = None
+        self._geocoder_lock = threading.Lock()
         
         self.ors_api_key = os.environ.get('ORS_API_KEY', None)
         
-        self.osrm_base_url = "http://router.project-osrm.org/route/v1/driving"
+        osrm_url = getattr(settings, 'TRIP_PLANNER_OSRM_URL', 'http://router.project-osrm.org').rstrip('/')
+        self.osrm_base_url = f"{osrm_url}/route/v1/driving"
+        self.osrm_table_url = f"{osrm_url}/table/v1/driving"
+        ors_url = getattr(settings, 'TRIP_PLANNER_ORS_URL', 'https://api.openrouteservice.org').rstrip('/')
+        self.ors_directions_url = f"{ors_url}/v2/directions/driving-car"
+        self.nominatim_url = getattr(settings, 'TRIP_PLANNER_NOMINATIM_URL', 'https://nominatim.openstreetmap.org')
+        
+        self.cache_alias = getattr(settings, 'TRIP_PLANNER_CACHE_ALIAS', 'default')
+        workers = int(getattr(settings, 'TRIP_PLANNER_PROVIDER_WORKERS', 1))
+        max_wait = getattr(settings, 'TRIP_PLANNER_PROVIDER_MAX_WAIT', 2.0)
+        self.rate_limits = {
+            name: RateLimiter(name, float(getattr(settings, setting, default)), workers, max_wait)
+            for name, setting, default in (
+                ('nominatim', 'TRIP_PLANNER_NOMINATIM_RPS', 1.0),
+                ('osrm', 'TRIP_PLANNER_OSRM_RPS', 0),
+                ('ors', 'TRIP_PLANNER_ORS_RPS', 0),
+            )
+        }
+        # Concurrent identical lookups share one cache read and provider call. Waiters stay as
+        # long as the leader's provider calls may take (rate-limit wait plus request timeout
+        # for each), so they only give up on a leader that is stuck.
+        self.flights = {
+            name: SingleFlight(name, calls * ((max_wait or 0) + PROVIDER_TIMEOUT))
+            for name, calls in PROVIDER_CALLS.items()
+        }
+        
+        # One pooled session per service; the service is shared by all request threads.
+        pool_size = int(getattr(settings, 'TRIP_PLANNER_HTTP_POOL_SIZE', 10))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+    
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+    
+    @property
+    def geocoder(self):
+        if self._geocoder is None:
+            with self._geocoder_lock:
+                if self._geocoder is None:
+                    from urllib.parse import urlsplit
+                    from geopy.geocoders import Nominatim
+                    url = urlsplit(self.nominatim_url)
+                    self._geocoder = Nominatim(
+                        user_agent="eld_trip_planner",
+                        domain=url.netloc + url.path.rstrip('/'),
+                        scheme=url.scheme or 'https',
+                    )
+        return self._geocoder
+    
+    def warm_up(self):
+        
+        from geopy.distance import geodesic  # noqa: F401
+        return self.geocoder
     
     def geocode_location(self, location: str) -> Optional[Tuple[float, float]]:
         
+        gazetteer = get_gazetteer()
+        if gazetteer is not None:
+            coords = gazetteer.lookup(location)
+            if coords:
+                return coords
+        
+        history = get_location_history()
+        coords = history.lookup(location)
+        if coords:
+            return coords
+        
+        key = self._geocode_key(location)
         try:
-            location_data = self.geocoder.geocode(location)
-            if location_data:
-                return (location_data.latitude, location_data.longitude)
+            coords = self.flights['geocode'].do(key, self._fetch_geocode, key, location)
+        except Overloaded:
+            # Rate limited: a 503 with Retry-After, not a location that cannot be found.
+            raise
         except Exception as e:
             print(f"Geocoding error: {e}")
+            coords = None
+        if coords:
+            history.add(location, coords)
+            return tuple(coords)
         return None
     
+    def _fetch_geocode(self, key: str, location: str) -> Optional[Tuple[float, float]]:
+        
+        coords = self.cache.get(key)
+        if coords is None:
+            self.rate_limits['nominatim'].wait()
+            location_data = self.geocoder.geocode(location)
+            if location_data:
+                coords = (location_data.latitude, location_data.longitude)
+                self.cache.set(key, coords)
+        return coords
+    
+    def _geocode_key(self, location: str) -> str:
+        return 'geocode:' + hashlib.sha1(normalize_location(location).encode()).hexdigest()
+    
+    def _route_key(self, points: List[Tuple[float, float]]) -> str:
+        return 'route:' + hashlib.sha1(
+            ';'.join(f"{lat:.5f},{lon:.5f}" for lat, lon in points).encode()
+        ).hexdigest()
+    
     def calculate_distance(
         self, 
         start_coords: Tuple[float, float], 
         end_coords: Tuple[float, float]
     ) -> float:
+        from geopy.distance import geodesic
         
         distance_km = geodesic(start_coords, end_coords).kilometers
         distance_miles = distance_km * 0.621371
@@ -43,46 +199,80 @@ class RouteService:
         dropoff_location: str
     ) -> Dict:
         
+        route = self.get_route_for_stops([current_location, pickup_location, dropoff_location])
+        distance_to_pickup = route['legs'][0]['distance']
+        distance_pickup_to_dropoff = route['legs'][1]['distance']
         
-        current_coords = self.geocode_location(current_location)
-        pickup_coords = self.geocode_location(pickup_location)
-        dropoff_coords = self.geocode_location(dropoff_location)
+        return {
+            'total_distance': route['total_distance'],
+            'distance_to_pickup': distance_to_pickup,
+            'distance_pickup_to_dropoff': distance_pickup_to_dropoff,
+            'duration_hours': route['duration_hours'],
+            'coordinates': {
+                'current': route['stops'][0],
+                'pickup': route['stops'][1],
+                'dropoff': route['stops'][2]
+            },
+            'legs': route['legs'],
+            'waypoints': route['waypoints'],
+            'route_geometry': route['waypoints']
+        }
+    
+    def geocode_stops(self, locations: List[str]) -> List[Tuple[float, float]]:
         
-        if not all([current_coords, pickup_coords, dropoff_coords]):
+        coords = [self.geocode_location(location) for location in locations]
+        if not all(coords):
             raise ValueError("Could not geocode one or more locations")
+        return coords
+    
+    def get_route_for_stops(
+        self,
+        locations: List[str],
+        coords: Optional[List[Tuple[float, float]]] = None
+    ) -> Dict:
         
+        if len(locations) < 2:
+            raise ValueError("A route needs at least two locations")
         
-        leg1_route = self._get_road_route(current_coords, pickup_coords)
-        leg2_route = self._get_road_route(pickup_coords, dropoff_coords)
-        
-        
-        distance_to_pickup = leg1_route['distance']
-        distance_pickup_to_dropoff = leg2_route['distance']
-        total_distance = distance_to_pickup + distance_pickup_to_dropoff
+        if coords is None:
+            coords = self.geocode_stops(locations)
         
         
-        waypoints = leg1_route['waypoints'] + leg2_route['waypoints']
+        route = self._get_road_route(coords)
         
         return {
-            'total_distance': total_distance,
-            'distance_to_pickup': distance_to_pickup,
-            'distance_pickup_to_dropoff': distance_pickup_to_dropoff,
-            'duration_hours': (leg1_route['duration'] + leg2_route['duration']) / 3600,
-            'coordinates': {
-                'current': current_coords,
-                'pickup': pickup_coords,
-                'dropoff': dropoff_coords
-            },
-            'waypoints': waypoints,
-            'route_geometry': waypoints  
+            'total_distance': route['distance'],
+            'duration_hours': route['duration'] / 3600,
+            'stops': coords,
+            'legs': [
+                {
+                    'from': locations[i],
+                    'to': locations[i + 1],
+                    'distance': leg['distance'],
+                    'duration_hours': leg['duration'] / 3600
+                }
+                for i, leg in enumerate(route['legs'])
+            ],
+            'waypoints': route['waypoints'],
+            'route_geometry': route['waypoints'],
+            'source': route.get('source')
         }
     
-    def _get_road_route(self, start: Tuple[float, float], end: Tuple[float, float]) -> Dict:
+    def _get_road_route(self, points: List[Tuple[float, float]]) -> Dict:
+        
+        key = self._route_key(points)
+        return self.flights['route'].do(key, self._fetch_road_route, key, points)
+    
+    def _fetch_road_route(self, key: str, points: List[Tuple[float, float]]) -> Dict:
         
+        route = self.cache.get(key)
+        if route is not None:
+            return route
         
         try:
-            route = self._get_osrm_route(start, end)
+            route = self._get_osrm_route(points)
             if route:
+                self.cache.set(key, route)
                 return route
         except Exception as e:
             print(f"OSRM routing failed: {e}")
@@ -90,27 +280,29 @@ class RouteService:
         
         if self.ors_api_key:
             try:
-                route = self._get_ors_route(start, end)
+                route = self._get_ors_route(points)
                 if route:
+                    self.cache.set(key, route)
                     return route
             except Exception as e:
                 print(f"ORS routing failed: {e}")
         
         
         print("Using geodesic fallback routing")
-        return self._get_geodesic_route(start, end)
+        return self._get_geodesic_route(points)
     
-    def _get_osrm_route(self, start: Tuple[float, float], end: Tuple[float, float]) -> Optional[Dict]:
+    def _get_osrm_route(self, points: List[Tuple[float, float]]) -> Optional[Dict]:
         
         
-        url = f"{self.osrm_base_url}/{start[1]},{start[0]};{end[1]},{end[0]}"
+        url = f"{self.osrm_base_url}/" + ";".join(f"{lon},{lat}" for lat, lon in points)
         params = {
             'overview': 'full',
             'geometries': 'geojson',
             'steps': 'false'
         }
         
-        response = requests.get(url, params=params, timeout=10)
+        self.rate_limits['osrm'].wait()
+        response = self.session.get(url, params=params, timeout=PROVIDER_TIMEOUT)
         if response.status_code == 200:
             data = response.json()
             if data.get('code') == 'Ok' and data.get('routes'):
@@ -124,26 +316,33 @@ class RouteService:
                 
                 distance_miles = route['distance'] * 0.000621371
                 duration_seconds = route['duration']
+                legs = [
+                    {'distance': leg['distance'] * 0.000621371, 'duration': leg['duration']}
+                    for leg in route['legs']
+                ]
                 
                 return {
+                    'source': 'osrm',
                     'distance': distance_miles,
                     'duration': duration_seconds,
-                    'waypoints': waypoints
+                    'waypoints': waypoints,
+                    'legs': legs
                 }
         return None
     
-    def _get_ors_route(self, start: Tuple[float, float], end: Tuple[float, float]) -> Optional[Dict]:
+    def _get_ors_route(self, points: List[Tuple[float, float]]) -> Optional[Dict]:
         
-        url = "https://api.openrouteservice.org/v2/directions/driving-car"
+        url = self.ors_directions_url
         headers = {
             'Authorization': self.ors_api_key,
             'Content-Type': 'application/json'
         }
         body = {
-            'coordinates': [[start[1], start[0]], [end[1], end[0]]]
+            'coordinates': [[lon, lat] for lat, lon in points]
         }
         
-        response = requests.post(url, json=body, headers=headers, timeout=10)
+        self.rate_limits['ors'].wait()
+        response = self.session.post(url, json=body, headers=headers, timeout=PROVIDER_TIMEOUT)
         if response.status_code == 200:
             data = response.json()
             if data.get('routes'):
@@ -156,36 +355,116 @@ class RouteService:
                 
                 distance_miles = route['summary']['distance'] * 0.000621371
                 duration_seconds = route['summary']['duration']
+                legs = [
+                    {'distance': segment['distance'] * 0.000621371, 'duration': segment['duration']}
+                    for segment in route['segments']
+                ]
                 
                 return {
+                    'source': 'ors',
                     'distance': distance_miles,
                     'duration': duration_seconds,
-                    'waypoints': waypoints
+                    'waypoints': waypoints,
+                    'legs': legs
                 }
         return None
     
-    def _get_geodesic_route(self, start: Tuple[float, float], end: Tuple[float, float]) -> Dict:
+    def _get_geodesic_route(self, points: List[Tuple[float, float]]) -> Dict:
+        from geopy.distance import geodesic
         
-        distance_km = geodesic(start, end).kilometers
-        distance_miles = distance_km * 0.621371
+        waypoints = [points[0]]
+        legs = []
+        segments = 20
+        for start, end in zip(points, points[1:]):
+            distance_km = geodesic(start, end).kilometers
+            distance_miles = distance_km * 0.621371
+            
+            
+            duration_seconds = (distance_miles / 55) * 3600
+            legs.append({'distance': distance_miles, 'duration': duration_seconds})
+            
+            
+            for i in range(1, segments):
+                ratio = i / segments
+                lat = start[0] + (end[0] - start[0]) * ratio
+                lon = start[1] + (end[1] - start[1]) * ratio
+                waypoints.append((lat, lon))
+            waypoints.append(end)
+        
+        return {
+            'source': 'geodesic',
+            'distance': sum(leg['distance'] for leg in legs),
+            'duration': sum(leg['duration'] for leg in legs),
+            'waypoints': waypoints,
+            'legs': legs
+        }
+    
+    def get_distance_matrix(self, points: List[Tuple[float, float]]) -> Dict:
         
+        key = 'matrix:' + hashlib.sha1(
+            ';'.join(f"{lat:.5f},{lon:.5f}" for lat, lon in points).encode()
+        ).hexdigest()
+        return self.flights['matrix'].do(key, self._fetch_distance_matrix, key, points)
+    
+    def _fetch_distance_matrix(self, key: str, points: List[Tuple[float, float]]) -> Dict:
         
-        duration_seconds = (distance_miles / 55) * 3600
+        matrix = self.cache.get(key)
+        if matrix is not None:
+            return matrix
         
+        matrix = None
+        try:
+            matrix = self._get_osrm_table(points)
+        except Exception as e:
+            print(f"OSRM table failed: {e}")
         
-        waypoints = [start]
-        segments = 20
-        for i in range(1, segments):
-            ratio = i / segments
-            lat = start[0] + (end[0] - start[0]) * ratio
-            lon = start[1] + (end[1] - start[1]) * ratio
-            waypoints.append((lat, lon))
-        waypoints.append(end)
+        if matrix is None:
+            # Not cached, like the geodesic route: the next request asks OSRM again.
+            print("Using geodesic fallback distance matrix")
+            return self._get_geodesic_matrix(points)
+        
+        self.cache.set(key, matrix)
+        return matrix
+    
+    def _get_osrm_table(self, points: List[Tuple[float, float]]) -> Optional[Dict]:
+        
+        url = f"{self.osrm_table_url}/" + ";".join(f"{lon},{lat}" for lat, lon in points)
+        params = {'annotations': 'distance,duration'}
+        
+        self.rate_limits['osrm'].wait()
+        response = self.session.get(url, params=params, timeout=PROVIDER_TIMEOUT)
+        if response.status_code == 200:
+            data = response.json()
+            if data.get('code') == 'Ok' and data.get('distances') and data.get('durations'):
+                if any(value is None for row in data['distances'] for value in row):
+                    return None
+                return {
+                    'source': 'osrm',
+                    'distances': [[value * 0.000621371 for value in row] for row in data['distances']],
+                    'durations': [[value / 3600 for value in row] for row in data['durations']]
+                }
+        return None
+    
+    def _get_geodesic_matrix(self, points: List[Tuple[float, float]]) -> Dict:
+        
+        # Haversine over the whole matrix with the per-point trig hoisted out of
+        # the pairwise loop. Plain Python: numpy is not a dependency, and for the 26
+        # points a trip may have this is well under a millisecond.
+        lats = [math.radians(lat) for lat, _ in points]
+        lons = [math.radians(lon) for _, lon in points]
+        cos_lats = [math.cos(lat) for lat in lats]
+        n = len(points)
+        distances = [[0.0] * n for _ in range(n)]
+        for i in range(n):
+            for j in range(i + 1, n):
+                a = (math.sin((lats[j] - lats[i]) / 2) ** 2
+                     + cos_lats[i] * cos_lats[j] * math.sin((lons[j] - lons[i]) / 2) ** 2)
+                distances[i][j] = distances[j][i] = 2 * EARTH_RADIUS_MILES * math.asin(math.sqrt(a))
         
         return {
-            'distance': distance_miles,
-            'duration': duration_seconds,
-            'waypoints': waypoints
+            'source': 'geodesic',
+            'distances': distances,
+            'durations': [[value / 55 for value in row] for row in distances]
         }
     
     def calculate_rest_stop_locations(
@@ -194,25 +473,49 @@ class RouteService:
         rest_intervals_miles: List[float]
     ) -> List[Dict]:
         
-        rest_stops = []
-        total_distance = 0
-        rest_index = 0
+        return self.calculate_stop_locations(route_waypoints, rest_intervals_miles, 'rest_stop')
+    
+    def calculate_stop_locations(
+        self,
+        route_waypoints: List[Tuple[float, float]],
+        stop_distances_miles: List[float],
+        stop_type: str
+    ) -> List[Dict]:
         
-        for i in range(len(route_waypoints) - 1):
-            segment_distance = self.calculate_distance(
-                route_waypoints[i], 
-                route_waypoints[i + 1]
-            )
-            total_distance += segment_distance
-            
-            
-            if rest_index < len(rest_intervals_miles):
-                if total_distance >= rest_intervals_miles[rest_index]:
-                    rest_stops.append({
-                        'location': route_waypoints[i + 1],
-                        'distance_from_start': total_distance,
-                        'type': 'rest_stop'
-                    })
-                    rest_index += 1
-        
-        return rest_stops
+        return self.calculate_route_stops(route_waypoints, {stop_type: stop_distances_miles})[stop_type]
+    
+    def calculate_route_stops(
+        self,
+        route_waypoints: List[Tuple[float, float]],
+        stop_distances: Dict[str, List[float]]
+    ) -> Dict[str, List[Dict]]:
+        
+        # One pass over the polyline for every stop type: each stop goes at the first
+        # waypoint whose distance along the route reaches its target.
+        cumulative = cumulative_distances(route_waypoints)
+        truck_stops = get_truck_stop_index()
+        corridor_miles = getattr(settings, 'TRIP_PLANNER_STOP_CORRIDOR_MILES', 10.0)
+        
+        placed = {}
+        for stop_type, distances in stop_distances.items():
+            stops = placed[stop_type] = []
+            for target in distances:
+                index = bisect_left(cumulative, target, 1)
+                if index >= len(cumulative):
+                    break
+                route_location = route_waypoints[index]
+                facility = None
+                if truck_stops:
+                    facility = truck_stops.nearest(
+                        route_location[0], route_location[1],
+                        corridor_miles, STOP_KINDS.get(stop_type)
+                    )
+                stops.append({
+                    'location': facility['location'] if facility else route_location,
+                    'route_location': route_location,
+                    'distance_from_start': cumulative[index],
+                    'type': stop_type,
+                    'facility': facility
+                })
+        
+        return placed
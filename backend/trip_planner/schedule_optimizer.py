@@ -0,0 +1,125 @@
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .hos_calculator import EPSILON, DutyState, DutyTimeline, HOSCalculator
+
+
+def _state_key(state: DutyState) -> Tuple:
+    return (
+        state.leg, round(state.leg_left, 2), state.dwell_done, round(state.drive_shift, 2),
+        round(state.window, 2), round(state.since_break, 2), round(state.cycle_left, 1),
+        round(state.fuel_miles), state.pending, round(state.drive_after, 2), round(state.window_after, 2),
+    )
+
+
+class ScheduleOptimizer:
+
+
+    SPLIT_SLEEPER_OPTIONS = (7, 8)
+    BEAM_WIDTH = 48
+
+    def __init__(self, hos_calculator: HOSCalculator, beam_width: Optional[int] = None):
+        self.hos = hos_calculator
+        self.beam_width = beam_width or self.BEAM_WIDTH
+        self.states_explored = 0
+
+    def optimize(
+        self,
+        stops: List[Dict],
+        average_speed: float = 55.0,
+        fuel_interval: float = 1000.0,
+        fuel_time: float = 0.5
+    ) -> Dict:
+
+        started = time.perf_counter()
+        self.stops = stops
+        self.speed = average_speed
+        self.timeline = DutyTimeline(
+            self.hos, stops, average_speed, fuel_interval=fuel_interval, fuel_time=fuel_time
+        )
+
+        # Greedy on the same clock, without the midnight padding the daily plan adds, so
+        # hours_saved only counts what the search actually gained.
+        greedy = self.timeline.run()
+        best = greedy
+        used = 'greedy'
+        finished = self._search()
+        if finished is not None and finished.t < greedy.t - EPSILON:
+            best = finished
+            used = 'optimized'
+
+        return {
+            'schedule': self.timeline.schedule(best),
+            'used': used,
+            'trip_hours': best.t,
+            'greedy_trip_hours': greedy.t,
+            'hours_saved': greedy.t - best.t,
+            'states_explored': self.states_explored,
+            'solve_ms': (time.perf_counter() - started) * 1000,
+        }
+
+    def _search(self) -> Optional[DutyState]:
+
+        best_finished = None
+        seen: Dict[Tuple, float] = {}
+        layer = [self.timeline.advance(self.timeline.initial_state())]
+        max_layers = int(HOSCalculator.MAX_SCHEDULE_DAYS * 24 / HOSCalculator.REQUIRED_BREAK_HOURS)
+
+        for _ in range(max_layers):
+            candidates = []
+            for state in layer:
+                if state.leg >= len(self.stops):
+                    if best_finished is None or state.t < best_finished.t:
+                        best_finished = state
+                    continue
+                if best_finished is not None and self._lower_bound(state) >= best_finished.t:
+                    continue
+                key = _state_key(state)
+                if seen.get(key, math.inf) <= state.t:
+                    continue
+                seen[key] = state.t
+                candidates.append(state)
+
+            if not candidates:
+                return best_finished
+
+            candidates.sort(key=self._lower_bound)
+            layer = []
+            for state in candidates[:self.beam_width]:
+                for option in self._options(state):
+                    child = self.timeline.apply(state, option)
+                    if child.t > HOSCalculator.MAX_SCHEDULE_DAYS * 24:
+                        continue
+                    self.states_explored += 1
+                    layer.append(self.timeline.advance(child))
+        return best_finished
+
+    def _lower_bound(self, state: DutyState) -> float:
+        if state.leg >= len(self.stops):
+            return state.t
+        miles = state.leg_left + sum(stop['distance'] for stop in self.stops[state.leg + 1:])
+        dwell = sum(stop['dwell_time'] for stop in self.stops[state.leg + 1:])
+        if not state.dwell_done:
+            dwell += self.stops[state.leg]['dwell_time']
+        drive_hours = miles / self.speed
+        beyond_shift = drive_hours - max(0.0, HOSCalculator.MAX_DRIVING_HOURS - state.drive_shift)
+        rests = max(0, math.ceil(beyond_shift / HOSCalculator.MAX_DRIVING_HOURS - EPSILON))
+        return state.t + drive_hours + dwell + rests * HOSCalculator.REQUIRED_OFF_DUTY_HOURS
+
+    def _options(self, state: DutyState) -> List[Tuple[str, float]]:
+
+        if state.cycle_left <= EPSILON:
+            return [('restart', HOSCalculator.RESTART_HOURS)]
+
+        shift_bound = (HOSCalculator.MAX_DRIVING_HOURS - state.drive_shift <= EPSILON
+                       or HOSCalculator.MAX_ON_DUTY_HOURS - state.window <= EPSILON)
+        options = []
+        if not shift_bound:
+            options.append(('break', HOSCalculator.REQUIRED_BREAK_HOURS))
+        options.append(('rest', HOSCalculator.REQUIRED_OFF_DUTY_HOURS))
+        if state.pending is None:
+            options.extend(('split_long', hours) for hours in self.SPLIT_SLEEPER_OPTIONS)
+        else:
+            options.append(('split_short', HOSCalculator.REQUIRED_OFF_DUTY_HOURS - state.pending))
+        return options
@@ -0,0 +1,110 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from django.conf import settings
+
+from .admission import StageLimiter
+
+
+logger = logging.getLogger(__name__)
+
+_started = time.perf_counter()
+_lock = threading.Lock()
+_route_service = None
+_eld_generator = None
+_limiters: Dict[str, StageLimiter] = {}
+
+# Stage -> setting holding its concurrency limit; the defaults live in settings.py.
+STAGE_SETTINGS = {
+    'routing': 'TRIP_PLANNER_ROUTING_CONCURRENCY',
+    'rendering': 'TRIP_PLANNER_RENDER_CONCURRENCY',
+}
+
+startup: Dict[str, Optional[float]] = {
+    'warm_start': None,
+    'cold_start_ms': None,
+    'warm_up_ms': None,
+    'first_request_ms': None,
+}
+
+
+def get_route_service():
+
+    global _route_service
+    if _route_service is None:
+        with _lock:
+            if _route_service is None:
+                from .route_service import RouteService
+                _route_service = RouteService()
+    return _route_service
+
+
+def get_eld_generator():
+
+    global _eld_generator
+    if _eld_generator is None:
+        with _lock:
+            if _eld_generator is None:
+                from .eld_log_generator import ELDLogGenerator
+                _eld_generator = ELDLogGenerator()
+    return _eld_generator
+
+
+def get_limiter(stage: str) -> StageLimiter:
+
+    limiter = _limiters.get(stage)
+    if limiter is None:
+        with _lock:
+            limiter = _limiters.get(stage)
+            if limiter is None:
+                limiter = _limiters[stage] = StageLimiter(
+                    stage,
+                    getattr(settings, STAGE_SETTINGS[stage]),
+                    getattr(settings, 'TRIP_PLANNER_ADMISSION_QUEUE', 16),
+                    getattr(settings, 'TRIP_PLANNER_ADMISSION_TIMEOUT', 2.0),
+                )
+    return limiter
+
+
+def warm_up():
+
+    started = time.perf_counter()
+    warm_start = getattr(settings, 'TRIP_PLANNER_WARM_START', True)
+    if warm_start:
+        from .truck_stops import get_truck_stop_index
+
+        get_route_service().warm_up()
+        get_eld_generator().warm_up()
+        get_truck_stop_index()
+
+    finished = time.perf_counter()
+    startup['warm_start'] = warm_start
+    startup['warm_up_ms'] = round((finished - started) * 1000, 2)
+    startup['cold_start_ms'] = round((finished - _started) * 1000, 2)
+    if warm_start:
+        logger.info(
+            "trip_planner warm start: %s ms (cold start %s ms)", startup['warm_up_ms'], startup['cold_start_ms']
+        )
+
+
+def record_first_request(duration_ms: float):
+    if startup['first_request_ms'] is None:
+        startup['first_request_ms'] = round(duration_ms, 2)
+
+
+def collect_metrics() -> Dict:
+
+    # Counters are per worker process; pid tells the workers apart.
+    route_service = get_route_service()
+    metrics = {
+        'pid': os.getpid(),
+        'single_flight': {name: flight.stats() for name, flight in route_service.flights.items()},
+    }
+    cache = route_service.cache
+    if hasattr(cache, 'stats'):
+        metrics['cache'] = cache.stats()
+    metrics['admission'] = {stage: get_limiter(stage).stats() for stage in STAGE_SETTINGS}
+    return metrics
@@ -0,0 +1,72 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from .admission import Overloaded
+
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    # At most one call per key runs at a time; threads asking for the same key while it
+    # runs wait and receive its result, or its exception. A waiter holds its caller's
+    # admission slot, so it waits at most `timeout` seconds and is then turned away with
+    # Overloaded.
+
+    def __init__(self, name: str = 'single_flight', timeout: Optional[float] = None):
+        self.name = name
+        self.timeout = timeout
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.shed = 0
+
+    def do(self, key: Hashable, fn: Callable, *args) -> Any:
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if not call.done.wait(self.timeout):
+                with self._lock:
+                    self.shed += 1
+                raise Overloaded(self.name, 1, 'identical request still running')
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args)
+        except Exception as e:
+            call.error = e
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'coalesced': self.coalesced,
+                'errors': self.errors,
+                'shed': self.shed,
+                'in_flight': len(self._calls),
+            }
@@ -0,0 +1,111 @@
+import time
+from typing import Dict, List, Tuple
+
+from .hos_calculator import HOSCalculator
+
+
+class StopOrderOptimizer:
+
+
+    def __init__(self, hos_calculator: HOSCalculator, average_speed: float = 55.0, max_passes: int = 10):
+        self.hos_calculator = hos_calculator
+        self.average_speed = average_speed
+        self.max_passes = max_passes
+        self.evaluations = 0
+        self._scores: Dict[Tuple[int, ...], Tuple[float, float]] = {}
+
+    def score(self, order: List[int], stops: List[Dict], distances: List[List[float]]) -> Tuple[float, float]:
+
+        key = tuple(order)
+        cached = self._scores.get(key)
+        if cached is not None:
+            return cached
+
+        legs = []
+        previous = 0
+        for index in order:
+            legs.append({
+                'distance': distances[previous][index + 1],
+                'dwell_time': stops[index]['dwell_time'],
+                'activity': stops[index]['type'],
+            })
+            previous = index + 1
+
+        self.evaluations += 1
+        try:
+            schedule = self.hos_calculator.calculate_multi_stop_schedule(legs, self.average_speed)
+        except ValueError:
+            self._scores[key] = (float('inf'), float('inf'))
+            return self._scores[key]
+        last = schedule[-1]
+        driving_hours = sum(leg['distance'] for leg in legs) / self.average_speed
+        self._scores[key] = (last['day'] * 24 + last['end_time'], driving_hours)
+        return self._scores[key]
+
+    def _nearest_neighbor(self, start: int, movable: List[int], durations: List[List[float]]) -> List[int]:
+
+        order = []
+        remaining = set(movable)
+        current = start
+        while remaining:
+            nearest = min(remaining, key=lambda index: (durations[current][index + 1], index))
+            order.append(nearest)
+            remaining.remove(nearest)
+            current = nearest + 1
+        return order
+
+    def optimize(self, stops: List[Dict], matrix: Dict) -> Dict:
+
+        started = time.perf_counter()
+        distances = matrix['distances']
+        durations = matrix['durations']
+
+        # Pickups stay where they were given and each run of drops between them is reordered
+        # on its own, so no drop moves past a pickup (or a pickup past a drop) and the load
+        # sequence of a pickup/drop chain is kept.
+        runs: List[List[int]] = []
+        for index, stop in enumerate(stops):
+            if stop['type'] != 'pickup' and runs and stops[runs[-1][-1]]['type'] != 'pickup':
+                runs[-1].append(index)
+            else:
+                runs.append([index])
+        given = list(range(len(stops)))
+
+        seeded = []
+        previous = 0
+        for run in runs:
+            if len(run) > 1:
+                run = self._nearest_neighbor(previous, run, durations)
+            seeded.append(run)
+            previous = run[-1] + 1
+        best = min([runs, seeded], key=lambda candidate: self.score(_flatten(candidate), stops, distances))
+        best_score = self.score(_flatten(best), stops, distances)
+
+        for _ in range(self.max_passes):
+            improved = False
+            for r, run in enumerate(best):
+                for i in range(len(run) - 1):
+                    for j in range(i + 1, len(run)):
+                        reversed_run = run[:i] + run[i:j + 1][::-1] + run[j + 1:]
+                        candidate = best[:r] + [reversed_run] + best[r + 1:]
+                        candidate_score = self.score(_flatten(candidate), stops, distances)
+                        if candidate_score < best_score:
+                            best, best_score = candidate, candidate_score
+                            run = reversed_run
+                            improved = True
+            if not improved:
+                break
+
+        return {
+            'order': _flatten(best),
+            'trip_hours': best_score[0],
+            'driving_hours': best_score[1],
+            'given_order_trip_hours': self.score(given, stops, distances)[0],
+            'evaluations': self.evaluations,
+            'solve_ms': (time.perf_counter() - started) * 1000,
+            'matrix_source': matrix.get('source'),
+        }
+
+
+def _flatten(runs: List[List[int]]) -> List[int]:
+    return [index for run in runs for index in run]
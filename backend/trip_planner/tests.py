@@ -0,0 +1,954 @@
+import io
+import os
+import random
+import tempfile
+import threading
+import zipfile
+from datetime import date, datetime, timedelta, timezone
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .admission import Overloaded
+from .cycle_ledger import RollingCycle, get_cycle, record_duty
+from .departure_sweep import DepartureSweep, pareto_front
+from .hos_audit import Auditor, AuditStats, audit_stream
+from .hos_calculator import DutyTimeline, HOSCalculator, wait_for_window
+from .locations import LocationHistory, _seed_from_trips
+from .middleware import StartupTimingMiddleware
+from .models import CycleLedger, DailyLog, DutyRecord, Trip
+from .profiling import prune_profiles
+from .route_service import RateLimiter, RouteService, cumulative_distances
+from .services import get_limiter
+from .schedule_optimizer import ScheduleOptimizer
+from .single_flight import SingleFlight
+from .stop_optimizer import StopOrderOptimizer
+from .trip_store import save_trip
+
+
+EPSILON = 1e-6
+
+
+def hos_violations(schedule, cycle_used=0.0):
+
+    # Walks a schedule on a continuous clock and reports every 11/14/8-hour and 70-hour
+    # breach, independently of the scheduler that produced it. A split sleeper-berth pair
+    # leaves both halves off the 14-hour window and restarts the shift from the end of the
+    # long half.
+    violations = []
+    clock = 0.0
+    shift_start = 0.0
+    shift_driving = since_break = 0.0
+    long_end = driving_after = short_hours = 0.0
+    cycle = cycle_used
+    off_run = on_run = 0.0
+    for segment in schedule:
+        start = segment['day'] * 24 + segment['start_time']
+        if start < clock - EPSILON:
+            violations.append(('overlap', start))
+        if start > clock + EPSILON:
+            off_run += start - clock
+        clock = start + segment['duration']
+
+        if segment['status'] in ('off_duty', 'sleeper'):
+            off_run += segment['duration']
+            on_run = 0.0
+            if segment['activity'] == 'split_sleeper':
+                shift_start += segment['duration']
+                long_end = clock
+                driving_after = short_hours = 0.0
+            elif segment['activity'] == 'split_rest':
+                short_hours += segment['duration']
+                shift_start = long_end + short_hours
+                shift_driving = driving_after
+            continue
+        if off_run >= HOSCalculator.RESTART_HOURS - EPSILON:
+            cycle = 0.0
+        if off_run >= HOSCalculator.REQUIRED_OFF_DUTY_HOURS - EPSILON:
+            shift_start = start
+            shift_driving = since_break = 0.0
+        if off_run >= HOSCalculator.REQUIRED_BREAK_HOURS - EPSILON:
+            since_break = 0.0
+        off_run = 0.0
+
+        cycle += segment['duration']
+        if segment['status'] != 'driving':
+            on_run += segment['duration']
+            if on_run >= HOSCalculator.REQUIRED_BREAK_HOURS - EPSILON:
+                since_break = 0.0
+            continue
+        on_run = 0.0
+        shift_driving += segment['duration']
+        driving_after += segment['duration']
+        since_break += segment['duration']
+        if shift_driving > HOSCalculator.MAX_DRIVING_HOURS + EPSILON:
+            violations.append(('driving_11h', start))
+        if clock > shift_start + HOSCalculator.MAX_ON_DUTY_HOURS + EPSILON:
+            violations.append(('window_14h', start))
+        if since_break > 8 + EPSILON:
+            violations.append(('break_30m', start))
+        if cycle > HOSCalculator.MAX_CYCLE_HOURS + EPSILON:
+            violations.append(('cycle_70h', start))
+    return violations
+
+
+def legs(*stops):
+    return [
+        {'distance': miles, 'dwell_time': dwell, 'activity': activity}
+        for miles, dwell, activity in stops
+    ]
+
+
+class MultiStopScheduleTests(SimpleTestCase):
+
+    def assertCompliant(self, schedule, cycle_used=0.0):
+        self.assertEqual(hos_violations(schedule, cycle_used), [])
+
+    def test_two_stop_trip_matches_trip_schedule(self):
+        hos = HOSCalculator(0)
+        self.assertEqual(
+            hos.calculate_trip_schedule(200, 900),
+            hos.calculate_multi_stop_schedule(legs((200, 1, 'pickup'), (900, 1, 'dropoff'))),
+        )
+
+    def test_schedules_stay_within_limits(self):
+        trips = [
+            legs((50, 1, 'pickup'), (300, 1, 'dropoff')),
+            legs((200, 1, 'pickup'), (2400, 1, 'dropoff')),
+            legs((120, 2, 'pickup'), (310, 0.5, 'dropoff'), (95, 3, 'dropoff'), (440, 1, 'dropoff'), (60, 1, 'dropoff')),
+            legs((0, 1, 'pickup'), (600, 6, 'dropoff'), (600, 0.25, 'pickup'), (600, 0, 'dropoff')),
+        ]
+        for stops in trips:
+            with self.subTest(stops=stops):
+                schedule = HOSCalculator(0).calculate_multi_stop_schedule(stops)
+                self.assertCompliant(schedule)
+
+    def test_every_stop_is_visited_in_order(self):
+        stops = legs((100, 1, 'pickup'), (500, 2, 'dropoff'), (700, 1, 'pickup'), (300, 1, 'dropoff'))
+        schedule = HOSCalculator(0).calculate_multi_stop_schedule(stops)
+        visits = [s for s in schedule if s['activity'] in ('pickup', 'dropoff')]
+        self.assertEqual([s['leg'] for s in visits], [0, 1, 2, 3])
+        self.assertEqual([round(s['duration'], 6) for s in visits], [1, 2, 1, 1])
+        for leg, stop in enumerate(stops):
+            miles = sum(s['distance_covered'] for s in schedule if s['leg'] == leg)
+            self.assertAlmostEqual(miles, stop['distance'])
+
+    def test_break_after_eight_hours_of_driving(self):
+        schedule = HOSCalculator(0).calculate_multi_stop_schedule(legs((0, 0, 'pickup'), (550, 0, 'dropoff')))
+        driving = [s for s in schedule if s['status'] == 'driving']
+        self.assertAlmostEqual(driving[0]['duration'], 8)
+        self.assertEqual(schedule[schedule.index(driving[0]) + 1]['activity'], 'required_break')
+
+    def test_rest_after_eleven_hours_of_driving(self):
+        schedule = HOSCalculator(0).calculate_multi_stop_schedule(legs((0, 0, 'pickup'), (1000, 0, 'dropoff')))
+        first_rest = next(i for i, s in enumerate(schedule) if s['activity'] == 'required_rest')
+        driven = sum(s['duration'] for s in schedule[:first_rest] if s['status'] == 'driving')
+        self.assertAlmostEqual(driven, HOSCalculator.MAX_DRIVING_HOURS)
+        self.assertEqual(schedule[first_rest]['duration'], HOSCalculator.REQUIRED_OFF_DUTY_HOURS)
+
+
+class CycleRestartTests(SimpleTestCase):
+
+    def restarts(self, schedule):
+        # Consecutive cycle_restart pieces (split at midnight) joined into restarts.
+        runs = []
+        previous = None
+        for segment in schedule:
+            if segment['activity'] == 'cycle_restart':
+                if previous is not None and previous['activity'] == 'cycle_restart':
+                    runs[-1] += segment['duration']
+                else:
+                    runs.append(segment['duration'])
+            previous = segment
+        return runs
+
+    def test_restart_lasts_34_hours(self):
+        schedule = HOSCalculator(69).calculate_trip_schedule(100, 600)
+        self.assertEqual([round(hours, 6) for hours in self.restarts(schedule)], [HOSCalculator.RESTART_HOURS])
+        first = next(s for s in schedule if s['activity'] == 'cycle_restart')
+        after = schedule[max(i for i, s in enumerate(schedule) if s['activity'] == 'cycle_restart') + 1]
+        elapsed = after['day'] * 24 + after['start_time'] - (first['day'] * 24 + first['start_time'])
+        self.assertAlmostEqual(elapsed, HOSCalculator.RESTART_HOURS)
+        self.assertEqual(hos_violations(schedule, 69), [])
+
+    def test_on_duty_time_counts_toward_the_cycle(self):
+        # 60 used + 1 h driving + 3 h pickup + 6 h driving reaches 70 with only 67 hours
+        # counted if driving alone were charged.
+        stops = legs((55, 3, 'pickup'), (330, 2, 'dropoff'), (275, 1, 'dropoff'))
+        schedule = HOSCalculator(60).calculate_multi_stop_schedule(stops)
+        self.assertEqual(len(self.restarts(schedule)), 1)
+        self.assertEqual(hos_violations(schedule, 60), [])
+        restart = next(i for i, s in enumerate(schedule) if s['activity'] == 'cycle_restart')
+        # Up to the end of the last drive; work after it (the dropoff) may run past 70.
+        last_drive = max(i for i in range(restart) if schedule[i]['status'] == 'driving')
+        before = schedule[:last_drive + 1]
+        on_duty = sum(s['duration'] for s in before if s['status'] in ('driving', 'on_duty'))
+        driving = sum(s['duration'] for s in before if s['status'] == 'driving')
+        self.assertAlmostEqual(60 + on_duty, HOSCalculator.MAX_CYCLE_HOURS)
+        self.assertLess(60 + driving, HOSCalculator.MAX_CYCLE_HOURS)
+
+    def test_fuel_stops_count_toward_the_cycle(self):
+        schedule = HOSCalculator(40).calculate_multi_stop_schedule(
+            legs((100, 1, 'pickup'), (2500, 1, 'dropoff')), fuel_interval=1000.0, fuel_time=0.5,
+        )
+        self.assertEqual(sum(1 for s in schedule if s['activity'] == 'fuel_stop'), 2)
+        self.assertEqual(hos_violations(schedule, 40), [])
+
+    def test_long_trips_stay_within_limits(self):
+        for cycle_used in (0, 35, 69.5):
+            with self.subTest(cycle_used=cycle_used):
+                schedule = HOSCalculator(cycle_used).calculate_multi_stop_schedule(
+                    legs((300, 2, 'pickup'), (1800, 4, 'dropoff'), (2200, 1, 'dropoff')),
+                    fuel_interval=1000.0, fuel_time=0.5,
+                )
+                self.assertEqual(hos_violations(schedule, cycle_used), [])
+
+    def test_non_finite_inputs_are_rejected(self):
+        for stops in (legs((100, float('nan'), 'pickup')), legs((float('inf'), 1, 'pickup')),
+                      legs((100, -1, 'pickup'))):
+            with self.subTest(stops=stops), self.assertRaises(ValueError):
+                HOSCalculator(0).calculate_multi_stop_schedule(stops)
+        for cycle_used in (float('nan'), -1, 71):
+            with self.subTest(cycle_used=cycle_used), self.assertRaises(ValueError):
+                HOSCalculator(cycle_used)
+
+
+class ScheduleOptimizerTests(SimpleTestCase):
+
+    STOPS = legs((300, 2, 'pickup'), (1800, 4, 'dropoff'), (2200, 1, 'dropoff'))
+
+    def optimize(self, cycle_used, stops=STOPS):
+        return ScheduleOptimizer(HOSCalculator(cycle_used)).optimize(stops, fuel_interval=1000.0, fuel_time=0.5)
+
+    def test_hours_saved_is_measured_against_unpadded_greedy(self):
+        result = self.optimize(0)
+        greedy = DutyTimeline(HOSCalculator(0), self.STOPS, fuel_interval=1000.0, fuel_time=0.5).run()
+        padded = HOSCalculator(0).calculate_multi_stop_schedule(self.STOPS, fuel_interval=1000.0, fuel_time=0.5)
+        self.assertAlmostEqual(result['greedy_trip_hours'], greedy.t)
+        self.assertLess(result['greedy_trip_hours'], padded[-1]['day'] * 24 + padded[-1]['end_time'])
+        self.assertAlmostEqual(result['hours_saved'], result['greedy_trip_hours'] - result['trip_hours'])
+        self.assertGreaterEqual(result['hours_saved'], 0)
+
+    def test_unimproved_schedule_is_the_unpadded_greedy(self):
+        stops = legs((100, 1, 'pickup'), (200, 1, 'dropoff'))
+        result = self.optimize(0, stops)
+        self.assertEqual(result['used'], 'greedy')
+        self.assertEqual(result['hours_saved'], 0)
+        end = result['schedule'][-1]
+        self.assertAlmostEqual(end['day'] * 24 + end['end_time'], result['trip_hours'])
+
+    def test_on_duty_time_counts_toward_the_cycle(self):
+        stops = legs((55, 3, 'pickup'), (330, 2, 'dropoff'), (275, 1, 'dropoff'))
+        result = self.optimize(60, stops)
+        self.assertIn('cycle_restart', [s['activity'] for s in result['schedule']])
+        self.assertEqual(hos_violations(result['schedule'], 60), [])
+
+    def test_schedules_stay_within_limits(self):
+        for cycle_used in (0, 35, 69.5):
+            with self.subTest(cycle_used=cycle_used):
+                result = self.optimize(cycle_used)
+                self.assertEqual(hos_violations(result['schedule'], cycle_used), [])
+                self.assertLessEqual(result['trip_hours'], result['greedy_trip_hours'] + EPSILON)
+
+    def test_split_sleeper_pairs_stay_within_limits(self):
+        result = self.optimize(30, legs((900, 6, 'pickup'), (900, 6, 'dropoff'), (900, 0.5, 'dropoff')))
+        self.assertEqual(result['used'], 'optimized')
+        self.assertIn('split_sleeper', [s['activity'] for s in result['schedule']])
+        self.assertEqual(hos_violations(result['schedule'], 30), [])
+
+
+class ClockNearLimitTests(SimpleTestCase):
+    # A dwell that leaves a clock just short of its limit used to loop until the iteration
+    # guard gave up; the scheduler now takes the break or rest that is due.
+
+    def driving_before(self, schedule, after, activity):
+        start = [s['activity'] for s in schedule].index(after)
+        end = next(i for i in range(start, len(schedule)) if schedule[i]['activity'] == activity)
+        return sum(s['duration'] for s in schedule[start:end] if s['status'] == 'driving')
+
+    def test_eight_hour_clock_just_short_of_limit(self):
+        stops = legs((7.95 * 55, 0.25, 'pickup'), (100, 1, 'dropoff'))
+        schedule = HOSCalculator(0).calculate_multi_stop_schedule(stops)
+        self.assertLessEqual(self.driving_before(schedule, 'pickup', 'required_break'), 0.05 + EPSILON)
+        self.assertEqual(schedule[-1]['activity'], 'dropoff')
+        self.assertEqual(hos_violations(schedule), [])
+
+    def test_fourteen_hour_clock_just_short_of_limit(self):
+        stops = legs((7 * 55, 6.95, 'pickup'), (100, 1, 'dropoff'))
+        schedule = HOSCalculator(0).calculate_multi_stop_schedule(stops)
+        self.assertLessEqual(self.driving_before(schedule, 'pickup', 'required_rest'), 0.05 + EPSILON)
+        self.assertEqual(schedule[-1]['activity'], 'dropoff')
+        self.assertEqual(hos_violations(schedule), [])
+
+
+def chain_matrix(points):
+    # Stops on a line (miles from the start); durations follow distance at 55 mph.
+    distances = [[abs(a - b) for b in points] for a in points]
+    return {'distances': distances, 'durations': [[d / 55 for d in row] for row in distances], 'source': 'test'}
+
+
+class StopOrderTests(SimpleTestCase):
+
+    def stops(self, *types):
+        return [{'location': f"Stop {i}", 'dwell_time': 1.0, 'type': t} for i, t in enumerate(types)]
+
+    def test_drops_are_reordered(self):
+        stops = self.stops('pickup', 'dropoff', 'dropoff', 'dropoff')
+        result = StopOrderOptimizer(HOSCalculator(0)).optimize(stops, chain_matrix([0, 10, 300, 200, 100]))
+        self.assertEqual(result['order'], [0, 3, 2, 1])
+        self.assertLess(result['trip_hours'], result['given_order_trip_hours'])
+
+    def test_pickup_drop_chain_keeps_its_load_sequence(self):
+        # Hoisting the second pickup (it sits next to the start) would be shorter, but its
+        # load can only be taken on after the first drops are off the truck.
+        stops = self.stops('pickup', 'dropoff', 'dropoff', 'pickup', 'dropoff', 'dropoff')
+        result = StopOrderOptimizer(HOSCalculator(0)).optimize(stops, chain_matrix([0, 5, 400, 300, 6, 700, 600]))
+        order = result['order']
+        self.assertEqual([stops[i]['type'] for i in order], [s['type'] for s in stops])
+        self.assertEqual(order[0], 0)
+        self.assertEqual(order[3], 3)
+        self.assertEqual(sorted(order[1:3]), [1, 2])
+        self.assertEqual(order, [0, 2, 1, 3, 5, 4])
+
+
+class PlanTripValidationTests(TestCase):
+
+    def post(self, payload):
+        return self.client.post('/api/plan-trip/', payload, content_type='application/json')
+
+    def assertBadRequest(self, payload, message):
+        response = self.post(payload)
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertIn(message, response.json()['error'])
+
+    def test_missing_locations(self):
+        self.assertBadRequest({'pickup_location': 'Dallas, TX'}, 'Missing required location fields')
+        self.assertBadRequest({'current_location': 'Dallas, TX'}, 'Missing required location fields')
+
+    def test_bad_stops(self):
+        base = {'current_location': 'Dallas, TX'}
+        self.assertBadRequest(dict(base, stops=[]), 'stops must be a non-empty list')
+        self.assertBadRequest(dict(base, stops='Austin, TX'), 'stops must be a non-empty list')
+        self.assertBadRequest(dict(base, stops=['Austin, TX'] * 26), 'at most')
+        self.assertBadRequest(dict(base, stops=[{'dwell_time': 1}]), 'Stop 1 is missing a location')
+        self.assertBadRequest(dict(base, stops=[{'location': 'Austin, TX', 'type': 'fuel'}]), 'unknown type')
+
+    def test_bad_dwell_times(self):
+        for dwell in (-1, 25, 'nan', 'inf'):
+            with self.subTest(dwell=dwell):
+                self.assertBadRequest(
+                    {'current_location': 'Dallas, TX', 'stops': [{'location': 'Austin, TX', 'dwell_time': dwell}]},
+                    'dwell_time must be between',
+                )
+
+    def test_bad_coordinates(self):
+        self.assertBadRequest(
+            {'current_location': 'Dallas, TX', 'current_coordinates': [95, 10],
+             'pickup_location': 'Austin, TX', 'dropoff_location': 'Waco, TX'},
+            'out of range',
+        )
+        self.assertBadRequest(
+            {'current_location': 'Dallas, TX', 'stops': [{'location': 'Austin, TX', 'coordinates': [30]}]},
+            'latitude, longitude',
+        )
+
+    def test_bad_cycle_hours(self):
+        for hours in ('nan', -5, 80):
+            with self.subTest(hours=hours):
+                self.assertBadRequest(
+                    {'current_location': 'Dallas, TX', 'pickup_location': 'Austin, TX',
+                     'dropoff_location': 'Waco, TX', 'current_cycle_used': hours},
+                    'current_cycle_used must be between',
+                )
+
+    def test_bad_schedule_mode(self):
+        self.assertBadRequest(
+            {'current_location': 'Dallas, TX', 'pickup_location': 'Austin, TX',
+             'dropoff_location': 'Waco, TX', 'schedule_mode': 'fastest'},
+            'schedule_mode must be one of',
+        )
+
+    def test_bad_log_view(self):
+        self.assertBadRequest(
+            {'current_location': 'Dallas, TX', 'pickup_location': 'Austin, TX',
+             'dropoff_location': 'Waco, TX', 'eld_logs': 'weekly'},
+            'eld_logs must be one of',
+        )
+
+
+class PlanTripLogViewTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        route_service = mock.Mock()
+        route_service.get_route_for_stops.return_value = {
+            'total_distance': 800.0, 'duration_hours': 14.5,
+            'legs': [
+                {'from': 'Dallas, TX', 'to': 'Austin, TX', 'distance': 100.0, 'duration_hours': 1.8},
+                {'from': 'Austin, TX', 'to': 'Houston, TX', 'distance': 700.0, 'duration_hours': 12.7},
+            ],
+            'stops': [[32.8, -96.8], [30.3, -97.7], [29.8, -95.4]],
+            'waypoints': [[32.8, -96.8], [30.3, -97.7], [29.8, -95.4]],
+        }
+        route_service.calculate_route_stops.return_value = {'rest_stop': [], 'fuel_stop': []}
+        self.enterContext(mock.patch('trip_planner.views.get_route_service', return_value=route_service))
+
+    def plan(self, **payload):
+        payload = dict({
+            'current_location': 'Dallas, TX', 'current_coordinates': [32.8, -96.8],
+            'pickup_location': 'Austin, TX', 'pickup_coordinates': [30.3, -97.7],
+            'dropoff_location': 'Houston, TX', 'dropoff_coordinates': [29.8, -95.4],
+        }, **payload)
+        response = self.client.post('/api/plan-trip/', payload, content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def assertInline(self, data):
+        self.assertNotIn('trip_id', data)
+        self.assertEqual(len(data['eld_logs']), data['summary']['total_trip_days'])
+        for log in data['eld_logs']:
+            self.assertTrue(log.startswith('data:image/png;base64,'))
+
+    def test_inline_by_default(self):
+        with override_settings(TRIP_PLANNER_STORE_TRIPS=True):
+            data = self.plan()
+        self.assertIn('trip_id', data)
+        # The sheets are all there; the overview is not rendered on top of them.
+        self.assertIsNone(data['trip_overview'])
+        self.assertEqual(len(data['eld_logs']), data['summary']['total_trip_days'])
+        self.assertTrue(all(log.startswith('data:image/png;base64,') for log in data['eld_logs']))
+
+    def test_server_timing_stages(self):
+        response = self.client.post(
+            '/api/plan-trip/',
+            {'current_location': 'Dallas, TX', 'current_coordinates': [32.8, -96.8],
+             'pickup_location': 'Austin, TX', 'pickup_coordinates': [30.3, -97.7],
+             'dropoff_location': 'Houston, TX', 'dropoff_coordinates': [29.8, -95.4]},
+            content_type='application/json',
+        )
+        stages = [entry.split(';')[0] for entry in response['Server-Timing'].split(', ')]
+        self.assertEqual(stages, ['parse', 'queue', 'routing', 'schedule', 'render', 'store'])
+
+    def test_links_to_stored_trip(self):
+        with override_settings(TRIP_PLANNER_STORE_TRIPS=True):
+            data = self.plan(eld_logs='links')
+        self.assertTrue(data['trip_overview'].startswith('data:image/png;base64,'))
+        self.assertEqual(
+            data['eld_logs'],
+            [f"http://testserver/api/trips/{data['trip_id']}/logs/{day}.png"
+             for day in range(1, data['summary']['total_trip_days'] + 1)],
+        )
+
+    def test_links_without_storage_fall_back_inline(self):
+        with override_settings(TRIP_PLANNER_STORE_TRIPS=False):
+            data = self.plan(eld_logs='links')
+        self.assertInline(data)
+        self.assertIsNone(data['trip_overview'])
+
+    def test_links_fall_back_inline_when_store_fails(self):
+        with override_settings(TRIP_PLANNER_STORE_TRIPS=True), \
+                mock.patch('trip_planner.views.save_trip', side_effect=RuntimeError('disk full')), \
+                self.assertLogs('trip_planner.views', 'ERROR'):
+            self.assertInline(self.plan(eld_logs='links'))
+
+
+class TripStoreTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = media.name
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+
+    def save(self):
+        schedule = HOSCalculator(0).calculate_trip_schedule(100, 700)
+        response_data = {
+            'summary': {
+                'total_distance_miles': 800, 'total_driving_hours': 14.5,
+                'total_trip_hours': 30, 'total_trip_days': schedule[-1]['day'] + 1,
+            },
+            'route': {'coordinates': {'stops': [[32.0, -97.0], [30.0, -95.0]]}},
+            'schedule': schedule,
+        }
+        stops = [{'location': 'Austin, TX', 'type': 'pickup', 'dwell_time': 1},
+                 {'location': 'Houston, TX', 'type': 'dropoff', 'dwell_time': 1}]
+        return save_trip(
+            'Driver', ['Dallas, TX', 'Austin, TX', 'Houston, TX'], stops, 0, 'greedy',
+            response_data, [b'png-day-1', b'png-day-2'], date(2024, 5, 1),
+        )
+
+    def files(self):
+        return [name for _, _, names in os.walk(self.media_root) for name in names]
+
+    def test_log_images_are_written_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            trip = self.save()
+            self.assertEqual(self.files(), [])
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        logs = list(DailyLog.objects.filter(trip=trip))
+        self.assertEqual([log.size for log in logs], [9, 9])
+        self.assertEqual(len(self.files()), 2)
+
+    def test_rolled_back_trip_leaves_no_images(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.save()
+                raise RuntimeError('rollback')
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.files(), [])
+        self.assertFalse(Trip.objects.exists())
+
+    def test_malformed_trip_does_not_stop_the_seed(self):
+        good = self.save()
+        bad = self.save()
+        Trip.objects.filter(pk=good.pk).update(stops=[{'location': 'Austin, TX', 'coordinates': [30.27, -97.74]}])
+        Trip.objects.filter(pk=bad.pk).update(stops=[{'coordinates': [29.76, -95.37]}])
+        history = LocationHistory()
+        with self.assertLogs('trip_planner.locations', 'WARNING') as logs:
+            _seed_from_trips(history)
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn(f'Skipping trip {bad.pk}', logs.output[0])
+        self.assertEqual(history.lookup('Austin, TX'), (30.27, -97.74))
+
+    def test_stored_trips_require_staff(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            trip = self.save()
+        urls = ['/api/trips/', f'/api/trips/{trip.pk}/', f'/api/trips/{trip.pk}/logs/1.png',
+                f'/api/trips/{trip.pk}/overview.png']
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(User.objects.create_user('driver'))
+        self.assertEqual(self.client.get(urls[0]).status_code, 403)
+        self.client.force_login(User.objects.create_user('dispatcher', is_staff=True))
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(b''.join(self.client.get(urls[2]).streaming_content), b'png-day-1')
+
+
+def cycle_hours_brute_force(records, now):
+
+    # Re-sums the history from scratch: on-duty hours on the eight calendar days ending
+    # today, counting only work after the last 34-hour gap between on-duty records.
+    on_duty = [(start, end) for start, end, status in records if status in ('driving', 'on_duty')]
+    if not on_duty or now - on_duty[-1][1] >= timedelta(hours=HOSCalculator.RESTART_HOURS):
+        return 0.0
+    since = 0
+    for index in range(1, len(on_duty)):
+        if on_duty[index][0] - on_duty[index - 1][1] >= timedelta(hours=HOSCalculator.RESTART_HOURS):
+            since = index
+    first_day = now.date() - timedelta(days=HOSCalculator.CYCLE_DAYS - 1)
+    hours = 0.0
+    for start, end in on_duty[since:]:
+        cursor = start
+        while cursor < end:
+            midnight = datetime.combine(cursor.date() + timedelta(days=1), datetime.min.time(), cursor.tzinfo)
+            piece_end = min(end, midnight)
+            if cursor.date() >= first_day:
+                hours += (piece_end - cursor).total_seconds() / 3600
+            cursor = piece_end
+    return hours
+
+
+def random_history(rng, count):
+    records = []
+    clock = datetime(2024, 5, 1, 6, tzinfo=timezone.utc)
+    for _ in range(count):
+        status = rng.choice(('driving', 'on_duty', 'off_duty', 'sleeper'))
+        # Mostly shift-sized pieces, now and then a gap long enough to restart the cycle.
+        hours = rng.choice((0.25, 1, 3, 6, 10, 14, 36, 50)) if status in ('off_duty', 'sleeper') else rng.uniform(0.1, 11)
+        end = clock + timedelta(hours=hours)
+        records.append((clock, end, status))
+        clock = end
+    return records
+
+
+class RollingCycleTests(SimpleTestCase):
+
+    def test_matches_brute_force_over_random_histories(self):
+        rng = random.Random(7)
+        for trial in range(200):
+            records = random_history(rng, rng.randint(1, 60))
+            cycle = RollingCycle()
+            for index, record in enumerate(records):
+                cycle.record(*record)
+                # Reloading from the stored fields, as record_duty does, must not change anything.
+                if index % 5 == 0:
+                    cycle = RollingCycle(cycle.day, cycle.buckets, cycle.last_duty_end)
+                now = record[1] + timedelta(hours=rng.choice((0, 0, 2, 20, 40, 100)))
+                with self.subTest(trial=trial, record=index):
+                    self.assertAlmostEqual(
+                        cycle.hours_used(now), cycle_hours_brute_force(records[:index + 1], now), places=6,
+                    )
+
+    def test_out_of_order_records_are_rejected(self):
+        start = datetime(2024, 5, 1, 6, tzinfo=timezone.utc)
+        cycle = RollingCycle()
+        cycle.record(start, start + timedelta(hours=8), 'driving')
+        # A restart's worth of time later the ledger resets; older work must not slip in after.
+        cycle.record(start + timedelta(hours=50), start + timedelta(hours=52), 'driving')
+        with self.assertRaises(ValueError):
+            cycle.record(start + timedelta(hours=20), start + timedelta(hours=30), 'on_duty')
+        with self.assertRaises(ValueError):
+            cycle.record(start + timedelta(hours=51), start + timedelta(hours=53), 'driving')
+        cycle.record(start + timedelta(hours=20), start + timedelta(hours=30), 'off_duty')
+        self.assertAlmostEqual(cycle.hours_used(start + timedelta(hours=52)), 2)
+
+
+class DutyLedgerTests(TestCase):
+
+    START = datetime(2024, 5, 1, 6, tzinfo=timezone.utc)
+
+    def records(self, *spans):
+        return [
+            {'start': self.START + timedelta(hours=a), 'end': self.START + timedelta(hours=b), 'status': status}
+            for a, b, status in spans
+        ]
+
+    def test_out_of_order_batch_is_not_stored(self):
+        record_duty('Driver', self.records((0, 8, 'driving')))
+        with self.assertRaises(ValueError):
+            record_duty('Driver', self.records((2, 4, 'on_duty')))
+        self.assertEqual(DutyRecord.objects.count(), 1)
+        self.assertEqual(get_cycle('Driver').last_duty_end, self.START + timedelta(hours=8))
+
+    def test_concurrent_first_insert_is_retried(self):
+        # Another request inserts the driver's ledger after our lookup missed it, so our own
+        # insert hits the unique constraint.
+        CycleLedger.objects.create(driver_name='Driver')
+        with mock.patch.object(QuerySet, 'first', return_value=None):
+            cycle = record_duty('Driver', self.records((0, 8, 'driving')))
+        self.assertEqual(CycleLedger.objects.count(), 1)
+        self.assertAlmostEqual(cycle.hours_used(self.START + timedelta(hours=8)), 8)
+        self.assertAlmostEqual(get_cycle('Driver').hours_used(self.START + timedelta(hours=8)), 8)
+
+    def test_requires_staff(self):
+        url = '/api/drivers/Driver/duty-status/'
+        records = {'records': [{'start': '2024-05-01T06:00:00Z', 'end': '2024-05-01T14:00:00Z', 'status': 'driving'}]}
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.post(url, records, content_type='application/json').status_code, 403)
+        self.client.force_login(User.objects.create_user('driver'))
+        self.assertEqual(self.client.post(url, records, content_type='application/json').status_code, 403)
+        self.assertFalse(DutyRecord.objects.exists())
+
+    def test_future_record_returns_400(self):
+        self.client.force_login(User.objects.create_user('dispatcher', is_staff=True))
+        start = datetime.now(timezone.utc) - timedelta(hours=1)
+        records = {'records': [{'start': start.isoformat(), 'end': (start + timedelta(hours=3)).isoformat(),
+                                'status': 'driving'}]}
+        response = self.client.post('/api/drivers/Driver/duty-status/', records, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ends in the future', response.json()['error'])
+        self.assertFalse(DutyRecord.objects.exists())
+
+    def test_out_of_order_post_returns_400(self):
+        self.client.force_login(User.objects.create_user('dispatcher', is_staff=True))
+        url = '/api/drivers/Driver/duty-status/'
+        first = {'records': [{'start': '2024-05-01T06:00:00Z', 'end': '2024-05-01T14:00:00Z', 'status': 'driving'}]}
+        older = {'records': [{'start': '2024-05-01T08:00:00Z', 'end': '2024-05-01T09:00:00Z', 'status': 'on_duty'}]}
+        self.assertEqual(self.client.post(url, first, content_type='application/json').status_code, 201)
+        response = self.client.post(url, older, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('older than the last recorded', response.json()['error'])
+
+
+class LocationHistoryTests(SimpleTestCase):
+
+    def test_history_is_capped(self):
+        history = LocationHistory(max_size=50)
+        for i in range(500):
+            history.add(f"Place {i}, TX", (30.0, -97.0))
+            self.assertLessEqual(len(history.places), 50)
+        self.assertEqual(len(history.keys), len(history.places))
+        self.assertEqual(history.keys, sorted(history.places))
+
+    def test_least_used_places_are_evicted_first(self):
+        history = LocationHistory(max_size=20)
+        history.add('Dallas, TX', (32.78, -96.8))
+        history.lookup('Dallas, TX')
+        for i in range(100):
+            history.add(f"Place {i}, TX", (30.0, -97.0))
+        self.assertEqual(history.lookup('Dallas, TX'), (32.78, -96.8))
+        self.assertIsNone(history.lookup('Place 0, TX'))
+        self.assertEqual(history.lookup('Place 99, TX'), (30.0, -97.0))
+        self.assertEqual([place['name'] for place in history.suggest('dal')], ['Dallas, TX'])
+
+
+class RateLimiterTests(SimpleTestCase):
+
+    def test_rate_is_shared_between_workers(self):
+        self.assertAlmostEqual(RateLimiter('osrm', 10, workers=4).interval, 0.4)
+        self.assertEqual(RateLimiter('osrm', 0, workers=4).interval, 0.0)
+
+    def test_fails_fast_past_the_deadline(self):
+        limiter = RateLimiter('nominatim', 1, max_wait=1.5)
+        with mock.patch('trip_planner.route_service.time') as clock:
+            clock.monotonic.return_value = 100.0
+            limiter.wait()
+            limiter.wait()
+            with self.assertRaises(Overloaded) as raised:
+                limiter.wait()
+            self.assertEqual(raised.exception.stage, 'nominatim')
+            self.assertEqual(raised.exception.retry_after, 2)
+            # The refused caller did not take a slot.
+            self.assertEqual(limiter.next_slot, 102.0)
+            self.assertEqual([c.args for c in clock.sleep.call_args_list], [(1.0,)])
+
+    def test_waits_without_a_deadline(self):
+        limiter = RateLimiter('nominatim', 1)
+        with mock.patch('trip_planner.route_service.time') as clock:
+            clock.monotonic.return_value = 100.0
+            for _ in range(5):
+                limiter.wait()
+        self.assertEqual(clock.sleep.call_args_list[-1].args, (4.0,))
+
+
+class RouteStopTests(SimpleTestCase):
+
+    def test_places_every_stop_type_in_one_pass(self):
+        from geopy.distance import geodesic
+
+        waypoints = [(32.0 + i * 0.05, -97.0 - i * 0.08) for i in range(400)]
+        geodesic_miles = [0.0]
+        for start, end in zip(waypoints, waypoints[1:]):
+            geodesic_miles.append(geodesic_miles[-1] + geodesic(start, end).miles)
+        cumulative = cumulative_distances(waypoints)
+        for haversine, reference in zip(cumulative, geodesic_miles):
+            self.assertAlmostEqual(haversine, reference, delta=reference * 0.005)
+
+        stops = RouteService().calculate_route_stops(
+            waypoints, {'rest_stop': [0, 250, 900], 'fuel_stop': [400, 10000]}
+        )
+        rests, fuel = stops['rest_stop'], stops['fuel_stop']
+        self.assertEqual([stop['type'] for stop in rests], ['rest_stop'] * 3)
+        # The first waypoint at or past each target; targets past the end are dropped.
+        for stop, target in zip(rests + fuel, [0, 250, 900, 400]):
+            index = waypoints.index(stop['route_location'])
+            self.assertEqual(index, max(1, next(i for i, miles in enumerate(cumulative) if miles >= target)))
+            self.assertEqual(stop['distance_from_start'], cumulative[index])
+        self.assertEqual(len(fuel), 1)
+
+
+class DistanceMatrixTests(SimpleTestCase):
+
+    def test_geodesic_fallback_is_not_cached(self):
+        route_service = RouteService()
+        points = [(32.7767, -96.797), (30.2672, -97.7431), (29.7604, -95.3698)]
+        table = {'source': 'osrm', 'distances': [[0.0] * 3] * 3, 'durations': [[0.0] * 3] * 3}
+        with mock.patch.object(route_service, '_get_osrm_table', side_effect=[None, table]), \
+                mock.patch.object(RouteService, 'cache', new_callable=mock.PropertyMock) as cache_property:
+            cache = cache_property.return_value
+            cache.get.return_value = None
+            self.assertEqual(route_service.get_distance_matrix(points)['source'], 'geodesic')
+            cache.set.assert_not_called()
+            self.assertEqual(route_service.get_distance_matrix(points)['source'], 'osrm')
+            cache.set.assert_called_once()
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def test_waiter_is_shed_past_the_deadline(self):
+        flight = SingleFlight('route', timeout=0.05)
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return 'route'
+
+        leader = threading.Thread(target=flight.do, args=('key', slow))
+        leader.start()
+        started.wait(5)
+        try:
+            with self.assertRaises(Overloaded) as raised:
+                flight.do('key', slow)
+        finally:
+            release.set()
+            leader.join()
+        self.assertEqual(raised.exception.stage, 'route')
+        self.assertEqual(flight.stats()['shed'], 1)
+        self.assertEqual(flight.do('key', lambda: 'again'), 'again')
+
+    @override_settings(TRIP_PLANNER_PROVIDER_MAX_WAIT=2)
+    def test_route_waiters_outlast_the_provider_calls(self):
+        flights = RouteService().flights
+        self.assertEqual(flights['geocode'].timeout, 12)
+        # OSRM, then ORS: a slow leader that still succeeds never sheds its waiters.
+        self.assertEqual(flights['route'].timeout, 24)
+
+
+class HosAuditTests(SimpleTestCase):
+
+    ROWS = [
+        ('driver-1', '2024-05-01T08:00:00', '2024-05-01T12:00:00', 'driving'),
+        ('driver-1', '2024-05-01T11:00:00', '2024-05-01T13:00:00', 'driving'),
+        ('driver-1', '2024-05-01T13:00:00', '2024-05-01T14:00:00', 'on_duty'),
+    ]
+
+    def test_overlapping_rows_are_reported(self):
+        auditor = Auditor()
+        violations = auditor.audit(self.ROWS)
+        self.assertEqual([v['rule'] for v in violations], ['overlap'])
+        # The overlapping hour counts once.
+        cycle = auditor.drivers['driver-1'].cycle
+        self.assertAlmostEqual(cycle.hours_used(datetime(2024, 5, 1, 14, tzinfo=timezone.utc)), 6)
+
+    def test_overlapping_rows_across_workers(self):
+        rows = self.ROWS + [
+            (f'driver-{n}', '2024-05-01T08:00:00', '2024-05-01T09:00:00', 'driving') for n in range(2, 6)
+        ]
+        stats = AuditStats()
+        violations = list(audit_stream(rows, workers=2, stats=stats, batch_size=2))
+        self.assertEqual([v['rule'] for v in violations], ['overlap'])
+        self.assertEqual(stats.records, len(rows))
+        self.assertEqual(stats.drivers, 5)
+
+
+class StartupTimingTests(SimpleTestCase):
+
+    @mock.patch('trip_planner.middleware._first_request_pending', True)
+    @mock.patch('trip_planner.middleware.record_first_request')
+    def test_first_request_is_reported_once_per_process(self, record):
+        request = mock.Mock(method='GET', path='/api/health/')
+        with self.assertLogs('trip_planner.middleware', 'INFO') as logs:
+            for _ in range(2):
+                # A new handler each time, as every test client builds one.
+                middleware = StartupTimingMiddleware(lambda request: 'response')
+                self.assertEqual(middleware(request), 'response')
+                self.assertEqual(middleware(request), 'response')
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('First request GET /api/health/', logs.output[0])
+        record.assert_called_once()
+
+
+class ProfileRetentionTests(SimpleTestCase):
+
+    def test_only_the_newest_profiles_are_kept(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        names = [f'profile-{i}.collapsed' for i in range(5)] + ['notes.txt']
+        for age, name in enumerate(reversed(names)):
+            path = os.path.join(directory.name, name)
+            open(path, 'w').close()
+            os.utime(path, (1000 + age, 1000 + age))
+        removed = prune_profiles(directory.name, 3)
+        self.assertEqual(sorted(os.path.basename(path) for path in removed), ['profile-3.collapsed', 'profile-4.collapsed'])
+        self.assertEqual(
+            sorted(os.listdir(directory.name)),
+            ['notes.txt', 'profile-0.collapsed', 'profile-1.collapsed', 'profile-2.collapsed'],
+        )
+        self.assertEqual(prune_profiles(directory.name, 0), [])
+
+
+class DockWindowTests(SimpleTestCase):
+
+    def test_wait_for_window(self):
+        cases = [
+            (10, (8, 17), 0), (8, (8, 17), 0), (17, (8, 17), 0),
+            (7, (8, 17), 1), (18, (8, 17), 14), (24 + 7.5, (8, 17), 0.5),
+            (10, None, 0),
+        ]
+        for t, window, wait in cases:
+            with self.subTest(t=t, window=window):
+                self.assertAlmostEqual(wait_for_window(t, window), wait)
+
+    def test_wait_for_window_wraps_past_midnight(self):
+        # Open 22:00 to 06:00.
+        cases = [(23, 0), (22, 0), (0, 0), (3, 0), (6, 0), (6.5, 15.5), (12, 10), (21.75, 0.25), (48 + 2, 0), (72 + 12, 10)]
+        for t, wait in cases:
+            with self.subTest(t=t):
+                self.assertAlmostEqual(wait_for_window(t, (22, 6)), wait)
+
+
+class DepartureSweepTests(SimpleTestCase):
+
+    def option(self, finish, trip_hours, speed):
+        return {'finish': finish, 'trip_hours': trip_hours, 'average_speed': speed}
+
+    def test_pareto_front(self):
+        results = [
+            self.option(30, 30, 55),
+            self.option(30, 30, 60),    # dominated: same times, faster
+            self.option(28, 28, 65),
+            self.option(29, 27, 60),
+            self.option(31, 31, 50),
+            self.option(32, 31, 50),    # dominated by the 31/31/50 option
+            self.option(35, 35, 45),
+            self.option(30.0004, 30.0004, 55),  # equal to 30/30/55 after rounding
+        ]
+        front = pareto_front(results)
+        self.assertEqual(
+            [(r['finish'], r['trip_hours'], r['average_speed']) for r in front],
+            [(28, 28, 65), (29, 27, 60), (30, 30, 55), (31, 31, 50), (35, 35, 45)],
+        )
+
+    def test_simulation_matches_the_greedy_schedule(self):
+        stops = legs((300, 2, 'pickup'), (1800, 4, 'dropoff'))
+        result = DepartureSweep(HOSCalculator(60)).simulate(stops, 55.0, 0.0, record=True)
+        greedy = DutyTimeline(HOSCalculator(60), stops, fuel_interval=1000.0, fuel_time=0.5).run()
+        self.assertAlmostEqual(result['finish'], greedy.t)
+        self.assertEqual(hos_violations(result['schedule'], 60), [])
+
+    def test_dock_wait_runs_on_the_window(self):
+        # Arrive at 05:00 after 5 hours of driving, dock opens at 08:00: 3 hours off duty that
+        # still count toward the 14-hour window.
+        stops = [dict(leg, window=(8, 17)) for leg in legs((275, 1, 'pickup'), (550, 1, 'dropoff'))]
+        stops[1]['window'] = None
+        result = DepartureSweep(HOSCalculator(0)).simulate(stops, 55.0, 0.0, record=True)
+        self.assertAlmostEqual(result['wait_hours'], 3)
+        self.assertEqual(hos_violations(result['schedule']), [])
+        activities = [s['activity'] for s in result['schedule']]
+        self.assertIn('required_rest', activities)
+        # 5 driving + 3 waiting + 1 dwell leave 5 hours of the window: the rest comes after
+        # 10 hours of driving, not at the 11-hour driving limit.
+        drive_before_rest = sum(
+            s['duration'] for s in result['schedule'][:activities.index('required_rest')] if s['status'] == 'driving'
+        )
+        self.assertAlmostEqual(drive_before_rest, 10)
+
+    def test_windowed_sweeps_stay_within_limits(self):
+        stops = [dict(leg) for leg in legs((400, 1, 'pickup'), (2000, 1, 'dropoff'))]
+        stops[0]['window'] = None
+        stops[1]['window'] = (22, 6)
+        result = DepartureSweep(HOSCalculator(50)).sweep(stops, [h * 1.5 for h in range(16)], [50.0, 65.0])
+        self.assertEqual(result['candidates'], 32)
+        self.assertEqual(hos_violations(result['recommended']['schedule'], 50), [])
+
+
+class ExportLogsTests(TestCase):
+
+    URL = '/api/logs/export.zip?date_from=2024-05-01&date_to=2024-05-31&render=1'
+
+    def setUp(self):
+        schedule = HOSCalculator(0).calculate_trip_schedule(100, 300)
+        trip = Trip.objects.create(
+            driver_name='Driver', origin='Dallas, TX', destination='Austin, TX', lane='dallas, tx > austin, tx',
+            start_date=date(2024, 5, 1), total_distance=400, total_driving_hours=7.3, total_trip_hours=9.3,
+            total_days=1,
+        )
+        trip.segments.bulk_create([
+            trip.segments.model(trip=trip, sequence=i, **segment) for i, segment in enumerate(schedule)
+        ])
+        DailyLog.objects.create(trip=trip, day=0, date=date(2024, 5, 1))
+
+    def test_requires_staff(self):
+        self.assertIn(self.client.get(self.URL).status_code, (401, 403))
+        self.client.force_login(User.objects.create_user('driver'))
+        self.assertEqual(self.client.get(self.URL).status_code, 403)
+
+    def test_renders_go_through_the_rendering_limiter(self):
+        self.client.force_login(User.objects.create_user('auditor', is_staff=True))
+        limiter = get_limiter('rendering')
+        admitted = limiter.admitted
+        response = self.client.get(self.URL)
+        self.assertEqual(response.status_code, 200)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertIn('rendered: 1', archive.read('export.txt').decode())
+        self.assertEqual(limiter.admitted, admitted + 1)
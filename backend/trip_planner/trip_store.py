@@ -0,0 +1,113 @@
+import logging
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from .models import DailyLog, ScheduleSegment, Trip
+
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_FIELDS = ("activity", "duration", "start_time", "end_time", "day", "distance_covered", "status", "leg")
+
+
+def _normalize_location(location: str) -> str:
+    return " ".join(location.lower().split())
+
+
+def lane_key(origin: str, destination: str) -> str:
+    return f"{_normalize_location(origin)} > {_normalize_location(destination)}"[:255]
+
+
+@transaction.atomic
+def save_trip(
+    driver_name: str,
+    locations: List[str],
+    stops: List[Dict],
+    current_cycle_used: float,
+    schedule_mode: str,
+    response_data: Dict,
+    eld_logs: List[Optional[bytes]],
+    start_date: date,
+) -> Trip:
+
+    summary = response_data["summary"]
+    trip = Trip.objects.create(
+        driver_name=driver_name,
+        origin=locations[0],
+        destination=locations[-1],
+        lane=lane_key(locations[0], locations[-1]),
+        start_date=start_date,
+        current_cycle_used=current_cycle_used,
+        schedule_mode=schedule_mode,
+        total_distance=summary["total_distance_miles"],
+        total_driving_hours=summary["total_driving_hours"],
+        total_trip_hours=summary["total_trip_hours"],
+        total_days=summary["total_trip_days"],
+        stops=[
+            dict(stop, coordinates=coords)
+            for stop, coords in zip(stops, response_data["route"]["coordinates"]["stops"])
+        ],
+        route=response_data["route"],
+        summary=summary,
+    )
+
+    ScheduleSegment.objects.bulk_create([
+        ScheduleSegment(
+            trip=trip,
+            sequence=sequence,
+            day=segment["day"],
+            activity=segment["activity"],
+            status=segment["status"],
+            start_time=segment["start_time"],
+            end_time=segment["end_time"],
+            duration=segment["duration"],
+            distance_covered=segment.get("distance_covered", 0),
+            leg=segment.get("leg"),
+        )
+        for sequence, segment in enumerate(response_data["schedule"])
+    ])
+
+    # Log images go to MEDIA_ROOT through the default storage; only their paths hit the DB.
+    # They are written once the rows are committed, so a rollback leaves no stray files.
+    # Days without a stored sheet are rendered on first request.
+    DailyLog.objects.bulk_create([
+        DailyLog(trip=trip, day=day, date=start_date + timedelta(days=day))
+        for day in range(summary["total_trip_days"])
+    ])
+    images = {day: png for day, png in enumerate(eld_logs[:summary["total_trip_days"]]) if png}
+    if images:
+        transaction.on_commit(lambda: _store_log_images(trip.pk, images))
+    return trip
+
+
+def _store_log_images(trip_id: int, images: Dict[int, bytes]):
+    for log in DailyLog.objects.filter(trip_id=trip_id, day__in=images):
+        try:
+            store_log_image(log, images[log.day])
+        except Exception:
+            logger.exception("Could not store log image for trip %s day %s", trip_id, log.day + 1)
+
+
+def _log_filename(trip_id: int, day: int) -> str:
+    return f"trip_{trip_id}_day_{day + 1:02d}.png"
+
+
+def log_segments(log: DailyLog) -> List[Dict]:
+    return list(ScheduleSegment.objects.filter(trip_id=log.trip_id, day=log.day).values(*SEGMENT_FIELDS))
+
+
+def render_log(log: DailyLog, generator, segments: Optional[List[Dict]] = None) -> bytes:
+    if segments is None:
+        segments = log_segments(log)
+    return bytes(generator.generate_daily_log(
+        log.day + 1, segments, log.trip.driver_name, log.date.isoformat(), as_bytes=True
+    ))
+
+
+def store_log_image(log: DailyLog, png: bytes):
+    log.size = len(png)
+    log.image.save(_log_filename(log.trip_id, log.day), ContentFile(png), save=False)
+    log.save(update_fields=["image", "size"])
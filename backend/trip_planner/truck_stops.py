@@ -0,0 +1,138 @@
+import csv
+import json
+import math
+import os
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+
+EARTH_RADIUS_MILES = 3958.7613
+MILES_PER_DEGREE_LAT = 69.0
+
+STOP_KINDS = {
+    'rest_stop': ('truck_stop', 'rest_area'),
+    'fuel_stop': ('truck_stop', 'fuel'),
+}
+
+
+def _haversine_miles(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_MILES * math.asin(math.sqrt(a))
+
+
+class TruckStopIndex:
+
+
+    CELL_DEGREES = 0.25
+
+    def __init__(self, facilities: Iterable[Dict]):
+        self.facilities: List[Dict] = []
+        self.grid: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for facility in facilities:
+            index = len(self.facilities)
+            self.facilities.append(facility)
+            self.grid[self._cell(facility['lat'], facility['lon'])].append(index)
+
+    def __len__(self):
+        return len(self.facilities)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.CELL_DEGREES), math.floor(lon / self.CELL_DEGREES))
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        max_miles: float,
+        kinds: Optional[Tuple[str, ...]] = None
+    ) -> Optional[Dict]:
+
+        lat_span = max_miles / MILES_PER_DEGREE_LAT
+        lon_span = max_miles / (MILES_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+        row0, col0 = self._cell(lat - lat_span, lon - lon_span)
+        row1, col1 = self._cell(lat + lat_span, lon + lon_span)
+
+        best = None
+        best_distance = max_miles
+        for row in range(row0, row1 + 1):
+            for col in range(col0, col1 + 1):
+                for index in self.grid.get((row, col), ()):
+                    facility = self.facilities[index]
+                    if kinds and facility['kind'] not in kinds:
+                        continue
+                    distance = _haversine_miles(lat, lon, facility['lat'], facility['lon'])
+                    if distance <= best_distance:
+                        best, best_distance = facility, distance
+
+        if best is None:
+            return None
+        return {
+            'name': best['name'],
+            'kind': best['kind'],
+            'brand': best.get('brand', ''),
+            'location': (best['lat'], best['lon']),
+            'distance_off_route': round(best_distance, 2),
+        }
+
+    @classmethod
+    def load(cls, path: str) -> 'TruckStopIndex':
+
+        if path.lower().endswith(('.geojson', '.json')):
+            return cls(_read_geojson(path))
+        return cls(_read_csv(path))
+
+
+def _read_csv(path: str) -> Iterable[Dict]:
+    with open(path, newline='', encoding='utf-8') as fh:
+        for row in csv.DictReader(fh):
+            yield {
+                'name': row['name'],
+                'lat': float(row['latitude']),
+                'lon': float(row['longitude']),
+                'kind': row.get('kind') or 'truck_stop',
+                'brand': row.get('brand') or '',
+            }
+
+
+def _read_geojson(path: str) -> Iterable[Dict]:
+    with open(path, encoding='utf-8') as fh:
+        data = json.load(fh)
+    for feature in data.get('features', []):
+        geometry = feature.get('geometry') or {}
+        if geometry.get('type') != 'Point':
+            continue
+        lon, lat = geometry['coordinates'][:2]
+        properties = feature.get('properties') or {}
+        yield {
+            'name': properties.get('name', ''),
+            'lat': float(lat),
+            'lon': float(lon),
+            'kind': properties.get('kind') or 'truck_stop',
+            'brand': properties.get('brand') or '',
+        }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_truck_stop_index() -> Optional[TruckStopIndex]:
+
+    global _index
+    if _index is not None:
+        return _index or None
+
+    with _index_lock:
+        if _index is None:
+            path = getattr(settings, 'TRIP_PLANNER_TRUCK_STOPS_PATH', '')
+            if path and os.path.exists(path):
+                _index = TruckStopIndex.load(path)
+                print(f"Loaded {len(_index)} truck stops from {path}")
+            else:
+                _index = False
+    return _index or None
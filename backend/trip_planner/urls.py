@@ -4,5 +4,14 @@ from . import views
 
 urlpatterns = [
     path('plan-trip/', views.plan_trip, name='plan_trip'),
+    path('plan-trip/sweep/', views.sweep_departures, name='sweep_departures'),
     path('health/', views.health_check, name='health_check'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('locations/suggest/', views.location_suggestions, name='location_suggestions'),
+    path('trips/', views.trip_list, name='trip_list'),
+    path('trips/<int:trip_id>/', views.trip_detail, name='trip_detail'),
+    path('trips/<int:trip_id>/overview.png', views.trip_overview, name='trip_overview'),
+    path('trips/<int:trip_id>/logs/<int:day>.png', views.trip_log, name='trip_log'),
+    path('logs/export.zip', views.export_logs, name='export_logs'),
+    path('drivers/<str:driver_name>/duty-status/', views.duty_status, name='duty_status'),
 ]
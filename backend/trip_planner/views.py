@@ -1,92 +1,320 @@
 
 
-from rest_framework.decorators import api_view
+import logging
+import math
+import time
+from datetime import date, datetime
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.pagination import CursorPagination
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
+from .admission import Overloaded
+from .cycle_ledger import DUTY_STATUSES, get_cycle, ledger_hours_used, record_duty
+from .gazetteer import MAX_SUGGESTIONS
 from .hos_calculator import HOSCalculator
-from .route_service import RouteService
-from .eld_log_generator import ELDLogGenerator
+from .locations import suggest_locations
+from .log_export import export_queryset, stream_log_archive
+from .profiling import ServerTiming
+from .models import DailyLog, Trip
+from .trip_store import SEGMENT_FIELDS, lane_key, render_log, save_trip, store_log_image
+from .services import collect_metrics, get_eld_generator, get_limiter, get_route_service, startup
+from .stop_optimizer import StopOrderOptimizer
+from .schedule_optimizer import ScheduleOptimizer
+from .departure_sweep import DepartureSweep
+
+
+logger = logging.getLogger(__name__)
+
+MAX_STOPS = 25
+MAX_DWELL_HOURS = 24
+STOP_TYPES = ("pickup", "dropoff")
+LOG_VIEWS = ("daily", "links")
+SCHEDULE_MODES = ("greedy", "optimized")
+MAX_DUTY_RECORDS = 5000
+REST_ACTIVITIES = ("required_rest", "split_sleeper")
+DEFAULT_SUGGESTIONS = 8
+DEFAULT_SWEEP_SPEEDS = (50.0, 55.0, 60.0, 65.0)
+SWEEP_SPEED_RANGE = (20.0, 80.0)
+MAX_SWEEP_HOURS = 7 * 24
+MAX_SWEEP_CANDIDATES = 5000
+
+
+def _parse_coordinates(value, label):
+    
+    if value is None:
+        return None
+    if not isinstance(value, (list, tuple)) or len(value) != 2:
+        raise ValueError(f"{label} coordinates must be a [latitude, longitude] pair")
+    lat, lon = float(value[0]), float(value[1])
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError(f"{label} coordinates are out of range")
+    return (lat, lon)
+
+
+def _parse_stops(data):
+    
+    stops = data.get("stops")
+    if stops is None:
+        pickup_location = data.get("pickup_location")
+        dropoff_location = data.get("dropoff_location")
+        if not all([pickup_location, dropoff_location]):
+            raise ValueError("Missing required location fields")
+        return [
+            {
+                "location": pickup_location, "dwell_time": 1.0, "type": "pickup",
+                "coordinates": _parse_coordinates(data.get("pickup_coordinates"), "Pickup"),
+            },
+            {
+                "location": dropoff_location, "dwell_time": 1.0, "type": "dropoff",
+                "coordinates": _parse_coordinates(data.get("dropoff_coordinates"), "Dropoff"),
+            },
+        ]
+
+    if not isinstance(stops, list) or not stops:
+        raise ValueError("stops must be a non-empty list")
+    if len(stops) > MAX_STOPS:
+        raise ValueError(f"A trip can have at most {MAX_STOPS} stops")
+
+    parsed = []
+    for index, stop in enumerate(stops):
+        if isinstance(stop, str):
+            stop = {"location": stop}
+        if not isinstance(stop, dict) or not stop.get("location"):
+            raise ValueError(f"Stop {index + 1} is missing a location")
+        stop_type = stop.get("type", "pickup" if index == 0 else "dropoff")
+        if stop_type not in STOP_TYPES:
+            raise ValueError(f"Stop {index + 1} has an unknown type: {stop_type}")
+        dwell_time = float(stop.get("dwell_time", 1.0))
+        if not 0 <= dwell_time <= MAX_DWELL_HOURS:
+            raise ValueError(f"Stop {index + 1} dwell_time must be between 0 and {MAX_DWELL_HOURS} hours")
+        parsed.append({
+            "location": stop["location"],
+            "dwell_time": dwell_time,
+            "type": stop_type,
+            "coordinates": _parse_coordinates(stop.get("coordinates"), f"Stop {index + 1}"),
+        })
+    return parsed
+
+
+def _starting_cycle(data):
+    
+    if "current_cycle_used" in data:
+        hours = float(data["current_cycle_used"])
+        if not (math.isfinite(hours) and 0 <= hours <= HOSCalculator.MAX_CYCLE_HOURS):
+            raise ValueError(f"current_cycle_used must be between 0 and {HOSCalculator.MAX_CYCLE_HOURS} hours")
+        return hours, "request"
+    # Without a client-supplied figure, use the driver's rolling 8-day ledger.
+    ledger_hours = ledger_hours_used(data["driver_name"]) if data.get("driver_name") else None
+    if ledger_hours is None:
+        return 0, "request"
+    return min(ledger_hours, HOSCalculator.MAX_CYCLE_HOURS), "ledger"
+
+
+def _resolve_coordinates(route_service, locations, known_coords):
+    
+    # Coordinates picked from /locations/suggest/ skip geocoding entirely.
+    missing = [i for i, known in enumerate(known_coords) if known is None]
+    geocoded = route_service.geocode_stops([locations[i] for i in missing]) if missing else []
+    coords = list(known_coords)
+    for i, found in zip(missing, geocoded):
+        coords[i] = found
+    return coords
+
+
+def _leg_metrics(route_legs, stops, schedule):
+    
+    legs = []
+    for index, (route_leg, stop) in enumerate(zip(route_legs, stops)):
+        segments = [s for s in schedule if s.get("leg") == index]
+        arrival = next(s for s in segments if s["activity"] == stop["type"])
+        legs.append({
+            "from": route_leg["from"],
+            "to": route_leg["to"],
+            "type": stop["type"],
+            "distance": round(route_leg["distance"], 2),
+            "route_duration_hours": round(route_leg["duration_hours"], 2),
+            "driving_hours": round(
+                sum(s["duration"] for s in segments if s["status"] == "driving"), 2
+            ),
+            "dwell_time": stop["dwell_time"],
+            "arrival_day": arrival["day"],
+            "arrival_time": round(arrival["start_time"], 2),
+        })
+    return legs
+
+
+def _overloaded(e):
+    
+    response = Response({"error": str(e), "stage": e.stage}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response["Retry-After"] = str(e.retry_after)
+    return response
+
+
+def _overloaded_plain(e):
+    
+    response = HttpResponse(str(e), status=503, content_type="text/plain")
+    response["Retry-After"] = str(e.retry_after)
+    return response
 
 
 @api_view(["POST"])
 def plan_trip(request):
     
+    timing = ServerTiming()
     try:
-        print(request.data)
-        
         current_location = request.data.get("current_location")
-        pickup_location = request.data.get("pickup_location")
-        dropoff_location = request.data.get("dropoff_location")
-        current_cycle_used = float(request.data.get("current_cycle_used", 0))
         driver_name = request.data.get("driver_name", "Driver")
 
         
-        if not all([current_location, pickup_location, dropoff_location]):
+        if not current_location:
             return Response(
                 {"error": "Missing required location fields"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+        try:
+            current_cycle_used, cycle_source = _starting_cycle(request.data)
+            stops = _parse_stops(request.data)
+            known_coords = [
+                _parse_coordinates(request.data.get("current_coordinates"), "Current location")
+            ] + [stop.pop("coordinates") for stop in stops]
+        except (TypeError, ValueError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        log_view = request.data.get("eld_logs", "daily")
+        if log_view not in LOG_VIEWS:
+            return Response(
+                {"error": f"eld_logs must be one of: {', '.join(LOG_VIEWS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        schedule_mode = request.data.get("schedule_mode", "greedy")
+        if schedule_mode not in SCHEDULE_MODES:
+            return Response(
+                {"error": f"schedule_mode must be one of: {', '.join(SCHEDULE_MODES)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        # Turned away now rather than after routing if rendering is already backed up.
+        get_limiter("rendering").check()
 
         
-        route_service = RouteService()
+        route_service = get_route_service()
         hos_calculator = HOSCalculator(current_cycle_used)
-        eld_generator = ELDLogGenerator()
+        eld_generator = get_eld_generator()
 
         
+        locations = [current_location] + [stop["location"] for stop in stops]
+        optimization = None
+        timing.lap("parse")
         try:
-            route_info = route_service.get_route_with_waypoints(
-                current_location, pickup_location, dropoff_location
-            )
+            with get_limiter("routing").slot():
+                timing.lap("queue")
+                coords = _resolve_coordinates(route_service, locations, known_coords)
+                if request.data.get("optimize_stop_order") and len(stops) > 2:
+                    matrix = route_service.get_distance_matrix(coords)
+                    optimization = StopOrderOptimizer(hos_calculator).optimize(stops, matrix)
+                    order = optimization["order"]
+                    stops = [stops[i] for i in order]
+                    coords = [coords[0]] + [coords[i + 1] for i in order]
+                    locations = [current_location] + [stop["location"] for stop in stops]
+                route_info = route_service.get_route_for_stops(locations, coords)
         except ValueError as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        timing.lap("routing")
 
-        distance_to_pickup = route_info["distance_to_pickup"]
-        distance_pickup_to_dropoff = route_info["distance_pickup_to_dropoff"]
         total_distance = route_info["total_distance"]
+        distance_to_pickup = route_info["legs"][0]["distance"]
+        distance_pickup_to_dropoff = total_distance - distance_to_pickup
 
         
         
-        schedule = hos_calculator.calculate_trip_schedule(
-            distance_to_pickup=distance_to_pickup,
-            distance_pickup_to_dropoff=distance_pickup_to_dropoff,
-            average_speed=55.0,
-            pickup_time=1.0,
-            dropoff_time=1.0,
-        )
-
-        
-        schedule_with_fuel = hos_calculator.add_fuel_stops(
-            schedule, fuel_interval=1000.0, fuel_time=0.5
-        )
+        schedule_legs = [
+            {
+                "distance": leg["distance"],
+                "dwell_time": stop["dwell_time"],
+                "activity": stop["type"],
+            }
+            for leg, stop in zip(route_info["legs"], stops)
+        ]
+        schedule_optimization = None
+        try:
+            if schedule_mode == "optimized":
+                schedule_optimization = ScheduleOptimizer(hos_calculator).optimize(
+                    schedule_legs, average_speed=55.0, fuel_interval=1000.0, fuel_time=0.5
+                )
+                schedule_with_fuel = schedule_optimization["schedule"]
+            else:
+                schedule_with_fuel = hos_calculator.calculate_multi_stop_schedule(
+                    schedule_legs, average_speed=55.0, fuel_interval=1000.0, fuel_time=0.5
+                )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         
         rest_distances = []
+        fuel_distances = []
         cumulative_distance = 0
+        previous_activity = None
         for segment in schedule_with_fuel:
-            if segment["activity"] == "required_rest":
-                rest_distances.append(cumulative_distance)
+            if segment["activity"] in REST_ACTIVITIES:
+                if previous_activity not in REST_ACTIVITIES:
+                    rest_distances.append(cumulative_distance)
+            elif segment["activity"] == "fuel_stop":
+                fuel_distances.append(cumulative_distance)
             cumulative_distance += segment.get("distance_covered", 0)
+            previous_activity = segment["activity"]
 
-        rest_stops = route_service.calculate_rest_stop_locations(
-            route_info["waypoints"], rest_distances
+        route_stops = route_service.calculate_route_stops(
+            route_info["waypoints"], {"rest_stop": rest_distances, "fuel_stop": fuel_distances}
         )
-        print(schedule_with_fuel)
+        rest_stops = route_stops["rest_stop"]
+        fuel_stops = route_stops["fuel_stop"]
+        timing.lap("schedule")
 
         
-        eld_logs = eld_generator.generate_multiple_logs(schedule_with_fuel, driver_name)
+        # Raw PNG bytes: the JSON renderer emits data URIs, MessagePack sends them as binary.
+        # Either the full daily sheets inline, or, when the client asked for links and the
+        # trip will be stored to serve them from, only the overview (every day in one image);
+        # linked sheets are rendered on first request.
+        store_trips = getattr(settings, "TRIP_PLANNER_STORE_TRIPS", False)
+        with get_limiter("rendering").slot():
+            timing.lap("queue")
+            trip_overview = None
+            eld_logs = []
+            if log_view == "daily" or not store_trips:
+                eld_logs = eld_generator.generate_multiple_logs(
+                    schedule_with_fuel, driver_name, as_bytes=True
+                )
+            else:
+                trip_overview = eld_generator.generate_trip_overview(
+                    schedule_with_fuel, driver_name, datetime.now().strftime("%Y-%m-%d"), as_bytes=True
+                )
+        timing.lap("render")
 
         
         total_driving_time = sum(
             s["duration"] for s in schedule_with_fuel if s["status"] == "driving"
         )
+        num_cycle_restarts = 0
+        cycle_hours_used = current_cycle_used
+        previous_activity = None
+        for s in schedule_with_fuel:
+            if s["activity"] == "cycle_restart":
+                if previous_activity != "cycle_restart":
+                    num_cycle_restarts += 1
+                cycle_hours_used = 0
+            elif s["status"] in ("driving", "on_duty"):
+                cycle_hours_used += s["duration"]
+            previous_activity = s["activity"]
         total_trip_time = (
             schedule_with_fuel[-1]["day"] * 24 + schedule_with_fuel[-1]["end_time"]
             if schedule_with_fuel
             else 0
         )
-        num_rest_stops = sum(
-            1 for s in schedule_with_fuel if s["activity"] == "required_rest"
-        )
+        num_rest_stops = len(rest_distances)
         num_fuel_stops = sum(
             1 for s in schedule_with_fuel if s["activity"] == "fuel_stop"
         )
@@ -95,13 +323,18 @@ def plan_trip(request):
         response_data = {
             "route": {
                 "total_distance": round(total_distance, 2),
-                "distance_to_pickup": round(route_info["distance_to_pickup"], 2),
-                "distance_pickup_to_dropoff": round(
-                    route_info["distance_pickup_to_dropoff"], 2
-                ),
-                "coordinates": route_info["coordinates"],
+                "distance_to_pickup": round(distance_to_pickup, 2),
+                "distance_pickup_to_dropoff": round(distance_pickup_to_dropoff, 2),
+                "coordinates": {
+                    "current": route_info["stops"][0],
+                    "pickup": route_info["stops"][1],
+                    "dropoff": route_info["stops"][-1],
+                    "stops": route_info["stops"][1:],
+                },
+                "legs": _leg_metrics(route_info["legs"], stops, schedule_with_fuel),
                 "waypoints": route_info["waypoints"],
                 "rest_stops": rest_stops,
+                "fuel_stops": fuel_stops,
             },
             "schedule": schedule_with_fuel,
             "summary": {
@@ -112,16 +345,196 @@ def plan_trip(request):
                 "number_of_rest_stops": num_rest_stops,
                 "number_of_fuel_stops": num_fuel_stops,
                 "hos_compliant": True,
-                "cycle_hours_used": round(current_cycle_used + total_driving_time, 2),
+                "number_of_cycle_restarts": num_cycle_restarts,
+                "starting_cycle_hours_used": round(current_cycle_used, 2),
+                "cycle_source": cycle_source,
+                "cycle_hours_used": round(cycle_hours_used, 2),
                 "cycle_hours_remaining": round(
-                    70 - (current_cycle_used + total_driving_time), 2
+                    max(0.0, HOSCalculator.MAX_CYCLE_HOURS - cycle_hours_used), 2
                 ),
             },
+            "trip_overview": trip_overview,
             "eld_logs": eld_logs,
         }
+        if optimization:
+            response_data["optimization"] = {
+                "order": optimization["order"],
+                "trip_hours": round(optimization["trip_hours"], 2),
+                "given_order_trip_hours": round(optimization["given_order_trip_hours"], 2),
+                "evaluations": optimization["evaluations"],
+                "solve_ms": round(optimization["solve_ms"], 2),
+                "matrix_source": optimization["matrix_source"],
+            }
+        if schedule_optimization:
+            response_data["schedule_optimization"] = {
+                "used": schedule_optimization["used"],
+                "trip_hours": round(schedule_optimization["trip_hours"], 2),
+                "greedy_trip_hours": round(schedule_optimization["greedy_trip_hours"], 2),
+                "hours_saved": round(schedule_optimization["hours_saved"], 2),
+                "states_explored": schedule_optimization["states_explored"],
+                "solve_ms": round(schedule_optimization["solve_ms"], 2),
+            }
+
+        if store_trips:
+            try:
+                trip = save_trip(
+                    driver_name, locations, stops, current_cycle_used, schedule_mode,
+                    response_data, eld_logs, datetime.now().date(),
+                )
+                response_data["trip_id"] = trip.pk
+                if log_view == "links":
+                    response_data["eld_logs"] = [
+                        request.build_absolute_uri(reverse("trip_log", args=[trip.pk, day + 1]))
+                        for day in range(trip.total_days)
+                    ]
+            except Exception:
+                logger.exception("Could not store trip")
+            if "trip_id" not in response_data and not eld_logs:
+                # Nothing stored to link to: send the sheets inline after all.
+                with get_limiter("rendering").slot():
+                    response_data["eld_logs"] = eld_generator.generate_multiple_logs(
+                        schedule_with_fuel, driver_name, as_bytes=True
+                    )
+        timing.lap("store")
+
+        # Stage breakdown for load tests and browser dev tools; queue is admission wait.
+        return Response(response_data, status=status.HTTP_200_OK, headers={"Server-Timing": timing.header()})
+
+    except Overloaded as e:
+        return _overloaded(e)
+    except Exception as e:
+        return Response(
+            {"error": f"Internal server error: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+
+def _parse_window(value, label):
+    
+    if value is None:
+        return None
+    if not isinstance(value, (list, tuple)) or len(value) != 2:
+        raise ValueError(f"{label} window must be an [open_hour, close_hour] pair")
+    open_hour, close_hour = float(value[0]), float(value[1])
+    if not (0 <= open_hour <= 24 and 0 <= close_hour <= 24):
+        raise ValueError(f"{label} window hours must be between 0 and 24")
+    return (open_hour, close_hour)
+
+
+def _parse_sweep_grid(data):
+    
+    hours = data.get("departure_hours", {"start": 0, "end": 23.5, "step": 0.5})
+    if isinstance(hours, dict):
+        start, end, step = float(hours.get("start", 0)), float(hours.get("end", 23.5)), float(hours.get("step", 0.5))
+        if step <= 0 or end < start:
+            raise ValueError("departure_hours needs start <= end and a positive step")
+        count = int((end - start) / step + 1e-9) + 1
+        if count > MAX_SWEEP_CANDIDATES:
+            raise ValueError(f"At most {MAX_SWEEP_CANDIDATES} candidates can be evaluated")
+        hours = [start + i * step for i in range(count)]
+    if not isinstance(hours, list) or not hours:
+        raise ValueError("departure_hours must be a non-empty list or a {start, end, step} range")
+    hours = [float(hour) for hour in hours]
+    if not all(0 <= hour <= MAX_SWEEP_HOURS for hour in hours):
+        raise ValueError(f"departure_hours must be between 0 and {MAX_SWEEP_HOURS}")
+
+    speeds = data.get("speeds", list(DEFAULT_SWEEP_SPEEDS))
+    if not isinstance(speeds, list) or not speeds:
+        raise ValueError("speeds must be a non-empty list")
+    speeds = [float(speed) for speed in speeds]
+    low, high = SWEEP_SPEED_RANGE
+    if not all(low <= speed <= high for speed in speeds):
+        raise ValueError(f"speeds must be between {low:g} and {high:g} mph")
+
+    if len(hours) * len(speeds) > MAX_SWEEP_CANDIDATES:
+        raise ValueError(f"At most {MAX_SWEEP_CANDIDATES} candidates can be evaluated")
+    return sorted(set(hours)), sorted(set(speeds))
+
+
+def _sweep_option(option):
+    
+    finish = option["finish"]
+    return {
+        "departure_hour": round(option["departure_hour"], 2),
+        "average_speed": option["average_speed"],
+        "finish_day": int(finish // 24),
+        "finish_hour": round(finish % 24, 2),
+        "trip_hours": round(option["trip_hours"], 2),
+        "driving_hours": round(option["driving_hours"], 2),
+        "wait_hours": round(option["wait_hours"], 2),
+        "rest_stops": option["rest_stops"],
+    }
+
+
+@api_view(["POST"])
+def sweep_departures(request):
+    
+    try:
+        current_location = request.data.get("current_location")
+        if not current_location:
+            return Response({"error": "Missing required location fields"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            current_cycle_used, cycle_source = _starting_cycle(request.data)
+            stops = _parse_stops(request.data)
+            known_coords = [
+                _parse_coordinates(request.data.get("current_coordinates"), "Current location")
+            ] + [stop.pop("coordinates") for stop in stops]
+            raw_stops = request.data.get("stops")
+            if raw_stops is None:
+                windows = [
+                    _parse_window(request.data.get("pickup_window"), "Pickup"),
+                    _parse_window(request.data.get("dropoff_window"), "Dropoff"),
+                ]
+            else:
+                windows = [
+                    _parse_window(stop.get("window") if isinstance(stop, dict) else None, f"Stop {index + 1}")
+                    for index, stop in enumerate(raw_stops)
+                ]
+            departure_hours, speeds = _parse_sweep_grid(request.data)
+        except (TypeError, ValueError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Route once; every candidate reuses the same legs.
+        route_service = get_route_service()
+        locations = [current_location] + [stop["location"] for stop in stops]
+        try:
+            with get_limiter("routing").slot():
+                coords = _resolve_coordinates(route_service, locations, known_coords)
+                route_info = route_service.get_route_for_stops(locations, coords)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        sweep_legs = [
+            {
+                "distance": leg["distance"],
+                "dwell_time": stop["dwell_time"],
+                "activity": stop["type"],
+                "window": window,
+            }
+            for leg, stop, window in zip(route_info["legs"], stops, windows)
+        ]
+        try:
+            result = DepartureSweep(HOSCalculator(current_cycle_used)).sweep(sweep_legs, departure_hours, speeds)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        recommended = result["recommended"]
 
-        return Response(response_data, status=status.HTTP_200_OK)
+        return Response({
+            "route": {
+                "total_distance": round(route_info["total_distance"], 2),
+                "duration_hours": round(route_info["duration_hours"], 2),
+                "coordinates": {"current": route_info["stops"][0], "stops": route_info["stops"][1:]},
+            },
+            "starting_cycle_hours_used": round(current_cycle_used, 2),
+            "cycle_source": cycle_source,
+            "candidates": result["candidates"],
+            "solve_ms": round(result["solve_ms"], 2),
+            "options": [_sweep_option(option) for option in result["options"]],
+            "recommended": dict(_sweep_option(recommended), schedule=recommended["schedule"]),
+        }, status=status.HTTP_200_OK)
 
+    except Overloaded as e:
+        return _overloaded(e)
     except Exception as e:
         return Response(
             {"error": f"Internal server error: {str(e)}"},
@@ -132,4 +545,251 @@ def plan_trip(request):
 @api_view(["GET"])
 def health_check(request):
     
-    return Response({"status": "ok"}, status=status.HTTP_200_OK)
+    return Response({"status": "ok", "startup": startup}, status=status.HTTP_200_OK)
+
+
+@api_view(["GET"])
+def metrics(request):
+    
+    return Response(collect_metrics(), status=status.HTTP_200_OK)
+
+
+@api_view(["GET"])
+def location_suggestions(request):
+    
+    query = request.query_params.get("q", "").strip()
+    if not query:
+        return Response({"error": "q is required"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = min(int(request.query_params.get("limit", DEFAULT_SUGGESTIONS)), MAX_SUGGESTIONS)
+    except ValueError:
+        return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+    started = time.perf_counter()
+    results = suggest_locations(query, max(limit, 1))
+    return Response({
+        "query": query,
+        "results": [
+            {"name": r["name"], "coordinates": list(r["coordinates"]), "source": r["source"]}
+            for r in results
+        ],
+        "took_ms": round((time.perf_counter() - started) * 1000, 3),
+    }, status=status.HTTP_200_OK)
+
+
+class TripCursorPagination(CursorPagination):
+    ordering = "-id"
+    page_size = 25
+    page_size_query_param = "limit"
+    max_page_size = 100
+
+
+def _trip_summary(trip):
+    
+    return {
+        "id": trip.pk,
+        "driver_name": trip.driver_name,
+        "origin": trip.origin,
+        "destination": trip.destination,
+        "lane": trip.lane,
+        "start_date": trip.start_date.isoformat(),
+        "created_at": trip.created_at.isoformat(),
+        "schedule_mode": trip.schedule_mode,
+        "total_distance_miles": round(trip.total_distance, 2),
+        "total_driving_hours": round(trip.total_driving_hours, 2),
+        "total_trip_hours": round(trip.total_trip_hours, 2),
+        "total_trip_days": trip.total_days,
+    }
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def trip_list(request):
+    
+    params = request.query_params
+    trips = Trip.objects.only(
+        "id", "driver_name", "origin", "destination", "lane", "start_date", "created_at",
+        "schedule_mode", "total_distance", "total_driving_hours", "total_trip_hours", "total_days",
+    )
+    try:
+        if params.get("driver"):
+            trips = trips.filter(driver_name=params["driver"])
+        if params.get("lane"):
+            trips = trips.filter(lane=params["lane"])
+        elif params.get("origin") and params.get("destination"):
+            trips = trips.filter(lane=lane_key(params["origin"], params["destination"]))
+        if params.get("date"):
+            trips = trips.filter(start_date=date.fromisoformat(params["date"]))
+        if params.get("date_from"):
+            trips = trips.filter(start_date__gte=date.fromisoformat(params["date_from"]))
+        if params.get("date_to"):
+            trips = trips.filter(start_date__lte=date.fromisoformat(params["date_to"]))
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    paginator = TripCursorPagination()
+    page = paginator.paginate_queryset(trips, request)
+    return paginator.get_paginated_response([_trip_summary(trip) for trip in page])
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def trip_detail(request, trip_id):
+    
+    trip = Trip.objects.filter(pk=trip_id).first()
+    if trip is None:
+        return Response({"error": "Trip not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    schedule = list(trip.segments.values(*SEGMENT_FIELDS))
+    logs = [
+        {
+            "day": log.day + 1,
+            "date": log.date.isoformat(),
+            "size": log.size,
+            "url": request.build_absolute_uri(reverse("trip_log", args=[trip.pk, log.day + 1])),
+        }
+        for log in trip.logs.all()
+    ]
+    response_data = _trip_summary(trip)
+    response_data.update({
+        "current_cycle_used": trip.current_cycle_used,
+        "stops": trip.stops,
+        "route": trip.route,
+        "schedule": schedule,
+        "summary": trip.summary,
+        "trip_overview": request.build_absolute_uri(reverse("trip_overview", args=[trip.pk])),
+        "eld_logs": logs,
+    })
+    return Response(response_data, status=status.HTTP_200_OK)
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def export_logs(request):
+    
+    params = request.query_params
+    try:
+        if not params.get("date_from") or not params.get("date_to"):
+            raise ValueError("date_from and date_to (YYYY-MM-DD) are required")
+        start = date.fromisoformat(params["date_from"])
+        end = date.fromisoformat(params["date_to"])
+        if end < start:
+            raise ValueError("date_to is before date_from")
+        max_days = getattr(settings, "TRIP_PLANNER_EXPORT_MAX_DAYS", 366)
+        if (end - start).days + 1 > max_days:
+            raise ValueError(f"At most {max_days} days can be exported at once")
+        render = params.get("render", "false").lower() in ("1", "true", "yes")
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    drivers = [name for name in params.getlist("driver") if name]
+    logs = export_queryset(start, end, drivers)
+    workers = getattr(settings, "TRIP_PLANNER_EXPORT_WORKERS", 4)
+    response = StreamingHttpResponse(
+        stream_log_archive(logs, workers=workers, render=render, render_slot=get_limiter("rendering").slot),
+        content_type="application/zip",
+    )
+    response["Content-Disposition"] = f'attachment; filename="eld_logs_{start}_{end}.zip"'
+    return response
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def trip_log(request, trip_id, day):
+    
+    log = DailyLog.objects.select_related("trip").filter(trip_id=trip_id, day=day - 1).first()
+    if log is None:
+        raise Http404("Log not found")
+    if log.image:
+        try:
+            return FileResponse(log.image.open("rb"), content_type="image/png")
+        except OSError:
+            pass
+    # Not rendered at planning time (overview view) or the file is gone: render and keep it.
+    try:
+        with get_limiter("rendering").slot():
+            png = render_log(log, get_eld_generator())
+    except Overloaded as e:
+        return _overloaded_plain(e)
+    try:
+        store_log_image(log, png)
+    except Exception:
+        logger.exception("Could not store log image for trip %s day %s", trip_id, day)
+    return HttpResponse(png, content_type="image/png")
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def trip_overview(request, trip_id):
+    
+    trip = Trip.objects.only("id", "driver_name", "start_date").filter(pk=trip_id).first()
+    if trip is None:
+        raise Http404("Trip not found")
+    segments = list(trip.segments.values(*SEGMENT_FIELDS))
+    try:
+        with get_limiter("rendering").slot():
+            png = get_eld_generator().generate_trip_overview(
+                segments, trip.driver_name, trip.start_date.isoformat(), as_bytes=True
+            )
+    except Overloaded as e:
+        return _overloaded_plain(e)
+    return HttpResponse(png, content_type="image/png")
+
+
+def _parse_duty_records(records):
+    
+    if not isinstance(records, list) or not records:
+        raise ValueError("records must be a non-empty list")
+    if len(records) > MAX_DUTY_RECORDS:
+        raise ValueError(f"At most {MAX_DUTY_RECORDS} records can be sent at once")
+
+    now = timezone.now()
+    parsed = []
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            raise ValueError(f"Record {index + 1} must be an object")
+        start = parse_datetime(str(record.get("start", "")))
+        end = parse_datetime(str(record.get("end", "")))
+        if start is None or end is None:
+            raise ValueError(f"Record {index + 1} needs ISO 8601 start and end times")
+        if timezone.is_naive(start):
+            start = timezone.make_aware(start)
+        if timezone.is_naive(end):
+            end = timezone.make_aware(end)
+        if end <= start:
+            raise ValueError(f"Record {index + 1} ends before it starts")
+        if end > now:
+            raise ValueError(f"Record {index + 1} ends in the future")
+        if record.get("status") not in DUTY_STATUSES:
+            raise ValueError(f"Record {index + 1} has an unknown status: {record.get('status')}")
+        parsed.append({"start": start, "end": end, "status": record["status"]})
+    return parsed
+
+
+def _cycle_response(driver_name, cycle):
+    
+    now = timezone.localtime()
+    used = cycle.hours_used(now) if cycle else 0.0
+    return {
+        "driver_name": driver_name,
+        "as_of": now.isoformat(),
+        "cycle_hours_used": round(used, 2),
+        "cycle_hours_available": round(HOSCalculator.MAX_CYCLE_HOURS - used, 2),
+        "last_duty_end": cycle.last_duty_end.isoformat() if cycle and cycle.last_duty_end else None,
+        "days": cycle.window(now.date()) if cycle else [],
+    }
+
+
+@api_view(["GET", "POST"])
+@permission_classes([IsAdminUser])
+def duty_status(request, driver_name):
+    
+    if request.method == "POST":
+        try:
+            records = _parse_duty_records(request.data.get("records"))
+            cycle = record_duty(driver_name, records)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(_cycle_response(driver_name, cycle), status=status.HTTP_201_CREATED)
+
+    return Response(_cycle_response(driver_name, get_cycle(driver_name)), status=status.HTTP_200_OK)
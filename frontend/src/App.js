@@ -205,7 +205,7 @@ function App() {
                 <span className="icon">📋</span>
                 ELD Daily Logs
               </h2>
-              <ELDLogs logs={results.eld_logs} />
+              <ELDLogs overview={results.trip_overview} logs={results.eld_logs} />
             </div>
           </>
         )}
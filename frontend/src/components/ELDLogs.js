@@ -1,13 +1,37 @@
-import React from 'react';
+import React, { useState } from 'react';
 
-const ELDLogs = ({ logs }) => {
-  if (!logs || logs.length === 0) {
+const ELDLogs = ({ overview, logs }) => {
+  const [showDaily, setShowDaily] = useState(false);
+  const hasLogs = logs && logs.length > 0;
+
+  if (!overview && !hasLogs) {
     return <div>No ELD logs available</div>;
   }
 
   return (
     <div className="eld-logs-section">
-      {logs.map((log, index) => (
+      {overview && (
+        <div>
+          <h3 style={{ color: '#667eea', marginBottom: '15px' }}>
+            Trip Overview
+          </h3>
+          <img
+            src={overview}
+            alt="ELD trip overview"
+            className="eld-log-image"
+          />
+        </div>
+      )}
+      {hasLogs && overview && (
+        <button
+          type="button"
+          className="plan-button"
+          onClick={() => setShowDaily(!showDaily)}
+        >
+          {showDaily ? 'Hide Daily Log Sheets' : `Show Daily Log Sheets (${logs.length})`}
+        </button>
+      )}
+      {hasLogs && (showDaily || !overview) && logs.map((log, index) => (
         <div key={index} style={{ marginBottom: '30px' }}>
           <h3 style={{ color: '#667eea', marginBottom: '15px' }}>
             Day {index + 1} Log Sheet
@@ -16,6 +40,7 @@ const ELDLogs = ({ logs }) => {
             src={log}
             alt={`ELD Log Day ${index + 1}`}
             className="eld-log-image"
+            loading="lazy"
           />
         </div>
       ))}